@@ -0,0 +1,29 @@
+# Generated by Django 4.0 on 2026-10-18 18:23
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_star_counts(apps, schema_editor):
+    UserProfile = apps.get_model('authapp', 'UserProfile')
+    through = UserProfile._meta.get_field('stars').remote_field.through
+    counts = through.objects.filter(userprofile=OuterRef('pk')).order_by() \
+        .values('userprofile').annotate(count=Count('pk')).values('count')
+    UserProfile.objects.update(star_count=Coalesce(Subquery(counts), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authapp', '0002_delete_notificationusersaboutblocking'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='star_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='stars count'),
+        ),
+        migrations.RunPython(fill_star_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.0 on 2026-10-18 18:26
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def fill_article_rating_totals(apps, schema_editor):
+    UserProfile = apps.get_model('authapp', 'UserProfile')
+    ArticleRating = apps.get_model('mainapp', 'ArticleRating')
+    totals = ArticleRating.objects.filter(article_author=OuterRef('user')).order_by().values('article_author')
+    UserProfile.objects.update(
+        article_rating_sum=Coalesce(Subquery(totals.annotate(total=Sum('rating')).values('total')), 0),
+        article_rating_count=Coalesce(Subquery(totals.annotate(total=Count('pk')).values('total')), 0),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authapp', '0003_userprofile_star_count'),
+        ('mainapp', '0010_like_counts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='article_rating_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='articles rating count'),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='article_rating_sum',
+            field=models.PositiveIntegerField(default=0, verbose_name='articles rating sum'),
+        ),
+        migrations.RunPython(fill_article_rating_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 4.0 on 2026-10-18 20:10
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_by_user(queryset, user_field):
+    """Подзапрос с количеством строк queryset для пользователя профиля"""
+    counts = queryset.filter(**{user_field: OuterRef('user')}).order_by().values(user_field) \
+        .annotate(count=Count('pk')).values('count')
+    return Coalesce(Subquery(counts), 0)
+
+
+def fill_unread_counts(apps, schema_editor):
+    UserProfile = apps.get_model('authapp', 'UserProfile')
+    NotificationUsersFromModerator = apps.get_model('mainapp', 'NotificationUsersFromModerator')
+    NotificationUserAfterLikeAndComment = apps.get_model('mainapp', 'NotificationUserAfterLikeAndComment')
+    ModeratorNotification = apps.get_model('mainapp', 'ModeratorNotification')
+    UserProfile.objects.update(
+        unread_blocking_count=count_by_user(
+            NotificationUsersFromModerator.objects.filter(is_read=False), 'recipient_notification'
+        ),
+        unread_general_count=count_by_user(
+            NotificationUserAfterLikeAndComment.objects.filter(is_read=False), 'recipient_notification'
+        ),
+        open_moderation_count=count_by_user(
+            ModeratorNotification.objects.exclude(status='R'), 'responsible_moderator'
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authapp', '0004_userprofile_article_rating_sum'),
+        ('mainapp', '0013_notification_outbox'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='open_moderation_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='open moderation requests'),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='unread_blocking_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='unread moderator notifications'),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='unread_general_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='unread general notifications'),
+        ),
+        migrations.RunPython(fill_unread_counts, migrations.RunPython.noop),
+    ]
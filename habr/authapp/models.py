@@ -7,6 +7,7 @@ from django.urls import reverse
 from django.utils import timezone
 
 import mainapp.models as mainapp_models
+from mainapp.utils import exclude_counters_from_save
 
 
 class BaseModel(models.Model):
@@ -98,7 +99,8 @@ class User(AbstractUser, BaseModel, PermissionsMixin):
 
     def get_general_user_notification(self):
         return mainapp_models.NotificationUserAfterLikeAndComment.objects.filter(recipient_notification=self). \
-            exclude(is_read=True).select_related("recipient_notification").order_by('-created_timestamp')
+            exclude(is_read=True).select_related("recipient_notification", "sender_notification__userprofile"). \
+            order_by('-created_timestamp')
 
     def get_count_general_user_notification(self):
         return mainapp_models.NotificationUserAfterLikeAndComment.objects.filter(recipient_notification=self). \
@@ -117,10 +119,27 @@ class UserProfile(models.Model):
     stars = models.ManyToManyField(User, blank=True, related_name='author_stars')
     rating = models.PositiveIntegerField(default=0, verbose_name='author_rating')
     previous_article_rating = models.PositiveIntegerField(default=0, verbose_name='article_previous_rating')
+    # количество звезд (ранг), меняется только F()-выражениями в сигналах m2m_changed
+    star_count = models.PositiveIntegerField(default=0, verbose_name='stars count')
+    # сумма и количество рейтингов статей автора для вычисления среднего без агрегации
+    article_rating_sum = models.PositiveIntegerField(default=0, verbose_name='articles rating sum')
+    article_rating_count = models.PositiveIntegerField(default=0, verbose_name='articles rating count')
+    # непрочитанные уведомления и взятые в работу запросы на модерацию для значка в шапке,
+    # меняются только F()-выражениями в сигналах mainapp
+    unread_blocking_count = models.PositiveIntegerField(default=0, verbose_name='unread moderator notifications')
+    unread_general_count = models.PositiveIntegerField(default=0, verbose_name='unread general notifications')
+    open_moderation_count = models.PositiveIntegerField(default=0, verbose_name='open moderation requests')
+
+    COUNTER_FIELDS = ('star_count', 'rating', 'previous_article_rating', 'article_rating_sum', 'article_rating_count',
+                      'unread_blocking_count', 'unread_general_count', 'open_moderation_count')
 
     def __str__(self):
         return f'Userprofile for "{self.user.username}"'
 
+    def save(self, *args, **kwargs):
+        exclude_counters_from_save(self, self.COUNTER_FIELDS, kwargs)
+        super().save(*args, **kwargs)
+
     @receiver(post_save, sender=User)
     def create_user_profile(sender, instance, created, update_fields, **kwargs):
         if created:
@@ -137,9 +156,7 @@ def change_author_rating_by_author_likes(sender, instance, action, **kwargs):
     Сигнал для изменения рейтинга автора от изменения лайков этому автору
     """
     if action == 'post_add':
-        instance.rating += 1
-        instance.save()
+        UserProfile.objects.filter(pk=instance.pk).update(rating=models.F('rating') + 1)
 
-    if action == 'post_remove' and instance.rating != 0:
-        instance.rating -= 1
-        instance.save()
+    if action == 'post_remove':
+        UserProfile.objects.filter(pk=instance.pk, rating__gt=0).update(rating=models.F('rating') - 1)
@@ -1,3 +1,44 @@
 from django.test import TestCase
 
-# Create your tests here.
+from authapp.models import User, UserProfile
+
+
+def create_user(username):
+    user = User(username=username, email=f'{username}@example.com')
+    user.set_password('password')
+    user.save()
+    return user
+
+
+class StarCountTest(TestCase):
+    """Счетчик звезд (ранг) автора меняется сигналами m2m_changed"""
+
+    def setUp(self):
+        self.author = create_user('author')
+        self.readers = [create_user(f'reader{i}') for i in range(3)]
+        self.profile = self.author.userprofile
+
+    def get_star_count(self):
+        return UserProfile.objects.get(pk=self.profile.pk).star_count
+
+    def test_add_remove_and_clear(self):
+        self.profile.stars.add(*self.readers)
+        self.assertEqual(self.get_star_count(), 3)
+
+        self.profile.stars.remove(self.readers[0], self.readers[0])
+        self.assertEqual(self.get_star_count(), 2)
+
+        self.profile.stars.clear()
+        self.assertEqual(self.get_star_count(), 0)
+
+    def test_stale_profile_save_keeps_counters(self):
+        stale_profile = UserProfile.objects.get(pk=self.profile.pk)
+        self.profile.stars.add(self.readers[0])
+
+        stale_profile.name = 'Автор'
+        stale_profile.save()
+
+        profile = UserProfile.objects.get(pk=self.profile.pk)
+        self.assertEqual(profile.name, 'Автор')
+        self.assertEqual(profile.star_count, 1)
+        self.assertEqual(profile.rating, 1)
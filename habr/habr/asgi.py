@@ -13,4 +13,17 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'habr.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# импорт после get_asgi_application: модулю нужны настроенные приложения Django
+from django.conf import settings  # noqa: E402
+from mainapp.realtime import NotificationStreamApp  # noqa: E402
+
+notification_stream = NotificationStreamApp()
+
+
+async def application(scope, receive, send):
+    """Поток уведомлений (Server-Sent Events) отдается напрямую, остальные запросы - Django"""
+    if scope['type'] == 'http' and scope['path'] == settings.NOTIFICATION_STREAM_PATH:
+        return await notification_stream(scope, receive, send)
+    return await django_application(scope, receive, send)
@@ -63,6 +63,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'mainapp.request_context.request_context_middleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -80,6 +81,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'mainapp.context_processors.unread_notifications',
             ],
         },
     },
@@ -134,6 +136,54 @@ CKEDITOR_JQUERY_URL = 'static/js/jquery-3.6.0.min.js'
 CKEDITOR_IMAGE_BACKEND = 'pillow'
 CKEDITOR_UPLOAD_PATH = "uploads/"
 
+# Максимальное время построения сниппетов для одной страницы результатов поиска, мс
+SEARCH_SNIPPET_TIMEOUT_MS = 200
+
+# Время хранения закэшированного количества статей в лентах, секунды
+FEED_COUNT_CACHE_TIMEOUT = 300
+# С какого количества статей в ленте без фильтров вместо COUNT берется оценка планировщика (PostgreSQL)
+FEED_COUNT_ESTIMATE_THRESHOLD = 10000
+# Время хранения закэшированных страниц лент для анонимных пользователей, секунды
+FEED_PAGE_CACHE_TIMEOUT = 600
+# Время хранения множества id, лайкнутых пользователем, секунды; 0 - лайки проверяются запросом к базе
+LIKED_IDS_CACHE_TIMEOUT = 0
+
+# Отложенный пересчет рейтинга статей: лайки и комментарии добавляют события,
+# рейтинг пересчитывает команда process_rating_events
+ARTICLE_RATING_WRITE_BEHIND = True
+# Сколько секунд ждать окончания всплеска событий статьи перед пересчетом
+ARTICLE_RATING_COALESCE_SECONDS = 5
+# Максимальное отставание рейтинга статьи от лайков и комментариев, секунды
+ARTICLE_RATING_MAX_STALENESS = 60
+# Пересчитывать рейтинг статьи с необработанными событиями при открытии ее страницы
+ARTICLE_RATING_FLUSH_ON_READ = True
+
+# Уведомления о лайках и комментариях через очередь notification_outbox,
+# уведомления создает команда process_notification_outbox
+NOTIFICATION_OUTBOX = True
+# Объединять лайки одного объекта в одно непрочитанное уведомление ("X и еще 41 поставили лайк")
+NOTIFICATION_COALESCE = True
+# Сколько последних отправителей хранить в объединенном уведомлении
+NOTIFICATION_COALESCE_SENDERS = 10
+# Через сколько дней прочитанные уведомления переносятся в архив командой archive_notifications
+NOTIFICATION_RETENTION_DAYS = 90
+# Каталог для архивов уведомлений в формате NDJSON (archive_notifications --to file)
+NOTIFICATION_ARCHIVE_DIR = BASE_DIR / 'notification_archive'
+# Поток уведомлений Server-Sent Events (только под ASGI, см. habr/asgi.py)
+NOTIFICATION_STREAM_PATH = '/events/notifications/'
+# Брокер событий; None - PostgresBroker (LISTEN/NOTIFY) с PostgreSQL, иначе InProcessBroker,
+# который не получает события воркера process_notification_outbox и других процессов
+NOTIFICATION_BROKER = None
+# Интервал пустых сообщений для простаивающих подключений, секунды
+NOTIFICATION_STREAM_HEARTBEAT = 15
+# Сколько недоставленных событий хранить для одного подключения
+NOTIFICATION_STREAM_QUEUE_SIZE = 100
+
+# Как часто процесс проверяет, изменились ли триггеры комментариев в базе, секунды
+COMMENT_TRIGGERS_CHECK_INTERVAL = 10
+# Время хранения закэшированных счетчиков непрочитанных уведомлений, секунды
+UNREAD_COUNTS_CACHE_TIMEOUT = 300
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.0/ref/settings/#default-auto-field
 
@@ -16,6 +16,7 @@ from mainapp.views import MainListView, ArticleDetailView, \
     ArticleStatusUpdate, UserCommentDeleteView, ModeratorNotificationReviewedUpdate, GeneralNotificationUsersUpdate, \
     AllGeneralNotificationUserView, AllGeneralNotificationUserUpdate, ReplyCommentView
 
+from mainapp.api import ArticleLikeAPIToggle, CommentLikeAPIToggle, AuthorStarAPIToggle, NotificationsMarkReadAPIView
 from qrgenerator.views import index as qr
 
 from authapp.views import UserEditView
@@ -60,6 +61,11 @@ urlpatterns = [
     path('article/<str:pk>/like/<str:id>', CommentLikeRedirectView.as_view(), name='like_comment_toggle'),
     path('user-article/<str:pk>/star/', AuthorArticleStarRedirectView.as_view(), name='user_article_star_toggle'),
 
+    path('api/article/<str:pk>/like/', ArticleLikeAPIToggle.as_view(), name='like-api-toggle'),
+    path('api/comment/<str:pk>/like/', CommentLikeAPIToggle.as_view(), name='comment-like-api-toggle'),
+    path('api/author/<str:pk>/star/', AuthorStarAPIToggle.as_view(), name='star-api-toggle'),
+    path('api/notifications/read/', NotificationsMarkReadAPIView.as_view(), name='notifications-read-api'),
+
     path('article/<str:pk>/banned/<str:id>', BannedAuthorCommentView.as_view(), name='banned_user_toggle'),
     path('article/<str:pk>/banned/', BannedAuthorArticleView.as_view(), name='banned_author_article_toggle'),
     path('status-update/<str:pk>/', ArticleStatusUpdate.as_view(), name='article_status_update'),
@@ -6,7 +6,7 @@ from pages.models import BusinessDirections, AccessCategories, Specializations,
 from .models import Post, Category
 
 from mainapp.models import ArticleCategories, Article, ArticleComment, \
-    ModeratorNotification, NotificationUsersFromModerator, ModeratorNotificationAboutReModeration \
+    ModeratorNotification, NotificationUsersFromModerator, ModeratorNotificationAboutReModeration, CommentTrigger
 
 
 admin.site.register(ArticleCategories)
@@ -16,6 +16,7 @@ admin.site.register(ArticleComment)
 admin.site.register(ModeratorNotification)
 admin.site.register(NotificationUsersFromModerator)
 admin.site.register(ModeratorNotificationAboutReModeration)
+admin.site.register(CommentTrigger)
 admin.site.register(BusinessDirections)
 admin.site.register(AccessCategories)
 admin.site.register(Specializations)
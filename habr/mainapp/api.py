@@ -0,0 +1,81 @@
+from django.shortcuts import get_object_or_404
+from rest_framework.exceptions import PermissionDenied, ValidationError
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from authapp.models import UserProfile
+from mainapp.likes import toggle_like
+from mainapp.models import Article, ArticleComment
+from mainapp.notifications import READ_MODELS, get_unread_counts, mark_notifications_read, parse_read_watermark
+
+
+class LikeToggleAPIView(APIView):
+    """
+    Базовый класс для постановки и снятия лайка без перезагрузки страницы.
+    Возвращает новое состояние лайка и количество лайков объекта:
+    {"liked": true, "count": 10}
+    """
+    permission_classes = [IsAuthenticated]
+    # вид лайка из mainapp.likes.LIKE_RELATIONS и поле-счетчик объекта
+    kind = None
+    counter_field = None
+
+    def get_like_object(self):
+        raise NotImplementedError
+
+    def post(self, request, *args, **kwargs):
+        if request.user.is_now_banned:
+            raise PermissionDenied('Аккаунт заблокирован')
+        obj = self.get_like_object()
+        liked = toggle_like(self.kind, request.user, obj)
+        count = type(obj).objects.filter(pk=obj.pk).values_list(self.counter_field, flat=True).first()
+        return Response({'liked': liked, 'count': count or 0})
+
+
+class ArticleLikeAPIToggle(LikeToggleAPIView):
+    """Лайк статье"""
+    kind = 'article'
+    counter_field = 'like_count'
+
+    def get_like_object(self):
+        return get_object_or_404(Article, id=self.kwargs['pk'])
+
+
+class CommentLikeAPIToggle(LikeToggleAPIView):
+    """Лайк комментарию"""
+    kind = 'comment'
+    counter_field = 'like_count'
+
+    def get_like_object(self):
+        return get_object_or_404(ArticleComment, id=self.kwargs['pk'])
+
+
+class AuthorStarAPIToggle(LikeToggleAPIView):
+    """Звезда (ранг) автору, pk - id пользователя-автора"""
+    kind = 'star'
+    counter_field = 'star_count'
+
+    def get_like_object(self):
+        return get_object_or_404(UserProfile, user_id=self.kwargs['pk'])
+
+
+class NotificationsMarkReadAPIView(APIView):
+    """
+    Отметка всех уведомлений вида kind ("general" или "blocking") прочитанными,
+    before - необязательное время в ISO 8601, после которого уведомления не трогаются.
+    Возвращает количество отмеченных и новые счетчики непрочитанных:
+    {"updated": 25, "unread": {"blocking": 0, "general": 0, "moderation": 0, "total": 0}}
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        kind = request.data.get('kind', 'general')
+        if kind not in READ_MODELS:
+            raise ValidationError({'kind': f'Допустимые значения: {", ".join(READ_MODELS)}'})
+        try:
+            before = parse_read_watermark(request.data.get('before'))
+        except ValueError:
+            raise ValidationError({'before': 'Ожидается дата и время в формате ISO 8601'})
+        updated = mark_notifications_read(kind, request.user, before)
+        return Response({'updated': updated, 'unread': get_unread_counts(request.user)})
@@ -0,0 +1,143 @@
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+# версия закэшированных количеств статей в лентах; увеличивается при публикации,
+# снятии с публикации, блокировке и удалении статей
+FEED_COUNT_VERSION_KEY = 'mainapp:feed_count:version'
+
+# версии закэшированных страниц лент: общая для всех страниц (меню категорий),
+# главной ленты и каждой категории
+FEED_PAGE_VERSION_KEY = 'mainapp:feed_page:version:{}'
+FEED_PAGE_SITE_SCOPE = 'site'
+FEED_PAGE_MAIN_SCOPE = 'main'
+
+
+def get_cache_versions(*keys):
+    """Текущие значения счетчиков версий; отсутствующие в кэше счетчики создаются"""
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, 1, timeout=None)
+            versions[key] = cache.get(key, 1)
+    return [versions[key] for key in keys]
+
+
+def bump_cache_version(key):
+    """Увеличивает счетчик версии, сбрасывая все значения, закэшированные с прежней версией"""
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, timeout=None)
+
+
+def get_feed_count_version():
+    """Текущая версия закэшированных количеств статей"""
+    return get_cache_versions(FEED_COUNT_VERSION_KEY)[0]
+
+
+def invalidate_feed_counts():
+    """Сбрасывает все закэшированные количества статей сменой версии"""
+    bump_cache_version(FEED_COUNT_VERSION_KEY)
+
+
+def get_feed_count_key(scope, params):
+    """
+    Ключ количества статей ленты: раздел (лента, категория, автор, поисковый запрос)
+    и параметры фильтра. Параметры страницы и сортировки на количество не влияют
+    """
+    data = json.dumps([scope, sorted(params.items())], default=str)
+    return 'mainapp:feed_count:{}:{}'.format(
+        get_feed_count_version(), hashlib.md5(data.encode()).hexdigest()
+    )
+
+
+def get_estimated_count(queryset):
+    """
+    Оценка количества строк по плану запроса. Есть только у PostgreSQL,
+    для остальных баз возвращает None
+    """
+    if connections[queryset.db].vendor != 'postgresql':
+        return None
+    plan = json.loads(queryset.order_by().explain(format='json'))
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def get_feed_count(queryset, key, estimate=False):
+    """
+    Количество статей ленты из кэша. Если его там нет - для больших
+    нефильтрованных лент (estimate=True) берется оценка планировщика,
+    для остальных считается COUNT. Возвращает пару (количество, приблизительное ли оно)
+    """
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+
+    count, approximate = None, False
+    if estimate:
+        count = get_estimated_count(queryset)
+        approximate = count is not None and count >= settings.FEED_COUNT_ESTIMATE_THRESHOLD
+    if not approximate:
+        count = queryset.count()
+
+    cache.set(key, (count, approximate), settings.FEED_COUNT_CACHE_TIMEOUT)
+    return count, approximate
+
+
+def get_feed_page_key(view_name, scope, params):
+    """
+    Ключ страницы ленты: view, раздел (главная лента или id категории)
+    и все параметры запроса - фильтр, сортировка, номер страницы или курсор.
+    В ключ входят версии всего сайта и раздела, их смена сбрасывает страницы
+    """
+    site_version, scope_version = get_cache_versions(
+        FEED_PAGE_VERSION_KEY.format(FEED_PAGE_SITE_SCOPE), FEED_PAGE_VERSION_KEY.format(scope)
+    )
+    data = json.dumps([view_name, sorted(params.items())], default=str)
+    return 'mainapp:feed_page:{}:{}:{}:{}'.format(
+        scope, site_version, scope_version, hashlib.md5(data.encode()).hexdigest()
+    )
+
+
+def invalidate_feed_pages(*category_ids):
+    """
+    Сбрасывает закэшированные страницы главной ленты и переданных категорий.
+    Без категорий сбрасываются страницы всех лент
+    """
+    if not category_ids:
+        bump_cache_version(FEED_PAGE_VERSION_KEY.format(FEED_PAGE_SITE_SCOPE))
+        return
+    bump_cache_version(FEED_PAGE_VERSION_KEY.format(FEED_PAGE_MAIN_SCOPE))
+    for category_id in set(category_ids):
+        if category_id is not None:
+            bump_cache_version(FEED_PAGE_VERSION_KEY.format(category_id))
+
+
+# множество id статей, комментариев или профилей авторов, лайкнутых пользователем
+LIKED_IDS_KEY = 'mainapp:liked_ids:{}:{}'
+
+
+def get_liked_ids_key(kind, user_id):
+    """Ключ множества id объектов вида kind, лайкнутых пользователем"""
+    return LIKED_IDS_KEY.format(kind, user_id)
+
+
+def invalidate_liked_ids(kind, *user_ids):
+    """Сбрасывает закэшированные множества лайкнутых id пользователей"""
+    cache.delete_many([get_liked_ids_key(kind, user_id) for user_id in user_ids])
+
+
+UNREAD_COUNTS_KEY = 'mainapp:unread_counts:{}'
+
+
+def get_unread_counts_key(user_id):
+    """Ключ счетчиков непрочитанных уведомлений пользователя"""
+    return UNREAD_COUNTS_KEY.format(user_id)
+
+
+def invalidate_unread_counts(*user_ids):
+    """Сбрасывает закэшированные счетчики непрочитанных уведомлений пользователей"""
+    cache.delete_many([get_unread_counts_key(user_id) for user_id in user_ids])
@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.utils.functional import SimpleLazyObject
+
+from mainapp.notifications import get_unread_counts
+from mainapp.realtime import is_notification_stream_available
+
+
+def unread_notifications(request):
+    """
+    Счетчики непрочитанных уведомлений для шапки и личного кабинета
+    и адрес потока уведомлений, если он доступен. Счетчики загружаются
+    только если шаблон к ним обращается
+    """
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        return {}
+    return {
+        'unread_notifications': SimpleLazyObject(lambda: get_unread_counts(user)),
+        'notification_stream_url':
+            settings.NOTIFICATION_STREAM_PATH if is_notification_stream_available(request) else '',
+    }
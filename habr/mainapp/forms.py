@@ -12,7 +12,8 @@ from mainapp.models import NotificationUsersFromModerator, Article, ArticleComme
 class ArticleEditForm(forms.ModelForm):
     class Meta:
         model = Article
-        exclude = ('likes', 'status', 'blocked')
+        exclude = ('likes', 'status', 'blocked', 'rating', 'text_preview', 'word_count', 'reading_time',
+                   'like_count')
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -0,0 +1,97 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models.signals import m2m_changed
+
+from authapp.models import UserProfile
+from mainapp.cache import get_liked_ids_key
+from mainapp.models import Article, ArticleComment
+
+# виды лайков: лайки статей, лайки комментариев и звезды (ранг) авторов
+LIKE_RELATIONS = {
+    'article': Article.likes,
+    'comment': ArticleComment.likes,
+    'star': UserProfile.stars,
+}
+
+
+def get_like_through(kind):
+    """
+    Промежуточная модель лайков вида kind и имена ее колонок
+    с id объекта и id пользователя
+    """
+    field = LIKE_RELATIONS[kind].field
+    return field.remote_field.through, f'{field.m2m_field_name()}_id', f'{field.m2m_reverse_field_name()}_id'
+
+
+def get_all_liked_ids(kind, user_id):
+    """
+    Все id объектов вида kind, лайкнутых пользователем. Множество хранится в кэше,
+    если задан settings.LIKED_IDS_CACHE_TIMEOUT, и сбрасывается при изменении лайков пользователя
+    """
+    key = get_liked_ids_key(kind, user_id)
+    liked_ids = cache.get(key)
+    if liked_ids is None:
+        through, object_column, user_column = get_like_through(kind)
+        liked_ids = set(through.objects.filter(**{user_column: user_id}).values_list(object_column, flat=True))
+        cache.set(key, liked_ids, settings.LIKED_IDS_CACHE_TIMEOUT)
+    return liked_ids
+
+
+def get_liked_ids(kind, user, object_ids):
+    """
+    id объектов из object_ids, лайкнутых пользователем user. Проверяются
+    одним запросом по индексу промежуточной таблицы, без загрузки всех лайкнувших
+    """
+    object_ids = list(object_ids)
+    if not user.is_authenticated or not object_ids:
+        return set()
+    if settings.LIKED_IDS_CACHE_TIMEOUT:
+        return get_all_liked_ids(kind, user.id).intersection(object_ids)
+
+    through, object_column, user_column = get_like_through(kind)
+    return set(through.objects.filter(
+        **{user_column: user.id, f'{object_column}__in': object_ids}
+    ).values_list(object_column, flat=True))
+
+
+def has_liked(kind, user, object_id):
+    """Лайкнул ли пользователь user объект вида kind"""
+    return object_id in get_liked_ids(kind, user, [object_id])
+
+
+def toggle_like(kind, user, obj):
+    """
+    Ставит лайк объекту obj от пользователя user или снимает уже поставленный.
+    Строка лайка удаляется или вставляется одним запросом, одновременные
+    переключения (двойной клик) разводит уникальный индекс промежуточной таблицы;
+    строка самого объекта не блокируется. Счетчик и остальные обработчики
+    m2m_changed получают только реально удаленный или вставленный лайк.
+    Возвращает True, если лайк поставлен
+    """
+    through, object_column, user_column = get_like_through(kind)
+    relation = LIKE_RELATIONS[kind]
+    like = {object_column: obj.pk, user_column: user.id}
+    with transaction.atomic():
+        deleted, _ = through.objects.filter(**like).delete()
+        if deleted:
+            # удаленный лайк существовал, см. change_like_counter
+            obj._removed_like_ids = [user.id]
+            send_like_changed(relation, obj, 'post_remove', user.id)
+            return False
+        try:
+            with transaction.atomic():
+                through.objects.create(**like)
+        except IntegrityError:
+            # лайк только что поставлен одновременным запросом того же пользователя
+            return True
+        send_like_changed(relation, obj, 'post_add', user.id)
+    return True
+
+
+def send_like_changed(relation, obj, action, user_id):
+    """Сигнал m2m_changed об изменении лайка, как от related manager'а прямой связи"""
+    m2m_changed.send(
+        sender=relation.through, instance=obj, action=action, reverse=False,
+        model=relation.field.related_model, pk_set={user_id}, using=obj._state.db,
+    )
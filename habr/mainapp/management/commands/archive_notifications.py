@@ -0,0 +1,137 @@
+import gzip
+import json
+import time
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.utils import timezone
+
+from mainapp.models import NotificationArchive, NotificationUserAfterLikeAndComment, NotificationUsersFromModerator
+
+# источник архива, модель уведомлений и поля, которые уходят в NotificationArchive.data.
+# Отправители объединенного уведомления (NotificationSender) удаляются вместе с ним,
+# в архиве остаются их количество sender_count и последние отправители last_sender_ids
+ARCHIVE_SOURCES = (
+    (NotificationArchive.MODERATOR, NotificationUsersFromModerator, ('moderator',)),
+    (NotificationArchive.GENERAL, NotificationUserAfterLikeAndComment,
+     ('sender_notification_id', 'kind', 'target_id', 'sender_count', 'last_sender_ids')),
+)
+
+
+def get_table_size(model):
+    """
+    Размер таблицы уведомлений модели с индексами (PostgreSQL) или None.
+    Родительская таблица BaseModel не учитывается: в ней строки всех моделей
+    сайта, и ее размер не показывает, сколько места освободила архивация
+    """
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_total_relation_size(%s::regclass)', [model._meta.db_table])
+        return cursor.fetchone()[0]
+
+
+def format_size(size):
+    for unit in ('Б', 'КБ', 'МБ'):
+        if size < 1024:
+            return f'{size:.0f} {unit}'
+        size /= 1024
+    return f'{size:.1f} ГБ'
+
+
+class Command(BaseCommand):
+    help = 'Move read notifications older than the retention period into the archive table or NDJSON files'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.NOTIFICATION_RETENTION_DAYS,
+                            help='Архивировать прочитанные уведомления старше указанного количества дней')
+        parser.add_argument('--to', choices=('table', 'file'), default='table',
+                            help='Куда переносить: таблица notification_archive или файлы .ndjson.gz')
+        parser.add_argument('--output-dir', default=settings.NOTIFICATION_ARCHIVE_DIR,
+                            help='Каталог для файлов архива при --to file')
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help='Количество уведомлений, переносимых за одну транзакцию')
+        parser.add_argument('--pause', type=float, default=0,
+                            help='Пауза между пачками, секунды')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Только посчитать уведомления для архивации, ничего не удаляя')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        self.stdout.write(f'Архивация прочитанных уведомлений, созданных до {cutoff:%d.%m.%Y %H:%M}')
+        for source, model, data_fields in ARCHIVE_SOURCES:
+            size_before = get_table_size(model)
+            moved, payload_size = self.archive_source(source, model, data_fields, cutoff, options)
+            self.stdout.write(self.style.SUCCESS(
+                f'{model.__name__}: перенесено {moved}, объем в NDJSON {format_size(payload_size)}'
+            ))
+            size_after = get_table_size(model)
+            if size_before is not None and not options['dry_run']:
+                # место удаленных строк PostgreSQL использует повторно после VACUUM (autovacuum)
+                self.stdout.write(f'  размер таблицы {model._meta.db_table}: '
+                                  f'{format_size(size_before)} -> {format_size(size_after)}')
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING('Режим --dry-run: уведомления не перенесены'))
+
+    def archive_source(self, source, model, data_fields, cutoff, options):
+        """
+        Перенос уведомлений одной модели пачками по первичному ключу (keyset, без OFFSET).
+        Каждая пачка переносится и удаляется в своей короткой транзакции.
+        Возвращает количество перенесенных уведомлений и объем их данных в NDJSON
+        """
+        queryset = model.objects.filter(is_read=True, created_timestamp__lt=cutoff).order_by('pk') \
+            .values('pk', 'recipient_notification_id', 'message', 'created_timestamp', *data_fields)
+        archive_path = Path(options['output_dir']) / f'{source}-{timezone.now():%Y%m%d-%H%M%S}.ndjson.gz'
+        archive_file = None
+
+        moved, payload_size, last_pk = 0, 0, None
+        try:
+            while True:
+                chunk_queryset = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+                rows = list(chunk_queryset[:options['chunk_size']])
+                if not rows:
+                    break
+                last_pk = rows[-1]['pk']
+                lines = [json.dumps(dict(row, source=source), cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
+                         for row in rows]
+                payload_size += sum(len(line.encode()) for line in lines)
+                moved += len(rows)
+                if options['dry_run']:
+                    continue
+
+                if options['to'] == 'file' and archive_file is None:
+                    archive_path.parent.mkdir(parents=True, exist_ok=True)
+                    archive_file = gzip.open(archive_path, 'wt', encoding='utf-8')
+                with transaction.atomic():
+                    if archive_file is None:
+                        NotificationArchive.objects.bulk_create([
+                            NotificationArchive(
+                                source=source,
+                                notification_id=row['pk'],
+                                recipient_id=row['recipient_notification_id'],
+                                message=row['message'] or '',
+                                created_timestamp=row['created_timestamp'],
+                                data=json.loads(json.dumps({field: row[field] for field in data_fields},
+                                                           cls=DjangoJSONEncoder)),
+                            ) for row in rows
+                        ])
+                    else:
+                        # строки пишутся до удаления: при сбое уведомление может попасть
+                        # в архив дважды, но не потеряется
+                        archive_file.writelines(lines)
+                        archive_file.flush()
+                    # удаление через ORM: вместе с уведомлениями удаляются строки BaseModel,
+                    # post_delete отправляется для каждого уведомления (счетчики непрочитанных),
+                    # поэтому длину транзакции ограничивает --chunk-size
+                    model.objects.filter(pk__in=[row['pk'] for row in rows]).delete()
+                if options['pause']:
+                    time.sleep(options['pause'])
+        finally:
+            if archive_file is not None:
+                archive_file.close()
+                self.stdout.write(f'  архив: {archive_path}')
+        return moved, payload_size
@@ -0,0 +1,182 @@
+import random
+import time
+import uuid
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import RequestFactory
+from django.utils import timezone
+
+from authapp.models import User
+from mainapp.models import Article, ArticleCategories, BaseModel
+from mainapp.pagination import CursorPaginator, get_feed_sort_key
+from mainapp.views import CategoriesListView, MainListView, UserArticleListView
+
+# категория, в которую складывается четверть сгенерированных статей
+BENCHMARK_CATEGORY = 'Benchmark'
+# по префиксу заголовка сгенерированные статьи находятся при удалении
+BENCHMARK_TITLE_PREFIX = 'Benchmark #'
+
+SORTS = (None, 'date_reverse', 'rating', 'rating_reverse')
+
+
+class Command(BaseCommand):
+    help = 'Print query plans and timings of article feed queries for every sort/filter combination'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=0,
+                            help='Сгенерировать указанное количество статей перед замерами')
+        parser.add_argument('--cleanup', action='store_true',
+                            help='Удалить сгенерированные статьи и выйти')
+        parser.add_argument('--repeat', type=int, default=5,
+                            help='Количество повторов каждого запроса')
+        parser.add_argument('--deep-page', type=int, default=100,
+                            help='Номер "глубокой" страницы для сравнения OFFSET и курсора')
+        parser.add_argument('--no-explain', action='store_true',
+                            help='Не выводить планы запросов')
+
+    def handle(self, *args, **options):
+        if options['cleanup']:
+            self.cleanup()
+            return
+        if options['seed']:
+            self.seed(options['seed'])
+
+        article = Article.objects.filter(status='A', blocked=False).first()
+        if article is None:
+            print('Нет опубликованных статей, запустите команду с параметром --seed')
+            return
+
+        scopes = (
+            ('все статьи', MainListView, {}),
+            ('категория', CategoriesListView, {'pk': str(article.categories_id)}),
+            ('автор', UserArticleListView, {'pk': str(article.user_id)}),
+        )
+        today = timezone.localdate()
+        filters = (
+            ('без фильтра', {}),
+            ('дата', {'start_date': str(today - timedelta(days=30)), 'end_date': str(today)}),
+            ('рейтинг', {'start_rating': '10', 'end_rating': '100'}),
+        )
+
+        print(f'База данных: {connection.vendor}, статей: {Article.objects.count()}')
+        for scope_name, view_class, kwargs in scopes:
+            for filter_name, params in filters:
+                for sort in SORTS:
+                    query_params = dict(params, sort=sort) if sort else params
+                    self.benchmark(f'{scope_name} / {filter_name} / {sort or "date"}',
+                                   view_class, kwargs, query_params, options)
+
+    def benchmark(self, title, view_class, kwargs, params, options):
+        request = RequestFactory().get('/', params)
+        request.user = None
+        view = view_class()
+        view.setup(request, **kwargs)
+        queryset = view.get_queryset()
+        page_size = view.paginate_by
+
+        first_page = queryset[:page_size]
+        deep_offset = (options['deep_page'] - 1) * page_size
+        deep_page = queryset[deep_offset:deep_offset + page_size]
+
+        print(f'\n=== {title}')
+        print(f'  первая страница:      {self.timeit(lambda: list(first_page), options["repeat"]):8.2f} мс')
+        print(f'  страница {options["deep_page"]} (OFFSET): {self.timeit(lambda: list(deep_page), options["repeat"]):8.2f} мс')
+
+        # следующая страница после последней статьи глубокой страницы - по курсору
+        deep_objects = list(deep_page)
+        if deep_objects:
+            sort = params.get('sort')
+            paginator = CursorPaginator(queryset, page_size, *get_feed_sort_key(sort), sort=sort)
+            cursor = paginator.encode_cursor(deep_objects[-1], 'n')
+            print(f'  страница {options["deep_page"] + 1} (курсор): '
+                  f'{self.timeit(lambda: paginator.page(cursor), options["repeat"]):8.2f} мс')
+        print(f'  COUNT:                {self.timeit(queryset.count, options["repeat"]):8.2f} мс')
+
+        if not options['no_explain']:
+            print('  план первой страницы:')
+            for line in first_page.explain().splitlines():
+                print(f'    {line}')
+
+    @staticmethod
+    def timeit(func, repeat):
+        """Среднее время выполнения func в миллисекундах"""
+        started = time.perf_counter()
+        for _ in range(repeat):
+            func()
+        return (time.perf_counter() - started) / repeat * 1000
+
+    @staticmethod
+    def insert_rows(model, objects):
+        """
+        Вставка строк в таблицу модели без сигналов и auto_now_add.
+        bulk_create не работает с моделями, унаследованными от BaseModel.
+        """
+        fields = model._meta.local_concrete_fields
+        columns = ', '.join(connection.ops.quote_name(field.column) for field in fields)
+        placeholders = ', '.join(['%s'] * len(fields))
+        rows = [
+            [field.get_db_prep_save(getattr(obj, field.attname), connection) for field in fields]
+            for obj in objects
+        ]
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT INTO {connection.ops.quote_name(model._meta.db_table)} ({columns}) VALUES ({placeholders})',
+                rows,
+            )
+
+    def seed(self, count, chunk_size=1000):
+        users = list(User.objects.values_list('id', flat=True))
+        if not users:
+            print('Нет пользователей, сначала запустите filling_database')
+            return
+        categories = [
+            ArticleCategories.objects.get_or_create(name=BENCHMARK_CATEGORY)[0].id,
+            *ArticleCategories.objects.exclude(name=BENCHMARK_CATEGORY).values_list('id', flat=True),
+        ]
+        now = timezone.now()
+
+        print(f'Генерирую {count} статей')
+        for start in range(0, count, chunk_size):
+            parents, articles = [], []
+            for i in range(start, min(start + chunk_size, count)):
+                article_id = uuid.uuid4()
+                parents.append(BaseModel(
+                    id=article_id,
+                    created_timestamp=now - timedelta(minutes=random.randrange(0, 60 * 24 * 365)),
+                ))
+                articles.append(Article(
+                    basemodel_ptr_id=article_id,
+                    categories_id=categories[0] if i % 4 == 0 else random.choice(categories),
+                    title=f'{BENCHMARK_TITLE_PREFIX}{i}',
+                    subtitle=f'Benchmark subtitle #{i}',
+                    main_img='article_images/benchmark.png',
+                    text='<p>benchmark</p>',
+                    user_id=random.choice(users),
+                    status=random.choice(['A'] * 8 + ['D', 'H']),
+                    blocked=random.random() < 0.05,
+                    rating=int(random.paretovariate(1.5)) * 5,
+                ))
+            with transaction.atomic():
+                self.insert_rows(BaseModel, parents)
+                self.insert_rows(Article, articles)
+            print(f'Сгенерировано статей: {start + len(articles)}')
+
+        # обновляем статистику планировщика, иначе он не знает о новых строках
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    @staticmethod
+    def cleanup(chunk_size=1000):
+        """Удаление сгенерированных статей пачками; строки BaseModel удаляются вместе со статьями"""
+        deleted = 0
+        while True:
+            ids = list(Article.objects.filter(title__startswith=BENCHMARK_TITLE_PREFIX)
+                       .values_list('id', flat=True)[:chunk_size])
+            if not ids:
+                break
+            with transaction.atomic():
+                Article.objects.filter(pk__in=ids).delete()
+            deleted += len(ids)
+        print(f'Удалено статей: {deleted}')
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from mainapp.models import Article
+from mainapp.utils import get_text_stats
+
+
+class Command(BaseCommand):
+    help = 'Fill text preview, word count and reading time for existing articles'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help='Количество статей, обрабатываемых за один запрос')
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        last_id = None
+        total = 0
+
+        print('Заполняю превью и время чтения статей')
+        while True:
+            # статьи перебираются по id без OFFSET, в память загружается только одна пачка;
+            # status и blocked читает Article.__init__
+            chunk = Article.objects.only('id', 'text', 'status', 'blocked').order_by('id')
+            if last_id is not None:
+                chunk = chunk.filter(id__gt=last_id)
+            chunk = list(chunk[:chunk_size])
+            if not chunk:
+                break
+
+            for article in chunk:
+                article.text_preview, article.word_count, article.reading_time = get_text_stats(article.text)
+            Article.objects.bulk_update(chunk, Article.TEXT_STATS_FIELDS)
+
+            last_id = chunk[-1].id
+            total += len(chunk)
+            print(f'Обработано статей: {total}')
@@ -48,8 +48,11 @@ class Command(BaseCommand):
             item.birthday = birthday.formatted_datetime(fmt="%Y-%m-%d")
             item.bio = "Этот автор - самый крутой. Статьи у него пушка-бомба!"
             item.stars.set(User.objects.all())
-            item.rating = random.randrange(50, 400)
-            item.previous_article_rating = random.randrange(1, 50)
+            # рейтинг не сохраняется через save() профиля, см. UserProfile.COUNTER_FIELDS
+            UserProfile.objects.filter(pk=item.pk).update(
+                rating=random.randrange(50, 400),
+                previous_article_rating=random.randrange(1, 50),
+            )
 
             img_url = Internet().stock_image(width=50, height=50, keywords=['лицо'])
             img_file = requests.get(img_url)
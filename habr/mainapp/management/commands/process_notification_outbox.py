@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from mainapp.models import process_notification_outbox
+
+
+class Command(BaseCommand):
+    help = 'Create like/comment notifications from the notification outbox in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true',
+                            help='Работать постоянно, проверяя очередь каждые --interval секунд')
+        parser.add_argument('--interval', type=float, default=1,
+                            help='Пауза между проверками в режиме --loop, секунды')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Количество строк очереди, обрабатываемых за одну транзакцию')
+
+    def handle(self, *args, **options):
+        while True:
+            processed = 0
+            while True:
+                batch = process_notification_outbox(options['batch_size'])
+                if not batch:
+                    break
+                processed += batch
+            if processed:
+                self.stdout.write(self.style.SUCCESS(f'Обработано уведомлений из очереди: {processed}'))
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,48 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Max, Min, Q
+from django.utils import timezone
+
+from mainapp.models import ArticleRatingEvent, flush_article_rating_events
+
+
+class Command(BaseCommand):
+    help = 'Recompute article ratings from queued like/comment events, one recomputation per article'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true',
+                            help='Работать постоянно, проверяя события каждые --interval секунд')
+        parser.add_argument('--interval', type=float, default=1,
+                            help='Пауза между проверками в режиме --loop, секунды')
+        parser.add_argument('--all', action='store_true',
+                            help='Пересчитать все статьи с событиями, не дожидаясь окончания всплесков')
+
+    def handle(self, *args, **options):
+        while True:
+            article_ids = self.get_ready_article_ids(options['all'])
+            if article_ids:
+                processed = flush_article_rating_events(article_ids)
+                self.stdout.write(self.style.SUCCESS(f'Пересчитан рейтинг статей: {processed}'))
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+    @staticmethod
+    def get_ready_article_ids(flush_all=False):
+        """
+        Статьи, рейтинг которых пора пересчитать: всплеск событий закончился
+        (последнее событие старше ARTICLE_RATING_COALESCE_SECONDS) или рейтинг
+        отстает дольше ARTICLE_RATING_MAX_STALENESS (первое событие старше)
+        """
+        events = ArticleRatingEvent.objects.order_by().values('article_id') \
+            .annotate(first_event=Min('created_timestamp'), last_event=Max('created_timestamp'))
+        if not flush_all:
+            now = timezone.now()
+            events = events.filter(
+                Q(last_event__lte=now - timedelta(seconds=settings.ARTICLE_RATING_COALESCE_SECONDS))
+                | Q(first_event__lte=now - timedelta(seconds=settings.ARTICLE_RATING_MAX_STALENESS))
+            )
+        return [event['article_id'] for event in events]
@@ -0,0 +1,155 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+
+from authapp.models import UserProfile
+from mainapp.models import Article, ArticleComment, ArticleRating
+
+# ценость одного лайка и одного комментария, как в recompute_article_rating
+VALUE_ONE_LIKE = 1
+VALUE_ONE_COMMENTS = 0.2
+
+# сколько примеров расхождений выводить для каждой таблицы
+DIFF_SAMPLE_SIZE = 20
+
+
+def iterate_chunks(queryset, fields, chunk_size):
+    """
+    Строки queryset (values_list по fields) пачками по chunk_size,
+    с выборкой по возрастанию pk без OFFSET
+    """
+    queryset = queryset.order_by('pk').values_list('pk', *fields)
+    last_pk = None
+    while True:
+        chunk_queryset = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+        chunk = list(chunk_queryset[:chunk_size])
+        if not chunk:
+            return
+        yield chunk
+        last_pk = chunk[-1][0]
+
+
+def count_by(queryset, field):
+    """Количество строк queryset по значениям field одним GROUP BY"""
+    return dict(queryset.order_by().values_list(field).annotate(count=Count('pk')))
+
+
+class DiffReport:
+    """Количество расхождений и примеры "было -> стало" для одной таблицы"""
+
+    def __init__(self, name):
+        self.name = name
+        self.checked = 0
+        self.changed = 0
+        self.samples = []
+
+    def add(self, pk, stored, expected):
+        self.checked += 1
+        if stored == expected:
+            return False
+        self.changed += 1
+        if len(self.samples) < DIFF_SAMPLE_SIZE:
+            self.samples.append((pk, stored, expected))
+        return True
+
+    def write(self, stdout):
+        stdout.write(f'{self.name}: проверено {self.checked}, расхождений {self.changed}')
+        for pk, stored, expected in self.samples:
+            stdout.write(f'  {pk}: {stored} -> {expected}')
+
+
+class Command(BaseCommand):
+    help = 'Recompute article and author ratings for the whole database with grouped aggregate queries'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=2000,
+                            help='Количество строк, обрабатываемых за один запрос')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Только вывести расхождения, не записывая их')
+
+    def handle(self, *args, **options):
+        chunk_size, dry_run = options['chunk_size'], options['dry_run']
+        author_totals = self.rebuild_article_ratings(chunk_size, dry_run)
+        self.rebuild_author_ratings(author_totals, chunk_size, dry_run)
+        if dry_run:
+            self.stdout.write(self.style.WARNING('Режим --dry-run: изменения не записаны'))
+
+    def rebuild_article_ratings(self, chunk_size, dry_run):
+        """
+        Рейтинг статьи = лайки * VALUE_ONE_LIKE + комментарии * VALUE_ONE_COMMENTS.
+        Возвращает сумму и количество новых рейтингов статей по авторам
+        """
+        report = DiffReport('ArticleRating.rating')
+        article_report = DiffReport('Article.rating')
+        likes_through = Article.likes.through
+        author_totals = {}
+
+        for chunk in iterate_chunks(ArticleRating.objects.all(), ('article_rating_id', 'article_author_id', 'rating'),
+                                    chunk_size):
+            article_ids = [article_id for _, article_id, _, _ in chunk]
+            like_counts = count_by(likes_through.objects.filter(article_id__in=article_ids), 'article_id')
+            comment_counts = count_by(ArticleComment.objects.filter(article_comment_id__in=article_ids),
+                                      'article_comment_id')
+            article_ratings = dict(Article.objects.filter(id__in=article_ids).values_list('id', 'rating'))
+
+            changed_ratings, changed_articles = [], []
+            for pk, article_id, author_id, stored in chunk:
+                expected = like_counts.get(article_id, 0) * VALUE_ONE_LIKE \
+                    + int(comment_counts.get(article_id, 0) * VALUE_ONE_COMMENTS)
+                totals = author_totals.setdefault(author_id, [0, 0])
+                totals[0] += expected
+                totals[1] += 1
+
+                if report.add(pk, stored, expected):
+                    changed_ratings.append(ArticleRating(pk=pk, rating=expected))
+                if article_id in article_ratings and article_report.add(article_id, article_ratings[article_id],
+                                                                        expected):
+                    changed_articles.append(Article(pk=article_id, rating=expected))
+
+            if not dry_run and (changed_ratings or changed_articles):
+                with transaction.atomic():
+                    ArticleRating.objects.bulk_update(changed_ratings, ['rating'])
+                    Article.objects.bulk_update(changed_articles, ['rating'])
+
+        report.write(self.stdout)
+        article_report.write(self.stdout)
+        return author_totals
+
+    def rebuild_author_ratings(self, author_totals, chunk_size, dry_run):
+        """
+        Рейтинг автора = звезды + лайки комментариев автора + средний рейтинг его статей
+        """
+        report = DiffReport('UserProfile.rating')
+        totals_report = DiffReport('UserProfile.article_rating_sum/count')
+        stars_through = UserProfile.stars.through
+        comment_likes_through = ArticleComment.likes.through
+        fields = ('user_id', 'rating', 'previous_article_rating', 'article_rating_sum', 'article_rating_count')
+
+        for chunk in iterate_chunks(UserProfile.objects.all(), fields, chunk_size):
+            profile_ids = [pk for pk, *_ in chunk]
+            user_ids = [user_id for _, user_id, *_ in chunk]
+            star_counts = count_by(stars_through.objects.filter(userprofile_id__in=profile_ids), 'userprofile_id')
+            comment_like_counts = count_by(
+                comment_likes_through.objects.filter(articlecomment__user_id__in=user_ids), 'articlecomment__user_id'
+            )
+
+            changed = []
+            for pk, user_id, stored, stored_average, stored_sum, stored_count in chunk:
+                rating_sum, rating_count = author_totals.get(user_id, (0, 0))
+                average = rating_sum // rating_count if rating_count else 0
+                expected = star_counts.get(pk, 0) + comment_like_counts.get(user_id, 0) + average
+                rating_changed = report.add(pk, stored, expected)
+                totals_changed = totals_report.add(pk, (stored_sum, stored_count), (rating_sum, rating_count))
+                if rating_changed or totals_changed or stored_average != average:
+                    changed.append(UserProfile(
+                        pk=pk, rating=expected, previous_article_rating=average,
+                        article_rating_sum=rating_sum, article_rating_count=rating_count,
+                    ))
+
+            if not dry_run and changed:
+                UserProfile.objects.bulk_update(
+                    changed, ['rating', 'previous_article_rating', 'article_rating_sum', 'article_rating_count']
+                )
+
+        report.write(self.stdout)
+        totals_report.write(self.stdout)
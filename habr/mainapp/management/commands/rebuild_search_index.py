@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from mainapp.models import Article
+from mainapp.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = 'Rebuild full-text search index for all articles'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help='Количество статей, обрабатываемых за один запрос')
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        articles = Article.objects.only('id', 'title', 'subtitle', 'text', 'status', 'blocked').order_by('id')
+
+        print(f'Перестраиваю поисковый индекс ({type(backend).__name__})')
+        total = 0
+        for article in articles.iterator(chunk_size=options['chunk_size']):
+            backend.update(article)
+            total += 1
+        print(f'Проиндексировано статей: {total}')
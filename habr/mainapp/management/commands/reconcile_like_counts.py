@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from authapp.models import UserProfile
+from mainapp.models import Article, ArticleComment
+
+# модель, связь с лайкнувшими пользователями и поле-счетчик
+LIKE_COUNTERS = (
+    (Article, 'likes', 'like_count'),
+    (ArticleComment, 'likes', 'like_count'),
+    (UserProfile, 'stars', 'star_count'),
+)
+
+
+def get_actual_count(model, relation_name):
+    """Подзапрос с количеством строк промежуточной таблицы для объекта"""
+    field = model._meta.get_field(relation_name)
+    object_column = field.m2m_field_name()
+    counts = field.remote_field.through.objects.filter(**{object_column: OuterRef('pk')}).order_by() \
+        .values(object_column).annotate(count=Count('pk')).values('count')
+    return Coalesce(Subquery(counts), 0)
+
+
+class Command(BaseCommand):
+    help = 'Find and repair drift between like/star counters and their through tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Только вывести расхождения, не исправляя их')
+
+    def handle(self, *args, **options):
+        for model, relation_name, counter in LIKE_COUNTERS:
+            drifted = list(
+                model.objects.annotate(actual_count=get_actual_count(model, relation_name))
+                .exclude(**{counter: F('actual_count')})
+                .values_list('pk', counter, 'actual_count')
+            )
+            print(f'{model.__name__}.{counter}: расхождений {len(drifted)}')
+            for pk, stored, actual in drifted[:20]:
+                print(f'  {pk}: {stored} -> {actual}')
+
+            if drifted and not options['dry_run']:
+                # значение пересчитывается в самом UPDATE, чтобы не затереть лайки,
+                # поставленные после поиска расхождений
+                updated = model.objects.filter(pk__in=[pk for pk, _, _ in drifted]) \
+                    .update(**{counter: get_actual_count(model, relation_name)})
+                print(f'  исправлено: {updated}')
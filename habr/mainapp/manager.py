@@ -1,14 +1,73 @@
 from django.db import models
-from django.db.models import Q
+from django.utils import timezone
 
+from mainapp.search import get_search_backend
+from mainapp.triggers import matcher_cache
 
-class ArticleManager(models.Manager):
-    use_for_related_fields = True
+
+# поля статьи, которые выводятся в карточках лент; тяжелое поле text в них не входит
+ARTICLE_CARD_FIELDS = (
+    'id', 'created_timestamp', 'categories', 'title', 'subtitle', 'main_img',
+    'user', 'status', 'blocked', 'rating', 'like_count',
+)
+
+
+class ArticleQuerySet(models.QuerySet):
+
+    def feed(self):
+        """
+        Статьи для лент: категория, автор и профиль автора загружаются
+        тем же запросом, рейтинг хранится в самой статье
+        """
+        return self.select_related('categories', 'user', 'user__userprofile')
+
+    def cards(self, *fields):
+        """
+        Статьи для карточек: загружаются только поля ARTICLE_CARD_FIELDS
+        и дополнительно переданные fields. Обращение к остальным полям
+        в шаблоне приводит к запросу на каждую статью, см. Article.refresh_from_db
+        """
+        return self.only(*ARTICLE_CARD_FIELDS, *fields)
 
     def search(self, query=None):
-        qs = self.get_queryset()
+        """
+        Полнотекстовый поиск статей; найденные статьи получают аннотацию
+        search_rank для сортировки по релевантности, см. mainapp.search
+        """
+        qs = self
         if query:
-            or_lookup = (Q(title__iregex=query) | Q(subtitle__iregex=query) | Q(text__iregex=query))
-            qs = qs.filter(or_lookup)
+            qs = get_search_backend().search(qs, query)
 
         return qs
+
+
+class ArticleManager(models.Manager.from_queryset(ArticleQuerySet)):
+    use_for_related_fields = True
+
+
+class ArticleCommentQuerySet(models.QuerySet):
+
+    def thread(self):
+        """
+        Комментарии для страницы статьи: автор и его профиль загружаются
+        тем же запросом, количество лайков хранится в поле like_count
+        """
+        return self.select_related('user', 'user__userprofile')
+
+
+class ArticleCommentManager(models.Manager.from_queryset(ArticleCommentQuerySet)):
+    pass
+
+
+class CommentTriggerQuerySet(models.QuerySet):
+
+    def update(self, **kwargs):
+        """
+        Массовое изменение триггеров: update() не вызывает save() и не обновляет
+        поле auto_now, поэтому время изменения проставляется явно - по нему
+        остальные процессы узнают, что автомат нужно пересобрать
+        """
+        kwargs.setdefault('updated_timestamp', timezone.now())
+        updated = super().update(**kwargs)
+        matcher_cache.reset()
+        return updated
@@ -0,0 +1,27 @@
+# Generated by Django 4.0 on 2026-10-18 18:09
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def copy_article_ratings(apps, schema_editor):
+    Article = apps.get_model('mainapp', 'Article')
+    ArticleRating = apps.get_model('mainapp', 'ArticleRating')
+    ratings = ArticleRating.objects.filter(article_rating=OuterRef('pk')).values('rating')[:1]
+    Article.objects.filter(article_rating__isnull=False).update(rating=Subquery(ratings))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainapp', '0005_category_alter_replycomments_text_post'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='article',
+            name='rating',
+            field=models.PositiveIntegerField(db_index=True, default=0, verbose_name='rating'),
+        ),
+        migrations.RunPython(copy_article_ratings, migrations.RunPython.noop),
+    ]
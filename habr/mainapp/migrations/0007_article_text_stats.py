@@ -0,0 +1,28 @@
+# Generated by Django 4.0 on 2026-10-18 18:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainapp', '0006_article_rating'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='article',
+            name='reading_time',
+            field=models.PositiveSmallIntegerField(default=0, verbose_name='reading time, min'),
+        ),
+        migrations.AddField(
+            model_name='article',
+            name='text_preview',
+            field=models.CharField(blank=True, default='', max_length=250, verbose_name='text preview'),
+        ),
+        migrations.AddField(
+            model_name='article',
+            name='word_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='word count'),
+        ),
+    ]
@@ -0,0 +1,111 @@
+import re
+from html import unescape
+
+from django.db import migrations
+
+SQLITE_CREATE_SQL = [
+    """
+    CREATE TABLE article_search_document (
+        id integer NOT NULL PRIMARY KEY AUTOINCREMENT,
+        article_id char(32) NOT NULL UNIQUE,
+        title text NOT NULL DEFAULT '',
+        subtitle text NOT NULL DEFAULT '',
+        body text NOT NULL DEFAULT ''
+    )
+    """,
+    """
+    CREATE VIRTUAL TABLE article_search_index USING fts5(
+        title, subtitle, body,
+        content='article_search_document', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER article_search_document_ai AFTER INSERT ON article_search_document BEGIN
+        INSERT INTO article_search_index (rowid, title, subtitle, body)
+        VALUES (new.id, new.title, new.subtitle, new.body);
+    END
+    """,
+    """
+    CREATE TRIGGER article_search_document_ad AFTER DELETE ON article_search_document BEGIN
+        INSERT INTO article_search_index (article_search_index, rowid, title, subtitle, body)
+        VALUES ('delete', old.id, old.title, old.subtitle, old.body);
+    END
+    """,
+    """
+    CREATE TRIGGER article_search_document_au AFTER UPDATE ON article_search_document BEGIN
+        INSERT INTO article_search_index (article_search_index, rowid, title, subtitle, body)
+        VALUES ('delete', old.id, old.title, old.subtitle, old.body);
+        INSERT INTO article_search_index (rowid, title, subtitle, body)
+        VALUES (new.id, new.title, new.subtitle, new.body);
+    END
+    """,
+]
+
+SQLITE_DROP_SQL = [
+    'DROP TRIGGER IF EXISTS article_search_document_au',
+    'DROP TRIGGER IF EXISTS article_search_document_ad',
+    'DROP TRIGGER IF EXISTS article_search_document_ai',
+    'DROP TABLE IF EXISTS article_search_index',
+    'DROP TABLE IF EXISTS article_search_document',
+]
+
+POSTGRES_CREATE_SQL = [
+    """
+    CREATE TABLE article_search_document (
+        article_id uuid NOT NULL PRIMARY KEY REFERENCES article (basemodel_ptr_id) ON DELETE CASCADE,
+        title text NOT NULL DEFAULT '',
+        subtitle text NOT NULL DEFAULT '',
+        body text NOT NULL DEFAULT '',
+        document tsvector GENERATED ALWAYS AS (
+            setweight(to_tsvector('russian', title), 'A') ||
+            setweight(to_tsvector('russian', subtitle), 'B') ||
+            setweight(to_tsvector('russian', body), 'C')
+        ) STORED
+    )
+    """,
+    'CREATE INDEX article_search_document_gin ON article_search_document USING gin (document)',
+]
+
+POSTGRES_DROP_SQL = [
+    'DROP TABLE IF EXISTS article_search_document',
+]
+
+CREATE_SQL = {'sqlite': SQLITE_CREATE_SQL, 'postgresql': POSTGRES_CREATE_SQL}
+DROP_SQL = {'sqlite': SQLITE_DROP_SQL, 'postgresql': POSTGRES_DROP_SQL}
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor not in CREATE_SQL:
+        return
+    for sql in CREATE_SQL[connection.vendor]:
+        schema_editor.execute(sql)
+
+    Article = apps.get_model('mainapp', 'Article')
+    articles = Article.objects.values_list('id', 'title', 'subtitle', 'text').order_by('id')
+    with connection.cursor() as cursor:
+        for article_id, title, subtitle, text in articles.iterator(chunk_size=500):
+            cursor.execute(
+                'INSERT INTO article_search_document (article_id, title, subtitle, body) VALUES (%s, %s, %s, %s)',
+                [
+                    Article._meta.pk.get_db_prep_value(article_id, connection),
+                    title, subtitle, unescape(re.sub(r'\<[^>]*\>', '', text or '')),
+                ],
+            )
+
+
+def drop_search_index(apps, schema_editor):
+    for sql in DROP_SQL.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainapp', '0007_article_text_stats'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.0 on 2026-10-18 18:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainapp', '0008_article_search_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='article',
+            index=models.Index(condition=models.Q(('blocked', False), ('status', 'A')), fields=['-rating', '-basemodel_ptr'], name='article_feed_rating_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='article',
+            index=models.Index(condition=models.Q(('blocked', False), ('status', 'A')), fields=['categories', '-rating', '-basemodel_ptr'], name='article_feed_cat_rating_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='article',
+            index=models.Index(condition=models.Q(('blocked', False), ('status', 'A')), fields=['user', '-rating', '-basemodel_ptr'], name='article_feed_user_rating_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='article',
+            index=models.Index(condition=models.Q(('blocked', False), ('status', 'A')), fields=['categories', 'basemodel_ptr'], name='article_feed_cat_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='article',
+            index=models.Index(condition=models.Q(('blocked', False), ('status', 'A')), fields=['user', 'basemodel_ptr'], name='article_feed_user_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='basemodel',
+            index=models.Index(fields=['-created_timestamp', '-id'], name='basemodel_created_id_idx'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 4.0 on 2026-10-18 18:23
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_like_counts(apps, schema_editor):
+    for model_name in ('Article', 'ArticleComment'):
+        model = apps.get_model('mainapp', model_name)
+        through = model._meta.get_field('likes').remote_field.through
+        object_column = model._meta.get_field('likes').m2m_field_name()
+        counts = through.objects.filter(**{object_column: OuterRef('pk')}).order_by() \
+            .values(object_column).annotate(count=Count('pk')).values('count')
+        model.objects.update(like_count=Coalesce(Subquery(counts), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainapp', '0009_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='article',
+            name='like_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='likes count'),
+        ),
+        migrations.AddField(
+            model_name='articlecomment',
+            name='like_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='likes count'),
+        ),
+        migrations.RunPython(fill_like_counts, migrations.RunPython.noop),
+    ]
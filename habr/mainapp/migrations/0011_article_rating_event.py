@@ -0,0 +1,25 @@
+# Generated by Django 4.0 on 2026-10-18 18:28
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainapp', '0010_like_counts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArticleRatingEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_timestamp', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='created')),
+                ('article', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='mainapp.article', verbose_name='article')),
+            ],
+            options={
+                'db_table': 'article_rating_event',
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.0 on 2026-10-18 18:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainapp', '0011_article_rating_event'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='notificationusersfrommoderator',
+            name='moderator',
+            field=models.UUIDField(blank=True, null=True, verbose_name='модератор'),
+        ),
+    ]
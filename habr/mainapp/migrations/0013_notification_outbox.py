@@ -0,0 +1,29 @@
+# Generated by Django 4.0 on 2026-10-18 18:34
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authapp', '0004_userprofile_article_rating_sum'),
+        ('mainapp', '0012_notificationusersfrommoderator_moderator_null'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationOutbox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('article_like', 'Лайк статьи'), ('author_star', 'Повышение ранга'), ('comment_like', 'Лайк комментария'), ('comment', 'Комментарий к статье')], max_length=16, verbose_name='kind')),
+                ('target_id', models.UUIDField(verbose_name='target')),
+                ('created_timestamp', models.DateTimeField(auto_now_add=True, verbose_name='created')),
+                ('recipient', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='authapp.user', verbose_name='recipient')),
+                ('sender', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='authapp.user', verbose_name='sender')),
+            ],
+            options={
+                'db_table': 'notification_outbox',
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.0 on 2026-10-18 18:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainapp', '0013_notification_outbox'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notificationuserafterlikeandcomment',
+            name='kind',
+            field=models.CharField(blank=True, default='', max_length=16, verbose_name='вид уведомления'),
+        ),
+        migrations.AddField(
+            model_name='notificationuserafterlikeandcomment',
+            name='last_sender_ids',
+            field=models.JSONField(blank=True, default=list, verbose_name='последние отправители'),
+        ),
+        migrations.AddField(
+            model_name='notificationuserafterlikeandcomment',
+            name='sender_count',
+            field=models.PositiveIntegerField(default=1, verbose_name='количество отправителей'),
+        ),
+        migrations.AddField(
+            model_name='notificationuserafterlikeandcomment',
+            name='target_id',
+            field=models.UUIDField(blank=True, null=True, verbose_name='объект уведомления'),
+        ),
+        migrations.AddConstraint(
+            model_name='notificationuserafterlikeandcomment',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_read', False), ('kind__in', ('article_like', 'author_star', 'comment_like'))), fields=('recipient_notification', 'kind', 'target_id'), name='notification_unread_coalesce_uniq'),
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 4.0 on 2026-10-18 18:39
+
+from django.db import migrations, models
+from django.db.models import F
+import django.db.models.deletion
+
+
+def copy_senders(apps, schema_editor):
+    """Отправители из UUID-поля в внешний ключ; id удаленных пользователей не переносятся"""
+    User = apps.get_model('authapp', 'User')
+    Notification = apps.get_model('mainapp', 'NotificationUserAfterLikeAndComment')
+    Notification.objects.filter(sender_notification__in=User.objects.values('id')) \
+        .update(sender_notification_user=F('sender_notification'))
+
+
+def copy_senders_back(apps, schema_editor):
+    """Уведомления без отправителя при откате удаляются: в UUID-поле он обязателен"""
+    Notification = apps.get_model('mainapp', 'NotificationUserAfterLikeAndComment')
+    Notification.objects.filter(sender_notification_user__isnull=True).delete()
+    Notification.objects.update(sender_notification=F('sender_notification_user'))
+
+
+class Migration(migrations.Migration):
+    # в PostgreSQL UPDATE копирования оставляет отложенные события триггеров внешних ключей,
+    # и следующий ALTER TABLE в той же транзакции падает ("pending trigger events").
+    # Поэтому операции выполняются каждая в своей транзакции, копирование - в отдельной
+    atomic = False
+
+    dependencies = [
+        ('authapp', '0005_userprofile_unread_counts'),
+        ('mainapp', '0014_notification_coalesce'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notificationuserafterlikeandcomment',
+            name='sender_notification_user',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='authapp.user'),
+        ),
+        migrations.AlterField(
+            model_name='notificationuserafterlikeandcomment',
+            name='sender_notification',
+            field=models.UUIDField(null=True, verbose_name='отправитель уведомления'),
+        ),
+        migrations.RunPython(copy_senders, copy_senders_back, atomic=True),
+        migrations.RemoveField(
+            model_name='notificationuserafterlikeandcomment',
+            name='sender_notification',
+        ),
+        migrations.RenameField(
+            model_name='notificationuserafterlikeandcomment',
+            old_name='sender_notification_user',
+            new_name='sender_notification',
+        ),
+        migrations.AlterField(
+            model_name='notificationuserafterlikeandcomment',
+            name='sender_notification',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='sent_notifications', to='authapp.user', verbose_name='отправитель уведомления'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.0 on 2026-10-18 18:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainapp', '0015_notification_sender_fk'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(choices=[('moderator', 'Уведомления модераторов'), ('general', 'Уведомления о лайках и комментариях')], max_length=16, verbose_name='source')),
+                ('notification_id', models.UUIDField(verbose_name='notification id')),
+                ('recipient_id', models.UUIDField(db_index=True, verbose_name='recipient')),
+                ('message', models.TextField(blank=True, default='', verbose_name='message')),
+                ('data', models.JSONField(blank=True, default=dict, verbose_name='data')),
+                ('created_timestamp', models.DateTimeField(verbose_name='created')),
+                ('archived_timestamp', models.DateTimeField(auto_now_add=True, verbose_name='archived')),
+            ],
+            options={
+                'db_table': 'notification_archive',
+            },
+        ),
+    ]
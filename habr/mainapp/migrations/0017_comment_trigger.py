@@ -0,0 +1,35 @@
+# Generated by Django 4.0 on 2026-10-18 18:43
+
+from django.db import migrations, models
+
+
+def create_moderator_trigger(apps, schema_editor):
+    """Триггер, который раньше был зашит в сигнал создания комментария"""
+    CommentTrigger = apps.get_model('mainapp', 'CommentTrigger')
+    CommentTrigger.objects.create(pattern='@moderator', kind='moderator_request')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainapp', '0016_notification_archive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CommentTrigger',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pattern', models.CharField(max_length=100, verbose_name='Шаблон')),
+                ('kind', models.CharField(choices=[('moderator_request', 'Запрос модератора'), ('stop_word', 'Стоп-слово'), ('mention', 'Упоминание'), ('link', 'Ссылка')], max_length=32, verbose_name='Вид триггера')),
+                ('is_active', models.BooleanField(default=True, verbose_name='Активен')),
+                ('updated_timestamp', models.DateTimeField(auto_now=True, verbose_name='Изменен')),
+            ],
+            options={
+                'verbose_name': 'Триггер комментариев',
+                'verbose_name_plural': 'Триггеры комментариев',
+                'db_table': 'comment_trigger',
+            },
+        ),
+        migrations.RunPython(create_moderator_trigger, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.0 on 2026-10-18 18:51
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainapp', '0017_comment_trigger'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='article',
+            name='article_feed_cat_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='article',
+            name='article_feed_user_idx',
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 4.0 on 2026-10-18 18:59
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def create_notification_senders(apps, schema_editor):
+    """
+    Отправители непрочитанных объединенных уведомлений, известные до миграции.
+    Если отправителей больше, чем сохранено в last_sender_ids, остальные неизвестны:
+    такое уведомление больше не объединяется (вид очищается), иначе прежние
+    отправители при повторном лайке были бы посчитаны еще раз
+    """
+    Notification = apps.get_model('mainapp', 'NotificationUserAfterLikeAndComment')
+    NotificationSender = apps.get_model('mainapp', 'NotificationSender')
+    notifications = Notification.objects.filter(is_read=False).exclude(kind='') \
+        .only('pk', 'kind', 'sender_count', 'last_sender_ids')
+    for notification in notifications.iterator():
+        if notification.sender_count > len(notification.last_sender_ids):
+            notification.kind = ''
+            notification.save(update_fields=['kind'])
+            continue
+        NotificationSender.objects.bulk_create([
+            NotificationSender(notification_id=notification.pk, sender_id=sender_id)
+            for sender_id in notification.last_sender_ids
+        ], ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('mainapp', '0018_remove_feed_fk_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationSender',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('notification', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='mainapp.notificationuserafterlikeandcomment', verbose_name='notification')),
+                ('sender', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='sender')),
+            ],
+            options={
+                'db_table': 'notification_sender',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='notificationsender',
+            constraint=models.UniqueConstraint(fields=('notification', 'sender'), name='notification_sender_uniq'),
+        ),
+        migrations.RunPython(create_notification_senders, migrations.RunPython.noop),
+    ]
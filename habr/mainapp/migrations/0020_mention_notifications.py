@@ -0,0 +1,25 @@
+# Generated by Django 4.0 on 2026-10-18 19:07
+
+from django.db import migrations, models
+
+
+def create_mention_trigger(apps, schema_editor):
+    """Префикс упоминаний: имя после @ ищется среди пользователей, см. notify_mentioned_users"""
+    CommentTrigger = apps.get_model('mainapp', 'CommentTrigger')
+    CommentTrigger.objects.create(pattern='@', kind='mention')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainapp', '0019_notification_sender_ids'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='notificationoutbox',
+            name='kind',
+            field=models.CharField(choices=[('article_like', 'Лайк статьи'), ('author_star', 'Повышение ранга'), ('comment_like', 'Лайк комментария'), ('comment', 'Комментарий к статье'), ('mention', 'Упоминание в комментарии')], max_length=16, verbose_name='kind'),
+        ),
+        migrations.RunPython(create_mention_trigger, migrations.RunPython.noop),
+    ]
@@ -1,15 +1,18 @@
-import inspect
-import uuid
+import logging
 import re
+import uuid
 
 from ckeditor_uploader.fields import RichTextUploadingField
-from django.db import models
+from django.conf import settings
+from django.core.exceptions import FieldError
+from django.db import IntegrityError, models, transaction
 from django.db.models.query import QuerySet
 from django.core.paginator import Paginator
 from django.urls import reverse
 from django.db.models.signals import m2m_changed, post_delete, post_save
 from django.dispatch import receiver
-from django.db.models import Avg
+from django.db.models import Count, F, Max
+from django.db.models.functions import Coalesce, Greatest, NullIf
 from django.utils import timezone
 from mptt.fields import TreeForeignKey
 from mptt.models import MPTTModel
@@ -17,7 +20,16 @@ from taggit.managers import TaggableManager
 from taggit.models import GenericUUIDTaggedItemBase, TaggedItemBase, Tag
 
 from authapp.models import User, UserProfile
-from mainapp.manager import ArticleManager
+from mainapp.cache import invalidate_feed_counts, invalidate_feed_pages, invalidate_liked_ids, \
+    invalidate_unread_counts
+from mainapp.manager import ArticleCommentManager, ArticleManager, CommentTriggerQuerySet
+from mainapp.realtime import publish_user_event
+from mainapp.triggers import comment_trigger_matched, matcher_cache, run_comment_triggers
+from mainapp.request_context import get_current_user
+from mainapp.search import SEARCH_DOCUMENT_FIELDS, get_search_backend
+from mainapp.utils import exclude_counters_from_save, get_text_stats
+
+logger = logging.getLogger(__name__)
 
 
 class UUIDTaggedItem(GenericUUIDTaggedItemBase, TaggedItemBase):
@@ -35,6 +47,12 @@ class BaseModel(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False, verbose_name='id')
     created_timestamp = models.DateTimeField(auto_now_add=True, verbose_name='Create Date')
 
+    class Meta:
+        indexes = [
+            # сортировка лент по дате: дата создания статьи хранится в таблице BaseModel
+            models.Index(fields=['-created_timestamp', '-id'], name='basemodel_created_id_idx'),
+        ]
+
     @classmethod
     def get_item_by_id(cls, search_id):
         return cls.objects.filter(id=search_id)
@@ -79,12 +97,28 @@ class Article(BaseModel):
     tags = TaggableManager(through=UUIDTaggedItem)
     status = models.CharField(max_length=1, choices=STATUS_CHOICES, verbose_name='Статус', default='D')
     blocked = models.BooleanField(default=False)
+    # копия ArticleRating.rating для сортировки и фильтрации лент без join
+    rating = models.PositiveIntegerField(default=0, db_index=True, verbose_name='rating')
+    # вычисляются из text при сохранении статьи, см. fill_text_stats
+    text_preview = models.CharField(max_length=250, blank=True, default='', verbose_name='text preview')
+    word_count = models.PositiveIntegerField(default=0, verbose_name='word count')
+    reading_time = models.PositiveSmallIntegerField(default=0, verbose_name='reading time, min')
+
+    # количество лайков, меняется только F()-выражениями в сигналах m2m_changed
+    like_count = models.PositiveIntegerField(default=0, verbose_name='likes count')
+
+    TEXT_STATS_FIELDS = ('text_preview', 'word_count', 'reading_time')
+    # rating пишется только UPDATE из ArticleRating (copy_article_rating_to_article, rebuild_ratings)
+    COUNTER_FIELDS = ('like_count', 'rating')
 
     def __init__(self, *args, **kwargs):
         """ для фиксации изменений о статусе аккаунта"""
         super(Article, self).__init__(*args, **kwargs)
         self.__original_status = self.status
         self.__original_blocked = self.blocked
+        # прежняя категория для сброса страниц обеих лент при переносе статьи;
+        # у статей, загруженных без categories (only), неизвестна
+        self.__original_categories_id = self.__dict__.get('categories_id')
 
     def __str__(self):
         return self.title
@@ -92,6 +126,47 @@ class Article(BaseModel):
     class Meta:
         db_table = 'article'
         ordering = ['-created_timestamp']
+        # частичные индексы под ленты: опубликованные незаблокированные статьи,
+        # сортировка по рейтингу, в том числе внутри категории и у автора
+        indexes = [
+            models.Index(fields=['-rating', '-basemodel_ptr'], name='article_feed_rating_idx',
+                         condition=models.Q(status='A', blocked=False)),
+            models.Index(fields=['categories', '-rating', '-basemodel_ptr'], name='article_feed_cat_rating_idx',
+                         condition=models.Q(status='A', blocked=False)),
+            models.Index(fields=['user', '-rating', '-basemodel_ptr'], name='article_feed_user_rating_idx',
+                         condition=models.Q(status='A', blocked=False)),
+        ]
+
+    def save(self, *args, **kwargs):
+        """
+        Превью, количество слов и время чтения пересчитываются при каждом сохранении текста.
+        Счетчики при сохранении существующей статьи не перезаписываются
+        """
+        exclude_counters_from_save(self, self.COUNTER_FIELDS, kwargs)
+        update_fields = kwargs.get('update_fields')
+        if 'text' not in self.get_deferred_fields() and (update_fields is None or 'text' in update_fields):
+            self.fill_text_stats()
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, *self.TEXT_STATS_FIELDS}
+        super().save(*args, **kwargs)
+        self.__original_categories_id = self.__dict__.get('categories_id')
+
+    def fill_text_stats(self):
+        self.text_preview, self.word_count, self.reading_time = get_text_stats(self.text)
+
+    def refresh_from_db(self, using=None, fields=None):
+        """
+        Отложенные поля (например, text в карточках лент) догружаются отдельным
+        запросом на каждую статью. В DEBUG это ошибка, иначе - предупреждение в лог.
+        """
+        deferred_fields = self.get_deferred_fields().intersection(fields or ())
+        if deferred_fields:
+            message = f'Загрузка отложенных полей {sorted(deferred_fields)} статьи {self.pk}, ' \
+                      f'добавьте их в queryset.cards()'
+            if settings.DEBUG:
+                raise FieldError(message)
+            logger.warning(message)
+        super().refresh_from_db(using=using, fields=fields)
 
     @classmethod
     def get_all_articles(cls) -> QuerySet:
@@ -134,11 +209,28 @@ class Article(BaseModel):
           """
         return ArticleComment.objects.select_related('article_comment').filter(article_comment=self.id)
 
+    def get_comment_thread(self) -> list:
+        """
+        Комментарии к статье вместе с ответами для страницы статьи.
+        Комментарии с авторами и количеством лайков загружаются одним запросом,
+        все ответы - вторым; ответы каждого комментария в атрибуте replies,
+        их количество в reply_count
+        """
+        comments = list(ArticleComment.objects.thread().filter(article_comment=self.id))
+        replies_by_comment = {}
+        for reply in ReplyComments.objects.select_related('user').filter(comment_to_reply__article_comment=self.id):
+            replies_by_comment.setdefault(reply.comment_to_reply_id, []).append(reply)
+        for comment in comments:
+            comment.replies = replies_by_comment.get(comment.id, [])
+            comment.reply_count = len(comment.replies)
+        return comments
+
     def get_other_articles_by_author(self) -> QuerySet:
         """
         Метод выводит последние по дате 3 статьи автора исключая текущую статью
           """
-        return Article.objects.filter(user=self.user, status='A').exclude(id=self.id).order_by('-created_timestamp')[:3]
+        return Article.objects.cards().filter(user=self.user_id, status='A').exclude(id=self.id).order_by(
+            '-created_timestamp')[:3]
 
     def get_absolute_url(self):
         """
@@ -150,8 +242,7 @@ class Article(BaseModel):
         """
         Метод выводит первые 250 символов текста статьи
         """
-        preview = re.sub(r'\<[^>]*\>', '', self.text)
-        return f'{preview[:250]}.....'
+        return f'{self.text_preview}.....'
 
     def get_like_url(self):
         """
@@ -165,11 +256,11 @@ class Article(BaseModel):
         """
         return reverse("like-api-toggle", kwargs={"pk": self.id})
 
-    def get_rating_by_article_id(self) -> QuerySet:
+    def get_rating_by_article_id(self) -> int:
         """
         Получение рейтинга для статьи.
         """
-        return ArticleRating.objects.get(article_rating=self.id).rating
+        return self.rating
 
     @property
     def is_for_correction(self) -> bool:
@@ -195,6 +286,104 @@ def create_article_rating(instance, created, **kwargs):
         return None
 
 
+@receiver(post_save, sender=Article)
+def update_article_search_index(sender, instance, update_fields, **kwargs):
+    """
+    Сигнал для обновления поискового индекса после изменения статьи
+    """
+    if update_fields is None or set(update_fields).intersection(SEARCH_DOCUMENT_FIELDS):
+        get_search_backend().update(instance)
+
+
+@receiver(post_delete, sender=Article)
+def remove_article_from_search_index(sender, instance, **kwargs):
+    """
+    Сигнал для удаления статьи из поискового индекса
+    """
+    get_search_backend().remove(instance.id)
+
+
+@receiver(post_save, sender=Article)
+def invalidate_feed_counts_by_article_status(sender, instance, created, **kwargs):
+    """
+    Сигнал для сброса закэшированных количеств статей в лентах
+    после публикации, снятия с публикации, блокировки или переноса статьи в другую категорию
+    """
+    previous_categories_id = instance._Article__original_categories_id
+    if created or instance.status != instance._Article__original_status \
+            or instance.blocked != instance._Article__original_blocked \
+            or (previous_categories_id is not None and previous_categories_id != instance.categories_id):
+        invalidate_feed_counts_on_commit()
+
+
+@receiver(post_delete, sender=Article)
+def invalidate_feed_counts_by_article_delete(sender, instance, **kwargs):
+    """
+    Сигнал для сброса закэшированных количеств статей в лентах после удаления статьи
+    """
+    invalidate_feed_counts_on_commit()
+
+
+def invalidate_feed_counts_on_commit():
+    """
+    Сброс закэшированных количеств статей после фиксации транзакции,
+    чтобы до нее количества не закэшировались заново со старыми данными
+    """
+    transaction.on_commit(invalidate_feed_counts)
+
+
+def invalidate_feed_pages_on_commit(*category_ids):
+    """
+    Сброс закэшированных страниц лент после фиксации транзакции,
+    чтобы до нее страницы не закэшировались заново со старыми данными
+    """
+    transaction.on_commit(lambda: invalidate_feed_pages(*category_ids))
+
+
+@receiver(post_save, sender=Article)
+def invalidate_feed_pages_by_article(sender, instance, **kwargs):
+    """
+    Сигнал для сброса закэшированных страниц лент после изменения статьи
+    """
+    invalidate_feed_pages_on_commit(instance.categories_id, instance._Article__original_categories_id)
+
+
+@receiver(post_delete, sender=Article)
+def invalidate_feed_pages_by_article_delete(sender, instance, **kwargs):
+    """
+    Сигнал для сброса закэшированных страниц лент после удаления статьи
+    """
+    invalidate_feed_pages_on_commit(instance.categories_id)
+
+
+@receiver(m2m_changed, sender=Article.likes.through)
+def invalidate_feed_pages_by_article_likes(sender, instance, action, pk_set, reverse, **kwargs):
+    """
+    Сигнал для сброса закэшированных страниц лент после изменения лайков к статьям
+    """
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return None
+    if not reverse:
+        invalidate_feed_pages_on_commit(instance.categories_id)
+    elif pk_set:
+        invalidate_feed_pages_on_commit(
+            *Article.objects.filter(id__in=pk_set).values_list('categories_id', flat=True).distinct()
+        )
+    else:
+        # лайки пользователя очищены целиком, статьи неизвестны
+        invalidate_feed_pages_on_commit()
+
+
+@receiver(post_save, sender=ArticleCategories)
+@receiver(post_delete, sender=ArticleCategories)
+def invalidate_feed_pages_by_category(sender, instance, **kwargs):
+    """
+    Сигнал для сброса всех закэшированных страниц лент после изменения категорий:
+    список категорий выводится в меню на каждой странице
+    """
+    invalidate_feed_pages_on_commit()
+
+
 class ArticleComment(BaseModel):
     """
     Models for Articles Comments
@@ -205,10 +394,26 @@ class ArticleComment(BaseModel):
     user = models.ForeignKey(User, on_delete=models.DO_NOTHING, verbose_name='Comment Author',
                              related_name='comment_author')
     likes = models.ManyToManyField(User, blank=True, related_name='comment_likes')
+    # количество лайков, меняется только F()-выражениями в сигналах m2m_changed
+    like_count = models.PositiveIntegerField(default=0, verbose_name='likes count')
+
+    objects = ArticleCommentManager()
+
+    COUNTER_FIELDS = ('like_count',)
 
     def __str__(self):
         return f'from "{self.user.username}" for "{self.article_comment.title}"'
 
+    def save(self, *args, **kwargs):
+        exclude_counters_from_save(self, self.COUNTER_FIELDS, kwargs)
+        super().save(*args, **kwargs)
+
+    def get_like_api_url(self):
+        """
+        Метод отдает ссылку api rest_framework для лайка комментарию без перезагрузки страницы
+        """
+        return reverse("comment-like-api-toggle", kwargs={"pk": self.id})
+
     class Meta:
         db_table = 'article_comments'
         ordering = ['-created_timestamp']
@@ -281,6 +486,15 @@ class ModeratorNotification(BaseModel):
         default='N'
     )
 
+    def __init__(self, *args, **kwargs):
+        """ для изменения счетчика взятых в работу запросов модератора"""
+        super().__init__(*args, **kwargs)
+        self._unread_owner_id = self.get_unread_owner_id()
+
+    def get_unread_owner_id(self):
+        """Модератор, у которого запрос считается открытым, или None"""
+        return None if self.status == self.REVIEWED else self.responsible_moderator_id
+
     def __str__(self):
         status_verbose_names = {'N': 'Новая',
                                 'A': 'Назначена',
@@ -298,10 +512,116 @@ class ModeratorNotification(BaseModel):
     def get_count_new_requests_moderation():
         return ModeratorNotification.objects.filter(status='N').count()
 
-    @receiver(post_save, sender=ArticleComment)
-    def create_moderator_notification(sender, instance, **kwargs):
-        if '@moderator' in instance.text:
-            ModeratorNotification.objects.create(comment_initiator=instance, )
+
+class CommentTrigger(models.Model):
+    """
+    Шаблоны, которые ищутся в новых комментариях (mainapp.triggers).
+    Изменения подхватываются работающими процессами без перезапуска.
+    Шаблон вида "упоминание" - префикс (@), за которым в тексте ищется имя пользователя
+    """
+    MODERATOR_REQUEST = 'moderator_request'
+    STOP_WORD = 'stop_word'
+    MENTION = 'mention'
+    LINK = 'link'
+
+    KIND_CHOICES = (
+        (MODERATOR_REQUEST, 'Запрос модератора'),
+        (STOP_WORD, 'Стоп-слово'),
+        (MENTION, 'Упоминание'),
+        (LINK, 'Ссылка'),
+    )
+
+    pattern = models.CharField(max_length=100, verbose_name='Шаблон')
+    kind = models.CharField(max_length=32, choices=KIND_CHOICES, verbose_name='Вид триггера')
+    is_active = models.BooleanField(default=True, verbose_name='Активен')
+    updated_timestamp = models.DateTimeField(auto_now=True, verbose_name='Изменен')
+
+    objects = CommentTriggerQuerySet.as_manager()
+
+    def __str__(self):
+        return f'{self.get_kind_display()}: "{self.pattern}"'
+
+    class Meta:
+        db_table = 'comment_trigger'
+        verbose_name = 'Триггер комментариев'
+        verbose_name_plural = 'Триггеры комментариев'
+
+    @staticmethod
+    def get_version_stamp():
+        """Отметка версии набора триггеров: меняется при добавлении, изменении и удалении"""
+        stamp = CommentTrigger.objects.aggregate(count=Count('id'), updated=Max('updated_timestamp'))
+        return stamp['count'], stamp['updated']
+
+
+@receiver(post_save, sender=CommentTrigger)
+@receiver(post_delete, sender=CommentTrigger)
+def reload_comment_triggers(sender, **kwargs):
+    """Пересборка автомата триггеров этого процесса при следующем комментарии"""
+    matcher_cache.reset()
+
+
+@receiver(post_save, sender=ArticleComment)
+def run_triggers_for_new_comment(sender, instance, created, **kwargs):
+    """
+    Поиск триггеров один раз для нового комментария, после фиксации транзакции;
+    правка комментария триггеры повторно не запускает
+    """
+    if created:
+        transaction.on_commit(lambda: run_comment_triggers(instance))
+
+
+@receiver(comment_trigger_matched, sender=ArticleComment)
+def create_moderator_notification_by_trigger(sender, event, **kwargs):
+    """Запрос модератору по комментарию с триггером вида "запрос модератора" (@moderator)"""
+    if event.kind == CommentTrigger.MODERATOR_REQUEST:
+        ModeratorNotification.objects.create(comment_initiator=event.comment)
+
+
+# имя пользователя после префикса упоминания: символы, допустимые в username
+MENTION_USERNAME_RE = re.compile(r'[\w.@+-]+')
+
+
+def get_mentioned_usernames(text, matches):
+    """
+    Имена пользователей после префиксов упоминаний. Префикс внутри слова
+    (mail@example.com) упоминанием не считается; точка в конце имени может
+    быть концом предложения, поэтому проверяются оба варианта
+    """
+    usernames = set()
+    for match in matches:
+        if match.position and MENTION_USERNAME_RE.fullmatch(text[match.position - 1]):
+            continue
+        username = MENTION_USERNAME_RE.match(text, match.position + len(match.pattern))
+        if username:
+            usernames.update((username.group(), username.group().rstrip('.')))
+    usernames.discard('')
+    return usernames
+
+
+@receiver(comment_trigger_matched, sender=ArticleComment)
+def notify_mentioned_users(sender, event, **kwargs):
+    """
+    Уведомления пользователям, упомянутым в комментарии (@username), через очередь
+    уведомлений. Упомянутые пользователи загружаются одним запросом по именам
+    """
+    if event.kind != CommentTrigger.MENTION:
+        return
+    comment = event.comment
+    usernames = get_mentioned_usernames(comment.text, event.matches)
+    if not usernames:
+        return
+    for user_id in User.objects.filter(username__in=usernames, is_active=True).values_list('id', flat=True):
+        enqueue_notification(NotificationOutbox.MENTION, user_id, comment.user_id, comment.article_comment_id)
+
+
+@receiver(comment_trigger_matched, sender=ArticleComment)
+def log_suspicious_comment(sender, event, **kwargs):
+    """Стоп-слова и ссылки в комментарии попадают в лог для модераторов"""
+    if event.kind not in (CommentTrigger.STOP_WORD, CommentTrigger.LINK):
+        return
+    patterns = sorted({match.pattern for match in event.matches})
+    logger.warning(f'Комментарий {event.comment.pk}: {event.kind}, совпадений {len(event.matches)}: '
+                   f'{", ".join(patterns)}')
 
 
 class ArticleRating(BaseModel):
@@ -313,6 +633,11 @@ class ArticleRating(BaseModel):
     rating = models.PositiveSmallIntegerField(default=0, verbose_name='rating')
     article_author = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name='article_author')
 
+    def __init__(self, *args, **kwargs):
+        """ для вычисления изменения рейтинга при сохранении"""
+        super().__init__(*args, **kwargs)
+        self.__original_rating = self.rating
+
     def __str__(self):
         return f'from article "{self.article_rating.title}" rating = "{self.rating}"'
 
@@ -320,6 +645,136 @@ class ArticleRating(BaseModel):
         db_table = 'article_rating'
         ordering = ['rating']
 
+    def set_rating(self, rating):
+        """
+        Изменение рейтинга статьи условным UPDATE: рейтинг меняется, только если
+        в базе все еще прежнее значение, иначе прежнее значение перечитывается.
+        Так одновременные изменения не теряются, а рейтинг автора получает точную разницу
+        """
+        while True:
+            previous_rating = self.__original_rating
+            updated = ArticleRating.objects.filter(pk=self.pk, rating=previous_rating).update(rating=rating)
+            if updated:
+                break
+            current_rating = ArticleRating.objects.filter(pk=self.pk).values_list('rating', flat=True).first()
+            if current_rating is None:
+                return None
+            self.__original_rating = current_rating
+
+        self.rating = self.__original_rating = rating
+        if rating != previous_rating:
+            copy_article_rating_to_article(ArticleRating, self)
+            invalidate_feed_pages_by_article_rating(ArticleRating, self)
+            change_author_article_rating(self.article_author_id, rating - previous_rating, 0)
+        return None
+
+
+@receiver(post_save, sender=ArticleRating)
+def copy_article_rating_to_article(sender, instance, **kwargs):
+    """
+    Сигнал для копирования рейтинга статьи в поле Article.rating
+    """
+    Article.objects.filter(id=instance.article_rating_id).update(rating=instance.rating)
+
+
+@receiver(post_save, sender=ArticleRating)
+def invalidate_feed_pages_by_article_rating(sender, instance, **kwargs):
+    """
+    Сигнал для сброса закэшированных страниц лент после изменения рейтинга статьи
+    """
+    invalidate_feed_pages_on_commit(
+        Article.objects.filter(id=instance.article_rating_id).values_list('categories_id', flat=True).first()
+    )
+
+
+def change_like_counter(model, relation_name, counter, sender, instance, action, pk_set, reverse):
+    """
+    Изменение счетчика лайков counter у объектов модели model после изменения
+    связи relation_name. Счетчик меняется F()-выражением в той же транзакции,
+    что и промежуточная таблица. Перед удалением запоминаются реально
+    существующие лайки, чтобы не уменьшить счетчик за несуществующие
+    """
+    field = model._meta.get_field(relation_name)
+    object_column = f'{field.m2m_field_name()}_id'
+    user_column = f'{field.m2m_reverse_field_name()}_id'
+    # у объекта (прямая связь) меняются лайки пользователей, у пользователя (обратная) - лайки объектов
+    own_column, other_column = (user_column, object_column) if reverse else (object_column, user_column)
+
+    if action in ('pre_remove', 'pre_clear'):
+        likes = sender.objects.filter(**{own_column: instance.pk})
+        if action == 'pre_remove':
+            likes = likes.filter(**{f'{other_column}__in': pk_set})
+        instance._removed_like_ids = list(likes.values_list(other_column, flat=True))
+        return None
+    if action == 'post_add':
+        changed_ids, delta = pk_set, 1
+    elif action in ('post_remove', 'post_clear'):
+        changed_ids, delta = instance.__dict__.pop('_removed_like_ids', []), -1
+    else:
+        return None
+    if not changed_ids:
+        return None
+
+    if reverse:
+        model.objects.filter(pk__in=changed_ids).update(**{counter: F(counter) + delta})
+    else:
+        model.objects.filter(pk=instance.pk).update(**{counter: F(counter) + delta * len(changed_ids)})
+
+
+@receiver(m2m_changed, sender=Article.likes.through)
+def change_article_like_count(sender, instance, action, pk_set, reverse, **kwargs):
+    """
+    Сигнал для изменения счетчика лайков статьи
+    """
+    change_like_counter(Article, 'likes', 'like_count', sender, instance, action, pk_set, reverse)
+
+
+@receiver(m2m_changed, sender=ArticleComment.likes.through)
+def change_comment_like_count(sender, instance, action, pk_set, reverse, **kwargs):
+    """
+    Сигнал для изменения счетчика лайков комментария
+    """
+    change_like_counter(ArticleComment, 'likes', 'like_count', sender, instance, action, pk_set, reverse)
+
+
+@receiver(m2m_changed, sender=UserProfile.stars.through)
+def change_author_star_count(sender, instance, action, pk_set, reverse, **kwargs):
+    """
+    Сигнал для изменения счетчика звезд (ранга) автора
+    """
+    change_like_counter(UserProfile, 'stars', 'star_count', sender, instance, action, pk_set, reverse)
+
+
+def invalidate_liked_ids_by_likes(kind, relation_name, instance, action, pk_set, reverse):
+    """
+    Сброс закэшированных множеств лайкнутых id у пользователей,
+    чьи лайки вида kind изменились (см. mainapp.likes), после фиксации транзакции
+    """
+    if action in ('post_add', 'post_remove'):
+        user_ids = [instance.pk] if reverse else pk_set
+    elif action == 'pre_clear' and not reverse:
+        user_ids = list(getattr(instance, relation_name).values_list('id', flat=True))
+    elif action == 'post_clear' and reverse:
+        user_ids = [instance.pk]
+    else:
+        return None
+    transaction.on_commit(lambda: invalidate_liked_ids(kind, *user_ids))
+
+
+@receiver(m2m_changed, sender=Article.likes.through)
+def invalidate_liked_ids_by_article_likes(sender, instance, action, pk_set, reverse, **kwargs):
+    invalidate_liked_ids_by_likes('article', 'likes', instance, action, pk_set, reverse)
+
+
+@receiver(m2m_changed, sender=ArticleComment.likes.through)
+def invalidate_liked_ids_by_comment_likes(sender, instance, action, pk_set, reverse, **kwargs):
+    invalidate_liked_ids_by_likes('comment', 'likes', instance, action, pk_set, reverse)
+
+
+@receiver(m2m_changed, sender=UserProfile.stars.through)
+def invalidate_liked_ids_by_stars(sender, instance, action, pk_set, reverse, **kwargs):
+    invalidate_liked_ids_by_likes('star', 'stars', instance, action, pk_set, reverse)
+
 
 @receiver(m2m_changed, sender=ArticleComment.likes.through)
 def change_author_rating_by_likes_to_author_comments(sender, instance, action, **kwargs):
@@ -327,41 +782,110 @@ def change_author_rating_by_likes_to_author_comments(sender, instance, action, *
     Сигнал для изменения рейтинга автора от изменения лайков к комментариям этого автора
     """
 
-    author = UserProfile.objects.get(user=instance.user.id)
-
     if action == 'post_add':
-        author.rating += 1
-        author.save()
+        UserProfile.objects.filter(user_id=instance.user_id).update(rating=F('rating') + 1)
+
+    if action == 'post_remove':
+        UserProfile.objects.filter(user_id=instance.user_id, rating__gt=0).update(rating=F('rating') - 1)
+
 
-    if action == 'post_remove' and author.rating != 0:
-        author.rating -= 1
-        author.save()
+def change_author_article_rating(author_id, rating_delta, count_delta):
+    """
+    Изменение рейтинга автора от изменения рейтинга его статей.
+    В профиле хранятся сумма и количество рейтингов статей, средний рейтинг
+    пересчитывается из них в том же UPDATE, без агрегации по всем статьям автора
+    и без сохранения пользователя целиком
+    """
+    rating_sum = F('article_rating_sum') + rating_delta
+    rating_count = F('article_rating_count') + count_delta
+    average_rating = Coalesce(rating_sum / NullIf(rating_count, 0), 0)
+    UserProfile.objects.filter(user_id=author_id).update(
+        article_rating_sum=rating_sum,
+        article_rating_count=rating_count,
+        rating=F('rating') - F('previous_article_rating') + average_rating,
+        previous_article_rating=average_rating,
+    )
 
 
 @receiver(post_save, sender=ArticleRating)
-@receiver(post_delete, sender=ArticleRating)
-def change_author_rating_by_article_rating(sender, instance, **kwargs):
+def change_author_rating_by_article_rating(sender, instance, created, **kwargs):
     """
     Сигнал для изменения рейтинга автора от изменения рейтинга статей этого автора
     """
-    author = instance.article_rating.user
-    instance.article_author = author
+    previous_rating = 0 if created else instance._ArticleRating__original_rating
+    if created or instance.rating != previous_rating:
+        change_author_article_rating(instance.article_author_id, instance.rating - previous_rating, int(created))
+    instance._ArticleRating__original_rating = instance.rating
 
-    previous_article_rating = author.userprofile.previous_article_rating
-    author.userprofile.rating -= previous_article_rating
 
-    rating_objects_by_author = None if not ArticleRating.objects.filter(article_author=author) \
-        else ArticleRating.objects.filter(article_author=author)
+@receiver(post_delete, sender=ArticleRating)
+def change_author_rating_by_article_rating_delete(sender, instance, **kwargs):
+    """
+    Сигнал для изменения рейтинга автора после удаления рейтинга статьи
+    """
+    change_author_article_rating(instance.article_author_id, -instance._ArticleRating__original_rating, -1)
 
-    if not rating_objects_by_author:
-        new_article_rating = instance.rating
+
+class ArticleRatingEvent(models.Model):
+    """
+    Событие "рейтинг статьи нужно пересчитать" для отложенного пересчета.
+    Лайки и комментарии только добавляют событие, рейтинг пересчитывает
+    команда process_rating_events - один раз на статью за пачку событий
+    """
+    # без ограничения внешнего ключа: события удаленных статей просто пропускаются
+    article = models.ForeignKey(Article, on_delete=models.DO_NOTHING, db_constraint=False,
+                                related_name='+', verbose_name='article')
+    created_timestamp = models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='created')
+
+    class Meta:
+        db_table = 'article_rating_event'
+
+
+def recompute_article_rating(article_id):
+    """
+    Пересчет рейтинга статьи по количеству лайков и комментариев
+    """
+    article_rating = ArticleRating.objects.filter(article_rating_id=article_id).first()
+    if article_rating is None:
+        return None
+    # ценость одного лайка и одного комментария
+    value_one_like = 1
+    value_one_comments = 0.2
+    like_count = Article.objects.filter(id=article_id).values_list('like_count', flat=True).first() or 0
+    comment_count = ArticleComment.objects.filter(article_comment=article_id).count()
+    new_article_rating = like_count * value_one_like + int(comment_count * value_one_comments)
+    article_rating.set_rating(new_article_rating)
+    return None
+
+
+def schedule_article_rating_update(article_id):
+    """
+    Пересчет рейтинга статьи: сразу или, если включен settings.ARTICLE_RATING_WRITE_BEHIND,
+    добавлением события для команды process_rating_events
+    """
+    if settings.ARTICLE_RATING_WRITE_BEHIND:
+        ArticleRatingEvent.objects.create(article_id=article_id)
     else:
-        new_article_rating = rating_objects_by_author.aggregate(avg_duration=Avg('rating'))['avg_duration']
+        recompute_article_rating(article_id)
 
-    author.userprofile.rating += int(new_article_rating)
-    author.userprofile.previous_article_rating = int(new_article_rating)
 
-    author.save()
+def flush_article_rating_events(article_ids):
+    """
+    Пересчет рейтинга статей с событиями и удаление обработанных событий.
+    Удаляются только события, добавленные до пересчета, более поздние
+    дождутся следующего запуска
+    """
+    processed = 0
+    for article_id in article_ids:
+        with transaction.atomic():
+            last_event_id = ArticleRatingEvent.objects.filter(article_id=article_id) \
+                .order_by('-id').values_list('id', flat=True).first()
+            if last_event_id is None:
+                continue
+            recompute_article_rating(article_id)
+            ArticleRatingEvent.objects.filter(article_id=article_id, id__lte=last_event_id).delete()
+            processed += 1
+    return processed
 
 
 @receiver(m2m_changed, sender=Article.likes.through)
@@ -369,16 +893,9 @@ def change_article_rating_by_likes_to_article(instance, action, **kwargs):
     """
     Сигнал для изменения рейтинга статьи от изменения кол-ва лайков к статье
     """
-    article_rating = ArticleRating.objects.get(article_rating_id=instance.id)
-    # ценость одного лайка и одного комментария
-    value_one_like = 1
-    value_one_comments = 0.2
     if action in ['post_add', 'post_remove']:
-        new_article_rating = instance.likes.count() * value_one_like + int(
-            instance.get_comment_count_by_article_id() * value_one_comments)
-        article_rating.rating = new_article_rating
-        article_rating.save()
-        return None
+        schedule_article_rating_update(instance.id)
+    return None
 
 
 @receiver(post_save, sender=ArticleComment)
@@ -387,14 +904,7 @@ def change_article_rating_by_count_comments_to_article(instance, **kwargs):
     """
     Сигнал для изменения рейтинга статьи от изменения кол-ва комментов к статье
     """
-    article_rating = ArticleRating.objects.get(article_rating_id=instance.article_comment.id)
-    # ценость одного лайка и одного комментария
-    value_one_like = 1
-    value_one_comments = 0.2
-    new_article_rating = instance.article_comment.likes.count() * value_one_like + int(
-        instance.article_comment.get_comment_count_by_article_id() * value_one_comments)
-    article_rating.rating = new_article_rating
-    article_rating.save()
+    schedule_article_rating_update(instance.article_comment_id)
     return None
 
 
@@ -413,6 +923,8 @@ class NotificationUsersFromModerator(BaseModel):
 
     moderator = models.UUIDField(
         verbose_name='модератор',
+        blank=True,
+        null=True,
     )
 
     is_read = models.BooleanField(
@@ -427,17 +939,23 @@ class NotificationUsersFromModerator(BaseModel):
         null=True,
     )
 
+    def __init__(self, *args, **kwargs):
+        """ для изменения счетчика непрочитанных уведомлений"""
+        super().__init__(*args, **kwargs)
+        self._unread_owner_id = self.get_unread_owner_id()
+
+    def get_unread_owner_id(self):
+        """Получатель непрочитанного уведомления или None"""
+        return None if self.is_read else self.recipient_notification_id
+
     def __str__(self):
         return f'уведомление о блокировке пользователя "{self.recipient_notification.username}"'
 
     @staticmethod
-    def get_moderator(inspect_stack):
-        """получаем модератора из request"""
-        for frame_record in inspect_stack:
-            if frame_record[3] == 'get_response':
-                request = frame_record[0].f_locals['request']
-                return request.user
-        return
+    def get_moderator_id():
+        """id модератора, выполняющего действие; None вне запроса (shell, команды)"""
+        moderator = get_current_user()
+        return moderator.pk if moderator else None
 
     @staticmethod
     def get_full_message(part_1, part_2):
@@ -485,11 +1003,9 @@ class NotificationUsersFromModerator(BaseModel):
             return  # если ни чего не менялось или если пользователь как был заблокирован бессрочно, так и остался
 
         message = NotificationUsersFromModerator.get_full_message(part_1, part_2)
-        moderator = NotificationUsersFromModerator.get_moderator(inspect.stack())
-
         NotificationUsersFromModerator.objects.create(
             recipient_notification=instance,
-            moderator=moderator.pk,
+            moderator=NotificationUsersFromModerator.get_moderator_id(),
             message=message
         )
 
@@ -499,10 +1015,9 @@ class NotificationUsersFromModerator(BaseModel):
         Уведомление пользователя при блокировке статьи модератором
         """
 
-        recipient_notification = instance.user
-        moderator = NotificationUsersFromModerator.get_moderator(inspect.stack())
+        moderator_id = NotificationUsersFromModerator.get_moderator_id()
 
-        if recipient_notification == moderator:
+        if instance.user_id == moderator_id:
             #  Если изменения вносит автор - выходим
             return
 
@@ -559,8 +1074,8 @@ class NotificationUsersFromModerator(BaseModel):
             return
 
         NotificationUsersFromModerator.objects.create(
-            recipient_notification=recipient_notification,
-            moderator=moderator.pk,
+            recipient_notification_id=instance.user_id,
+            moderator=moderator_id,
             message=message
         )
 
@@ -569,16 +1084,14 @@ class NotificationUsersFromModerator(BaseModel):
         """
         Уведомление пользователя при удалении комментария модератором
         """
-        recipient_notification = instance.user
-        moderator = NotificationUsersFromModerator.get_moderator(inspect.stack())
         if len(instance.text) > 60:
             message = f'Модератор удалил Ваш комментарий: {instance.text[:60]}...'
         else:
             message = f'Модератор удалил Ваш комментарий: {instance.text}'
 
         NotificationUsersFromModerator.objects.create(
-            recipient_notification=recipient_notification,
-            moderator=moderator.pk,
+            recipient_notification_id=instance.user_id,
+            moderator=NotificationUsersFromModerator.get_moderator_id(),
             message=message
         )
 
@@ -634,25 +1147,15 @@ class ModeratorNotificationAboutReModeration(BaseModel):
         db_table = 'moderator_notification_about_re_moderation'
         ordering = ['-created_timestamp']
 
-    @staticmethod
-    def get_user(inspect_stack):
-        """получаем модератора из request"""
-        for frame_record in inspect_stack:
-            if frame_record[3] == 'get_response':
-                request = frame_record[0].f_locals['request']
-                return request.user
-        return
-
     @receiver(post_save, sender=Article)
     def create_notification_article_status_update(sender, instance, **kwargs):
         """
         Уведомление модератора об отправки статьи автором на модерацию
         """
 
-        author_article = instance.user
-        user = ModeratorNotificationAboutReModeration.get_user(inspect.stack())
+        user = get_current_user()
 
-        if author_article != user:
+        if user is None or instance.user_id != user.pk:
             #  Если изменения вносит не автор - выходим
             return
 
@@ -677,15 +1180,44 @@ class ModeratorNotificationAboutReModeration(BaseModel):
         return ModeratorNotificationAboutReModeration.objects.filter(status='N').count()
 
 
+# виды уведомлений (NotificationOutbox), которые объединяются в одно непрочитанное уведомление об объекте
+COALESCED_NOTIFICATION_KINDS = ('article_like', 'author_star', 'comment_like')
+
+
 class NotificationUserAfterLikeAndComment(BaseModel):
     """
     Уведомления пользователей о лайках статьи, лайках автора и комментариях к статье
     """
     recipient_notification = models.ForeignKey(User, null=False, db_index=True, on_delete=models.CASCADE,
                                                verbose_name='получатель уведомления')
-    sender_notification = models.UUIDField(verbose_name='отправитель уведомления')
+    sender_notification = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL,
+                                            related_name='sent_notifications', verbose_name='отправитель уведомления')
     is_read = models.BooleanField(default=False, verbose_name='прочитано')
     message = models.CharField(max_length=200, verbose_name='уведомление', blank=True, null=True)
+    # вид (NotificationOutbox.KIND_CHOICES) и объект уведомления для объединения лайков,
+    # у уведомлений, созданных до объединения или без него, вид пустой
+    kind = models.CharField(max_length=16, blank=True, default='', verbose_name='вид уведомления')
+    target_id = models.UUIDField(blank=True, null=True, verbose_name='объект уведомления')
+    sender_count = models.PositiveIntegerField(default=1, verbose_name='количество отправителей')
+    last_sender_ids = models.JSONField(default=list, blank=True, verbose_name='последние отправители')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recipient_notification', 'kind', 'target_id'],
+                condition=models.Q(is_read=False, kind__in=COALESCED_NOTIFICATION_KINDS),
+                name='notification_unread_coalesce_uniq',
+            ),
+        ]
+
+    def __init__(self, *args, **kwargs):
+        """ для изменения счетчика непрочитанных уведомлений"""
+        super().__init__(*args, **kwargs)
+        self._unread_owner_id = self.get_unread_owner_id()
+
+    def get_unread_owner_id(self):
+        """Получатель непрочитанного уведомления или None"""
+        return None if self.is_read else self.recipient_notification_id
 
     def __str__(self):
         return f'уведомление пользователя "{self.recipient_notification.username} о лайке или комменте"'
@@ -694,7 +1226,7 @@ class NotificationUserAfterLikeAndComment(BaseModel):
         """
         Метод отдает пользователя, который стал инициатором создания уведомления
         """
-        return User.objects.filter(pk=self.sender_notification).first()
+        return self.sender_notification
 
     @staticmethod
     def get_user_name_sender(user_sender):
@@ -711,15 +1243,8 @@ class NotificationUserAfterLikeAndComment(BaseModel):
         Сигнал для отправки уведомления автору статьи, после лайка статьи
         """
         if action == 'post_add':
-            user_sender_id = [_ for _ in pk_set][0]
-            user_sender = UserProfile.objects.get(user_id=user_sender_id).user
-            user_sender_name = NotificationUserAfterLikeAndComment.get_user_name_sender(user_sender)
-            if user_sender != instance.user:
-                NotificationUserAfterLikeAndComment.objects.create(
-                    recipient_notification=instance.user,
-                    sender_notification=user_sender.pk,
-                    message=f'{user_sender_name} поставил лайк статье: {instance.title}'
-                )
+            for user_sender_id in pk_set:
+                enqueue_notification(NotificationOutbox.ARTICLE_LIKE, instance.user_id, user_sender_id, instance.id)
         return None
 
     @receiver(m2m_changed, sender=UserProfile.stars.through)
@@ -728,15 +1253,8 @@ class NotificationUserAfterLikeAndComment(BaseModel):
         Сигнал для отправки уведомления юзеру, которому повысили ранг
         """
         if action == 'post_add':
-            user_sender_id = [_ for _ in pk_set][0]
-            user_sender = UserProfile.objects.get(user_id=user_sender_id).user
-            user_sender_name = NotificationUserAfterLikeAndComment.get_user_name_sender(user_sender)
-            if user_sender != instance.user:
-                NotificationUserAfterLikeAndComment.objects.create(
-                    recipient_notification=instance.user,
-                    sender_notification=user_sender.pk,
-                    message=f'{user_sender_name} повысил Ваш ранг!'
-                )
+            for user_sender_id in pk_set:
+                enqueue_notification(NotificationOutbox.AUTHOR_STAR, instance.user_id, user_sender_id, instance.user_id)
         return None
 
     @receiver(m2m_changed, sender=ArticleComment.likes.through)
@@ -745,34 +1263,372 @@ class NotificationUserAfterLikeAndComment(BaseModel):
         Сигнал для отправки уведомления автору комментария, после лайка комментария
         """
         if action == 'post_add':
-            user_sender_id = [_ for _ in pk_set][0]
-            user_sender = UserProfile.objects.get(user_id=user_sender_id).user
-            user_sender_name = NotificationUserAfterLikeAndComment.get_user_name_sender(user_sender)
-            if len(instance.text) > 60:
-                comment = f'{instance.text[:60]}...'
-            else:
-                comment = instance.text
-            if user_sender != instance.user:
-                NotificationUserAfterLikeAndComment.objects.create(
-                    recipient_notification=instance.user,
-                    sender_notification=user_sender.pk,
-                    message=f'{user_sender_name} поставил лайк комментарию: {comment}'
-                )
+            for user_sender_id in pk_set:
+                enqueue_notification(NotificationOutbox.COMMENT_LIKE, instance.user_id, user_sender_id, instance.id)
         return None
 
     @receiver(post_save, sender=ArticleComment)
-    def notify_user_after_added_comment(sender, instance, **kwargs):
+    def notify_user_after_added_comment(sender, instance, created, **kwargs):
         """
-        Сигнал для отправки уведомления автору статьи, после добавления комментария к статье
+        Сигнал для отправки уведомления автору статьи, после добавления комментария к статье;
+        правка комментария уведомление повторно не отправляет
         """
-        user_sender_name = NotificationUserAfterLikeAndComment.get_user_name_sender(instance.user)
-        if instance.user != instance.article_comment.user:
+        if not created:
+            return None
+        # автор статьи берется из уже загруженной статьи, иначе читается только user_id
+        if ArticleComment.article_comment.is_cached(instance):
+            article_author_id = instance.article_comment.user_id
+        else:
+            article_author_id = Article.objects.filter(id=instance.article_comment_id) \
+                .values_list('user_id', flat=True).first()
+        enqueue_notification(NotificationOutbox.COMMENT, article_author_id, instance.user_id,
+                             instance.article_comment_id)
+        return None
+
+
+class NotificationSender(models.Model):
+    """
+    Отправители объединенного уведомления, по строке на пользователя. Уникальный
+    индекс отсекает повторные лайки, в самом уведомлении хранятся только счетчик
+    и последние отправители
+    """
+    notification = models.ForeignKey(NotificationUserAfterLikeAndComment, on_delete=models.CASCADE,
+                                     related_name='+', verbose_name='notification')
+    # без ограничения внешнего ключа, как в NotificationOutbox
+    sender = models.ForeignKey(User, on_delete=models.DO_NOTHING, db_constraint=False,
+                               related_name='+', verbose_name='sender')
+
+    class Meta:
+        db_table = 'notification_sender'
+        constraints = [
+            models.UniqueConstraint(fields=['notification', 'sender'], name='notification_sender_uniq'),
+        ]
+
+
+class NotificationOutbox(models.Model):
+    """
+    Очередь уведомлений о лайках, комментариях и упоминаниях. Запрос пользователя только
+    добавляет строку после фиксации транзакции, уведомления с текстом создает
+    команда process_notification_outbox
+    """
+    ARTICLE_LIKE = 'article_like'
+    AUTHOR_STAR = 'author_star'
+    COMMENT_LIKE = 'comment_like'
+    COMMENT = 'comment'
+    MENTION = 'mention'
+
+    KIND_CHOICES = (
+        (ARTICLE_LIKE, 'Лайк статьи'),
+        (AUTHOR_STAR, 'Повышение ранга'),
+        (COMMENT_LIKE, 'Лайк комментария'),
+        (COMMENT, 'Комментарий к статье'),
+        (MENTION, 'Упоминание в комментарии'),
+    )
+
+    kind = models.CharField(max_length=16, choices=KIND_CHOICES, verbose_name='kind')
+    # без ограничений внешних ключей: уведомления удаленных пользователей и объектов пропускаются
+    recipient = models.ForeignKey(User, on_delete=models.DO_NOTHING, db_constraint=False,
+                                  related_name='+', verbose_name='recipient')
+    sender = models.ForeignKey(User, on_delete=models.DO_NOTHING, db_constraint=False,
+                               related_name='+', verbose_name='sender')
+    # статья, комментарий или пользователь, к которому относится уведомление
+    target_id = models.UUIDField(verbose_name='target')
+    created_timestamp = models.DateTimeField(auto_now_add=True, verbose_name='created')
+
+    class Meta:
+        db_table = 'notification_outbox'
+
+
+class NotificationArchive(models.Model):
+    """
+    Архив прочитанных уведомлений, перенесенных командой archive_notifications
+    из NotificationUsersFromModerator и NotificationUserAfterLikeAndComment
+    """
+    MODERATOR = 'moderator'
+    GENERAL = 'general'
+
+    SOURCE_CHOICES = (
+        (MODERATOR, 'Уведомления модераторов'),
+        (GENERAL, 'Уведомления о лайках и комментариях'),
+    )
+
+    source = models.CharField(max_length=16, choices=SOURCE_CHOICES, verbose_name='source')
+    notification_id = models.UUIDField(verbose_name='notification id')
+    # без внешнего ключа: архив не мешает удалению пользователей
+    recipient_id = models.UUIDField(db_index=True, verbose_name='recipient')
+    message = models.TextField(blank=True, default='', verbose_name='message')
+    # остальные поля уведомления: отправитель, модератор, вид и т.д.
+    data = models.JSONField(default=dict, blank=True, verbose_name='data')
+    created_timestamp = models.DateTimeField(verbose_name='created')
+    archived_timestamp = models.DateTimeField(auto_now_add=True, verbose_name='archived')
+
+    class Meta:
+        db_table = 'notification_archive'
+
+
+def enqueue_notification(kind, recipient_id, sender_id, target_id):
+    """
+    Добавление уведомления в очередь после фиксации текущей транзакции.
+    Если settings.NOTIFICATION_OUTBOX выключен, уведомление создается сразу
+    """
+    if recipient_id is None or recipient_id == sender_id:
+        return None
+    item = NotificationOutbox(kind=kind, recipient_id=recipient_id, sender_id=sender_id, target_id=target_id)
+    if settings.NOTIFICATION_OUTBOX:
+        transaction.on_commit(item.save)
+    else:
+        transaction.on_commit(lambda: deliver_notifications([item]))
+    return None
+
+
+def get_notification_message(kind, sender, target, sender_count=1):
+    """
+    Текст уведомления; для объединенного уведомления называется последний
+    отправитель и количество остальных
+    """
+    user_sender_name = NotificationUserAfterLikeAndComment.get_user_name_sender(sender)
+    if sender_count > 1:
+        user_sender_name = f'{user_sender_name} и еще {sender_count - 1}'
+    plural = sender_count > 1
+    if kind == NotificationOutbox.ARTICLE_LIKE:
+        return f'{user_sender_name} {"поставили" if plural else "поставил"} лайк статье: {target.title}'
+    if kind == NotificationOutbox.AUTHOR_STAR:
+        return f'{user_sender_name} {"повысили" if plural else "повысил"} Ваш ранг!'
+    if kind == NotificationOutbox.COMMENT_LIKE:
+        comment = f'{target.text[:60]}...' if len(target.text) > 60 else target.text
+        return f'{user_sender_name} {"поставили" if plural else "поставил"} лайк комментарию: {comment}'
+    if kind == NotificationOutbox.MENTION:
+        return f'{user_sender_name} упомянул Вас в комментарии к статье: {target.title}'
+    return f'{user_sender_name} оставил комментарий к статье: {target.title}'
+
+
+def add_notification_senders(notification, sender_ids):
+    """
+    Добавление отправителей объединенного уведомления. Уже известные отправители
+    пропускаются: их отсекает запрос по уникальному индексу notification_sender_uniq,
+    а вставку - ON CONFLICT DO NOTHING. Строка уведомления заблокирована вызывающим
+    (select_for_update или вставка), поэтому отправители одного уведомления
+    добавляются по очереди. Возвращает количество новых отправителей
+    """
+    known_sender_ids = set(NotificationSender.objects.filter(notification=notification, sender_id__in=sender_ids)
+                           .values_list('sender_id', flat=True))
+    new_sender_ids = [sender_id for sender_id in sender_ids if sender_id not in known_sender_ids]
+    NotificationSender.objects.bulk_create(
+        [NotificationSender(notification=notification, sender_id=sender_id) for sender_id in new_sender_ids],
+        ignore_conflicts=True,
+    )
+    return len(new_sender_ids)
+
+
+def upsert_coalesced_notification(kind, recipient_id, target_id, sender_ids, senders, target):
+    """
+    Объединение уведомлений одного вида об одном объекте: непрочитанное уведомление
+    обновляется на месте (счетчик отправителей, последние отправители, текст),
+    если его нет - создается. Одновременное создание двумя воркерами отсекает
+    уникальный индекс notification_unread_coalesce_uniq, тогда уведомление обновляется.
+    Повторный лайк того же пользователя счетчик не увеличивает, см. NotificationSender
+    """
+    unread = NotificationUserAfterLikeAndComment.objects.select_for_update().filter(
+        recipient_notification_id=recipient_id, kind=kind, target_id=target_id, is_read=False
+    )
+    last_sender_ids = [str(sender_id) for sender_id in reversed(sender_ids)]
+    for _ in range(2):
+        notification = unread.first()
+        if notification is not None:
+            break
+        try:
+            with transaction.atomic():
+                notification = NotificationUserAfterLikeAndComment.objects.create(
+                    recipient_notification_id=recipient_id,
+                    sender_notification_id=sender_ids[-1],
+                    kind=kind,
+                    target_id=target_id,
+                    sender_count=len(sender_ids),
+                    last_sender_ids=last_sender_ids[:settings.NOTIFICATION_COALESCE_SENDERS],
+                    message=get_notification_message(kind, senders[sender_ids[-1]], target, len(sender_ids)),
+                )
+                add_notification_senders(notification, sender_ids)
+                return notification
+        except IntegrityError:
+            continue
+    else:
+        # уведомление дважды создавал другой воркер и его сразу прочитали;
+        # DoesNotExist откатывает пачку очереди, она будет обработана повторно
+        notification = unread.get()
+    added = add_notification_senders(notification, sender_ids)
+    if added:
+        NotificationUserAfterLikeAndComment.objects.filter(pk=notification.pk) \
+            .update(sender_count=F('sender_count') + added)
+        # строка заблокирована, значение в памяти совпадает с базой
+        notification.sender_count += added
+    notification.sender_notification_id = sender_ids[-1]
+    notification.last_sender_ids = (last_sender_ids + [
+        sender_id for sender_id in notification.last_sender_ids if sender_id not in last_sender_ids
+    ])[:settings.NOTIFICATION_COALESCE_SENDERS]
+    notification.message = get_notification_message(kind, senders[sender_ids[-1]], target, notification.sender_count)
+    notification.save(update_fields=['sender_notification', 'last_sender_ids', 'message'])
+    return notification
+
+
+def deliver_notifications(items):
+    """
+    Создание уведомлений для пачки строк очереди. Отправители, статьи и
+    комментарии пачки загружаются тремя запросами, уведомления создаются
+    в одной транзакции. Если включен settings.NOTIFICATION_COALESCE, лайки
+    одного объекта объединяются в одно непрочитанное уведомление.
+    Возвращает количество созданных и обновленных уведомлений
+    """
+    senders = User.objects.select_related('userprofile').in_bulk({item.sender_id for item in items})
+    target_ids = {}
+    for item in items:
+        target_ids.setdefault(item.kind, set()).add(item.target_id)
+    article_ids = target_ids.get(NotificationOutbox.ARTICLE_LIKE, set()) \
+        | target_ids.get(NotificationOutbox.COMMENT, set()) | target_ids.get(NotificationOutbox.MENTION, set())
+    targets = {
+        NotificationOutbox.ARTICLE_LIKE: Article.objects.only('id', 'title', 'status', 'blocked').in_bulk(article_ids),
+        NotificationOutbox.AUTHOR_STAR: {user_id: True for user_id in target_ids.get(NotificationOutbox.AUTHOR_STAR, ())},
+        NotificationOutbox.COMMENT_LIKE: ArticleComment.objects.only('id', 'text')
+        .in_bulk(target_ids.get(NotificationOutbox.COMMENT_LIKE, set())),
+    }
+    targets[NotificationOutbox.COMMENT] = targets[NotificationOutbox.ARTICLE_LIKE]
+    targets[NotificationOutbox.MENTION] = targets[NotificationOutbox.ARTICLE_LIKE]
+
+    # отправители по уведомлениям; уведомления удаленных объектов и пользователей пропускаются
+    groups = {}
+    for index, item in enumerate(items):
+        if item.sender_id not in senders or item.target_id not in targets[item.kind]:
+            continue
+        coalesce = item.kind in COALESCED_NOTIFICATION_KINDS
+        key = (item.kind, item.recipient_id, item.target_id) if coalesce and settings.NOTIFICATION_COALESCE else index
+        sender_ids = groups.setdefault(key, (item, []))[1]
+        if item.sender_id in sender_ids:
+            sender_ids.remove(item.sender_id)
+        sender_ids.append(item.sender_id)
+
+    with transaction.atomic():
+        for key, (item, sender_ids) in groups.items():
+            target = targets[item.kind][item.target_id]
+            if isinstance(key, tuple):
+                upsert_coalesced_notification(item.kind, item.recipient_id, item.target_id, sender_ids, senders,
+                                              target)
+                continue
+            # bulk_create недоступен для моделей, унаследованных от BaseModel (multi-table inheritance)
             NotificationUserAfterLikeAndComment.objects.create(
-                recipient_notification=instance.article_comment.user,
-                sender_notification=instance.user.pk,
-                message=f'{user_sender_name} оставил комментарий к статье: {instance.article_comment}'
+                recipient_notification_id=item.recipient_id,
+                sender_notification_id=item.sender_id,
+                # без объединения вид лайков не сохраняется, чтобы не нарушить уникальность
+                kind='' if item.kind in COALESCED_NOTIFICATION_KINDS else item.kind,
+                target_id=item.target_id,
+                last_sender_ids=[str(item.sender_id)],
+                message=get_notification_message(item.kind, senders[item.sender_id], target),
             )
+    return len(groups)
+
+
+def process_notification_outbox(batch_size=500):
+    """
+    Обработка одной пачки очереди уведомлений в порядке добавления.
+    Строки пачки блокируются (SKIP LOCKED), поэтому воркеров может быть несколько.
+    Возвращает количество обработанных строк очереди
+    """
+    with transaction.atomic():
+        items = list(NotificationOutbox.objects.select_for_update(skip_locked=True).order_by('id')[:batch_size])
+        if not items:
+            return 0
+        deliver_notifications(items)
+        NotificationOutbox.objects.filter(id__in=[item.id for item in items]).delete()
+    return len(items)
+
+
+# вид счетчика для шаблонов и потока событий и поле профиля, в котором он хранится
+UNREAD_COUNTERS = {
+    'blocking': 'unread_blocking_count',
+    'general': 'unread_general_count',
+    'moderation': 'open_moderation_count',
+}
+
+
+def change_unread_counter(counter, user_id, delta):
+    """
+    Изменение счетчика counter профиля пользователя (непрочитанные уведомления,
+    открытые запросы на модерацию) F()-выражением и сброс его кэша после фиксации
+    транзакции, чтобы до нее счетчики не закэшировались заново со старыми значениями
+    """
+    if user_id is None or not delta:
+        return None
+    value = F(counter) + delta if delta > 0 else Greatest(F(counter) + delta, 0)
+    UserProfile.objects.filter(user_id=user_id).update(**{counter: value})
+    transaction.on_commit(lambda: invalidate_unread_counts(user_id))
+    counter_name = next(name for name, field in UNREAD_COUNTERS.items() if field == counter)
+    publish_user_event(user_id, 'unread', {'counter': counter_name, 'delta': delta})
+    return None
+
+
+def change_unread_counter_by_save(counter, instance, created):
+    """
+    Перенос открытой записи между счетчиками пользователей при сохранении:
+    запись создана, прочитана, рассмотрена или назначена другому модератору
+    """
+    previous_owner_id = None if created else instance._unread_owner_id
+    owner_id = instance.get_unread_owner_id()
+    if previous_owner_id != owner_id:
+        change_unread_counter(counter, previous_owner_id, -1)
+        change_unread_counter(counter, owner_id, 1)
+        instance._unread_owner_id = owner_id
+    return None
+
+
+@receiver(post_save, sender=NotificationUsersFromModerator)
+def change_unread_blocking_count(sender, instance, created, **kwargs):
+    change_unread_counter_by_save('unread_blocking_count', instance, created)
+
+
+@receiver(post_save, sender=NotificationUserAfterLikeAndComment)
+def change_unread_general_count(sender, instance, created, **kwargs):
+    change_unread_counter_by_save('unread_general_count', instance, created)
+
+
+@receiver(post_save, sender=ModeratorNotification)
+def change_open_moderation_count(sender, instance, created, **kwargs):
+    change_unread_counter_by_save('open_moderation_count', instance, created)
+
+
+def publish_notification(source, instance):
+    """Отправка нового или обновленного (объединенного) непрочитанного уведомления в поток событий"""
+    if instance.is_read:
         return None
+    publish_user_event(instance.recipient_notification_id, 'notification', {
+        'source': source,
+        'id': instance.pk,
+        'message': instance.message,
+        'sender_count': getattr(instance, 'sender_count', 1),
+    })
+    return None
+
+
+@receiver(post_save, sender=NotificationUsersFromModerator)
+def publish_moderator_notification(sender, instance, **kwargs):
+    publish_notification('blocking', instance)
+
+
+@receiver(post_save, sender=NotificationUserAfterLikeAndComment)
+def publish_general_notification(sender, instance, **kwargs):
+    publish_notification('general', instance)
+
+
+@receiver(post_delete, sender=NotificationUsersFromModerator)
+def change_unread_blocking_count_by_delete(sender, instance, **kwargs):
+    change_unread_counter('unread_blocking_count', instance._unread_owner_id, -1)
+
+
+@receiver(post_delete, sender=NotificationUserAfterLikeAndComment)
+def change_unread_general_count_by_delete(sender, instance, **kwargs):
+    change_unread_counter('unread_general_count', instance._unread_owner_id, -1)
+
+
+@receiver(post_delete, sender=ModeratorNotification)
+def change_open_moderation_count_by_delete(sender, instance, **kwargs):
+    change_unread_counter('open_moderation_count', instance._unread_owner_id, -1)
 
 
 class Post(models.Model):
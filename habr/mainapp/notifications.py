@@ -0,0 +1,68 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from authapp.models import UserProfile
+from mainapp.cache import get_unread_counts_key
+from mainapp.models import UNREAD_COUNTERS, NotificationUserAfterLikeAndComment, NotificationUsersFromModerator, \
+    change_unread_counter
+
+
+# вид уведомлений, которые можно отметить прочитанными, и их модель
+READ_MODELS = {
+    'blocking': NotificationUsersFromModerator,
+    'general': NotificationUserAfterLikeAndComment,
+}
+
+
+def get_unread_counts(user):
+    """
+    Счетчики непрочитанных уведомлений пользователя из кэша или одной строки профиля:
+    {"blocking": 1, "general": 10, "moderation": 0, "total": 11}
+    """
+    key = get_unread_counts_key(user.pk)
+    counts = cache.get(key)
+    if counts is None:
+        values = UserProfile.objects.filter(user_id=user.pk).values(*UNREAD_COUNTERS.values()).first() or {}
+        counts = {name: values.get(field, 0) for name, field in UNREAD_COUNTERS.items()}
+        counts['total'] = sum(counts.values())
+        cache.set(key, counts, settings.UNREAD_COUNTS_CACHE_TIMEOUT)
+    return counts
+
+
+def parse_read_watermark(value):
+    """
+    Граница before для mark_notifications_read из параметра запроса: строка
+    с датой и временем в ISO 8601, время без часового пояса считается местным.
+    Пустое значение - None, неверное значение или тип - ValueError
+    """
+    if value is None or value == '':
+        return None
+    if not isinstance(value, str):
+        raise ValueError('Ожидается строка с датой и временем')
+    # для несуществующей даты (2026-13-45T00:00) parse_datetime сам выбрасывает ValueError
+    before = parse_datetime(value)
+    if before is None:
+        raise ValueError('Ожидается дата и время в формате ISO 8601')
+    if timezone.is_naive(before):
+        before = timezone.make_aware(before)
+    return before
+
+
+def mark_notifications_read(kind, user, before=None):
+    """
+    Отметка всех непрочитанных уведомлений вида kind прочитанными одним UPDATE.
+    before - ограничение по времени создания, чтобы не отметить уведомления,
+    пришедшие после того, как пользователь открыл список.
+    Счетчик непрочитанных уменьшается в той же транзакции.
+    Возвращает количество отмеченных уведомлений
+    """
+    notifications = READ_MODELS[kind].objects.filter(recipient_notification=user, is_read=False)
+    if before is not None:
+        notifications = notifications.filter(created_timestamp__lte=before)
+    with transaction.atomic():
+        updated = notifications.update(is_read=True)
+        change_unread_counter(UNREAD_COUNTERS[kind], user.pk, -updated)
+    return updated
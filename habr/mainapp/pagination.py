@@ -0,0 +1,207 @@
+from datetime import datetime
+
+from django.core import signing
+from django.core.exceptions import FieldDoesNotExist
+from django.core.paginator import EmptyPage, Paginator
+from django.db.models import F, Q
+from django.http import Http404
+from django.utils.functional import cached_property
+
+from mainapp.cache import get_feed_count
+
+# поля, по которым сортируются ленты статей: параметр sort -> (поле, по убыванию)
+FEED_SORT_KEYS = {
+    None: ('created_timestamp', True),
+    'date': ('created_timestamp', True),
+    'date_reverse': ('created_timestamp', False),
+    'rating': ('rating', True),
+    'rating_reverse': ('rating', False),
+    # только для результатов поиска, см. ArticleQuerySet.search
+    'relevance': ('search_rank', True),
+}
+
+CURSOR_SALT = 'mainapp.pagination.cursor'
+
+
+def get_feed_sort_key(sort):
+    """
+    Возвращает пару (поле, по убыванию) для параметра сортировки ленты.
+    Неизвестные значения сортируются по умолчанию - по дате создания.
+    """
+    return FEED_SORT_KEYS.get(sort, FEED_SORT_KEYS[None])
+
+
+def get_tiebreaker_field(model, key_field):
+    """
+    Поле id для однозначного порядка статей с одинаковым ключом сортировки.
+    Статья хранит id и в таблице BaseModel (id), и в своей таблице (pk):
+    берется колонка из той же таблицы, что и ключ, чтобы сортировку покрывал один индекс.
+    """
+    try:
+        field = model._meta.get_field(key_field)
+    except FieldDoesNotExist:
+        return 'pk'
+    return 'pk' if field.model is model else 'id'
+
+
+def order_by_sort_key(queryset, key_field, descending):
+    """
+    Сортирует статьи по ключу (key_field, id). id нужен для однозначного порядка
+    статей с одинаковой датой или рейтингом, без него курсор может пропускать статьи.
+    Значение ключа дублируется в аннотацию cursor_value, из нее строятся курсоры.
+    """
+    prefix = '-' if descending else ''
+    tiebreaker = get_tiebreaker_field(queryset.model, key_field)
+    return queryset.annotate(cursor_value=F(key_field)).order_by(f'{prefix}{key_field}', f'{prefix}{tiebreaker}')
+
+
+class CursorPage:
+    """
+    Страница ленты, полученная по курсору. Номера страницы у нее нет,
+    вместо него есть курсоры на следующую и предыдущую страницы.
+    """
+    is_cursor = True
+    number = None
+
+    def __init__(self, object_list, paginator, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return f'<Cursor page of {len(self.object_list)} objects>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """
+    Keyset-пагинация ленты статей по ключу (key_field, id).
+
+    Вместо OFFSET страница выбирается условием "ключ меньше (больше) ключа
+    последней показанной статьи", поэтому стоимость запроса не растет
+    с номером страницы и не требует COUNT.
+    Queryset должен быть отсортирован через order_by_sort_key.
+    """
+
+    def __init__(self, queryset, per_page, key_field, descending=True, sort=None, count_paginator=None):
+        self.queryset = queryset
+        self.per_page = int(per_page)
+        self.key_field = key_field
+        self.descending = descending
+        self.sort = sort
+        self.tiebreaker = get_tiebreaker_field(queryset.model, key_field)
+        # Paginator, у которого берется количество статей (например, закэшированное)
+        self.count_paginator = count_paginator
+
+    @property
+    def count(self):
+        if self.count_paginator is not None:
+            return self.count_paginator.count
+        return self.queryset.count()
+
+    @property
+    def is_approximate(self):
+        return getattr(self.count_paginator, 'is_approximate', False)
+
+    def encode_cursor(self, obj, direction):
+        """Курсор на статьи после (direction='n') или до (direction='p') статьи obj"""
+        value = obj.cursor_value
+        if isinstance(value, datetime):
+            value = value.isoformat()
+        return signing.dumps(
+            {'s': self.sort, 'v': value, 'id': str(obj.pk), 'd': direction},
+            salt=CURSOR_SALT,
+        )
+
+    def decode_cursor(self, cursor):
+        try:
+            data = signing.loads(cursor, salt=CURSOR_SALT)
+        except signing.BadSignature:
+            raise Http404()
+        if not isinstance(data, dict) or data.get('s') != self.sort or data.get('d') not in ('n', 'p'):
+            raise Http404()
+        return data
+
+    def get_page_filter(self, value, pk, forward):
+        """
+        Условие для статей, идущих после (forward=True) или до ключа (value, pk)
+        в порядке сортировки ленты
+        """
+        lookup = 'lt' if self.descending == forward else 'gt'
+        return Q(**{f'{self.key_field}__{lookup}': value}) | \
+            Q(**{self.key_field: value, f'{self.tiebreaker}__{lookup}': pk})
+
+    def page(self, cursor):
+        data = self.decode_cursor(cursor)
+        forward = data['d'] == 'n'
+        queryset = self.queryset.filter(self.get_page_filter(data['v'], data['id'], forward))
+        if not forward:
+            queryset = queryset.reverse()
+
+        # одна лишняя статья показывает, есть ли страница дальше по направлению движения
+        object_list = list(queryset[:self.per_page + 1])
+        has_more = len(object_list) > self.per_page
+        object_list = object_list[:self.per_page]
+        if not forward:
+            object_list.reverse()
+
+        page = CursorPage(object_list, self)
+        if object_list:
+            if forward or has_more:
+                page.previous_cursor = self.encode_cursor(object_list[0], 'p')
+            if has_more or not forward:
+                page.next_cursor = self.encode_cursor(object_list[-1], 'n')
+        return page
+
+    def add_cursors(self, page):
+        """Добавляет курсоры на соседние страницы к обычной странице Paginator"""
+        page.object_list = list(page.object_list)
+        page.next_cursor, page.previous_cursor = None, None
+        if page.has_next():
+            page.next_cursor = self.encode_cursor(page.object_list[-1], 'n')
+        if page.has_previous():
+            page.previous_cursor = self.encode_cursor(page.object_list[0], 'p')
+        return page
+
+
+class CachedCountPaginator(Paginator):
+    """
+    Paginator, который берет количество статей из кэша (см. mainapp.cache.get_feed_count)
+    вместо COUNT на каждый запрос. Количество может быть оценкой планировщика,
+    тогда страницы за последней существующей не считаются ошибкой, а выводятся пустыми.
+    """
+
+    def __init__(self, object_list, per_page, count_key, estimate=False, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.count_key = count_key
+        self.estimate = estimate
+        self.is_approximate = False
+
+    @cached_property
+    def count(self):
+        count, self.is_approximate = get_feed_count(self.object_list, self.count_key, self.estimate)
+        return count
+
+    def validate_number(self, number):
+        try:
+            return super().validate_number(number)
+        except EmptyPage:
+            # оценка может быть больше реального количества статей
+            if self.is_approximate and number > 1:
+                return int(number)
+            raise
@@ -0,0 +1,233 @@
+import asyncio
+import json
+import threading
+from functools import lru_cache
+from importlib import import_module
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DEFAULT_DB_ALIAS, close_old_connections, connections, transaction
+from django.http import HttpRequest, parse_cookie
+from django.utils.module_loading import import_string
+
+
+class InProcessBroker:
+    """
+    Рассылка событий подписчикам внутри одного процесса. Подписчик - очередь
+    asyncio в event loop ASGI-сервера, публиковать можно из любого потока
+    (синхронные view и сигналы). События из других процессов (воркер
+    process_notification_outbox, другие воркеры сервера) не доходят,
+    для них нужен брокер с общим каналом, например PostgresBroker
+    """
+    # доходят ли события, опубликованные в других процессах
+    cross_process = False
+
+    def __init__(self, queue_size=100):
+        self.queue_size = queue_size
+        self._subscribers = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, user_id):
+        """Очередь событий пользователя для текущего event loop"""
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        with self._lock:
+            self._subscribers.setdefault(user_id, {})[queue] = asyncio.get_running_loop()
+        return queue
+
+    def unsubscribe(self, user_id, queue):
+        with self._lock:
+            queues = self._subscribers.get(user_id, {})
+            queues.pop(queue, None)
+            if not queues:
+                self._subscribers.pop(user_id, None)
+
+    def publish(self, user_id, event):
+        """Отправка события всем подключениям пользователя; медленные подписчики теряют события"""
+        with self._lock:
+            subscribers = list(self._subscribers.get(user_id, {}).items())
+        for queue, loop in subscribers:
+            loop.call_soon_threadsafe(self._put, queue, event)
+
+    @staticmethod
+    def _put(queue, event):
+        if not queue.full():
+            queue.put_nowait(event)
+
+
+class PostgresBroker(InProcessBroker):
+    """
+    Рассылка событий между процессами через LISTEN/NOTIFY PostgreSQL.
+    publish отправляет NOTIFY из любого процесса, а каждый процесс ASGI-сервера
+    держит одно соединение с LISTEN и раздает полученные события своим подписчикам.
+    Событие вместе с id пользователя должно быть меньше 8000 байт
+    """
+    cross_process = True
+    channel = 'mainapp_notifications'
+    # пауза перед повторным подключением LISTEN после обрыва соединения, секунды
+    reconnect_delay = 1
+
+    def __init__(self, queue_size=100, using=DEFAULT_DB_ALIAS):
+        super().__init__(queue_size)
+        self.using = using
+        self._listener = None
+
+    def subscribe(self, user_id):
+        self.start_listener(asyncio.get_running_loop())
+        return super().subscribe(str(user_id))
+
+    def unsubscribe(self, user_id, queue):
+        super().unsubscribe(str(user_id), queue)
+
+    def publish(self, user_id, event):
+        payload = json.dumps({'user_id': str(user_id), 'event': event}, cls=DjangoJSONEncoder)
+        with connections[self.using].cursor() as cursor:
+            cursor.execute('SELECT pg_notify(%s, %s)', [self.channel, payload])
+
+    def start_listener(self, loop):
+        """
+        Отдельное соединение с LISTEN, уведомления читаются event loop без потоков.
+        Подключение выполняется один раз на процесс, при первой подписке
+        """
+        if self._listener is not None:
+            return
+        wrapper = connections.create_connection(self.using)
+        connection = wrapper.get_new_connection(wrapper.get_connection_params())
+        connection.autocommit = True
+        with connection.cursor() as cursor:
+            cursor.execute(f'LISTEN {self.channel}')
+        loop.add_reader(connection.fileno(), self.read_notifies)
+        self._listener = (loop, connection, wrapper.Database.Error)
+
+    def read_notifies(self):
+        loop, connection, database_error = self._listener
+        try:
+            connection.poll()
+        except database_error:
+            loop.remove_reader(connection.fileno())
+            connection.close()
+            self._listener = None
+            loop.call_later(self.reconnect_delay, self.reconnect, loop, database_error)
+            return
+        while connection.notifies:
+            notify = connection.notifies.pop(0)
+            message = json.loads(notify.payload)
+            super().publish(message['user_id'], message['event'])
+
+    def reconnect(self, loop, database_error):
+        if self._listener is not None:
+            return
+        try:
+            self.start_listener(loop)
+        except database_error:
+            loop.call_later(self.reconnect_delay, self.reconnect, loop, database_error)
+
+
+@lru_cache(maxsize=None)
+def get_broker():
+    """
+    Брокер событий из settings.NOTIFICATION_BROKER, один на процесс. По умолчанию
+    с PostgreSQL - PostgresBroker, с другими базами - InProcessBroker
+    """
+    broker_path = settings.NOTIFICATION_BROKER
+    if broker_path is None:
+        is_postgresql = connections[DEFAULT_DB_ALIAS].vendor == 'postgresql'
+        broker_path = 'mainapp.realtime.PostgresBroker' if is_postgresql else 'mainapp.realtime.InProcessBroker'
+    return import_string(broker_path)(queue_size=settings.NOTIFICATION_STREAM_QUEUE_SIZE)
+
+
+def is_notification_stream_available(request):
+    """
+    Можно ли подключить страницу к потоку уведомлений: поток отдает только
+    habr/asgi.py, а при очереди уведомлений (NOTIFICATION_OUTBOX) их создает
+    отдельный процесс, и брокер должен доставлять события между процессами
+    """
+    if not isinstance(request, ASGIRequest):
+        return False
+    return get_broker().cross_process or not settings.NOTIFICATION_OUTBOX
+
+
+def publish_user_event(user_id, event_type, data):
+    """Отправка события пользователю после фиксации текущей транзакции"""
+    event = {'type': event_type, 'data': data}
+    transaction.on_commit(lambda: get_broker().publish(user_id, event))
+
+
+def format_event(event_type, data):
+    """Событие в формате Server-Sent Events"""
+    return f'event: {event_type}\ndata: {json.dumps(data, cls=DjangoJSONEncoder, ensure_ascii=False)}\n\n'.encode()
+
+
+def get_scope_user(scope):
+    """Пользователь сессии из cookie ASGI-запроса"""
+    request = HttpRequest()
+    headers = dict(scope.get('headers', ()))
+    cookies = parse_cookie(headers.get(b'cookie', b'').decode('latin-1'))
+    engine = import_module(settings.SESSION_ENGINE)
+    request.session = engine.SessionStore(cookies.get(settings.SESSION_COOKIE_NAME))
+    try:
+        return get_user(request)
+    finally:
+        close_old_connections()
+
+
+class NotificationStreamApp:
+    """
+    ASGI-приложение с потоком Server-Sent Events для авторизованного пользователя:
+    при подключении - событие counts с текущими счетчиками непрочитанных,
+    затем unread (изменение счетчика) и notification (новое уведомление).
+    Подключение не держит соединение с базой, пока ждет событий
+    """
+
+    async def __call__(self, scope, receive, send):
+        # импорт здесь: mainapp.notifications импортирует mainapp.models, а models - этот модуль
+        from mainapp.notifications import get_unread_counts
+
+        user = await sync_to_async(get_scope_user)(scope)
+        if not user.is_authenticated:
+            await send({'type': 'http.response.start', 'status': 403, 'headers': [(b'content-type', b'text/plain')]})
+            await send({'type': 'http.response.body', 'body': b'Forbidden'})
+            return
+
+        broker = get_broker()
+        queue = broker.subscribe(user.pk)
+        disconnected = asyncio.ensure_future(self.wait_disconnect(receive))
+        try:
+            await send({
+                'type': 'http.response.start',
+                'status': 200,
+                'headers': [
+                    (b'content-type', b'text/event-stream; charset=utf-8'),
+                    (b'cache-control', b'no-cache'),
+                    (b'x-accel-buffering', b'no'),
+                ],
+            })
+            counts = await sync_to_async(get_unread_counts)(user)
+            await send({'type': 'http.response.body', 'body': format_event('counts', counts), 'more_body': True})
+            while not disconnected.done():
+                next_event = asyncio.ensure_future(queue.get())
+                done, _ = await asyncio.wait({next_event, disconnected},
+                                             timeout=settings.NOTIFICATION_STREAM_HEARTBEAT,
+                                             return_when=asyncio.FIRST_COMPLETED)
+                if next_event in done:
+                    event = next_event.result()
+                    body = format_event(event['type'], event['data'])
+                else:
+                    next_event.cancel()
+                    if disconnected in done:
+                        break
+                    # комментарий SSE, чтобы прокси не закрыли простаивающее соединение
+                    body = b': ping\n\n'
+                await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+        finally:
+            disconnected.cancel()
+            broker.unsubscribe(user.pk, queue)
+
+    @staticmethod
+    async def wait_disconnect(receive):
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return
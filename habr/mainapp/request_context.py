@@ -0,0 +1,69 @@
+import asyncio
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.utils.decorators import sync_and_async_middleware
+
+# текущий запрос; contextvars изолирует значение между потоками (WSGI)
+# и между задачами event loop (ASGI), sync_to_async копирует его в поток view
+_current_request = ContextVar('mainapp_current_request', default=None)
+# пользователь, заданный явно вне запроса (shell, management-команды)
+_current_user = ContextVar('mainapp_current_user', default=None)
+
+
+def get_current_request():
+    """Текущий запрос или None вне запроса"""
+    return _current_request.get()
+
+
+def get_current_user():
+    """
+    Пользователь, от имени которого выполняется действие:
+    заданный через user_context или пользователь текущего запроса.
+    Вне запроса и для анонимного пользователя - None
+    """
+    user = _current_user.get()
+    if user is not None:
+        return user
+    request = _current_request.get()
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        return None
+    return user
+
+
+@contextmanager
+def user_context(user):
+    """
+    Выполнение кода вне запроса от имени пользователя, например модератора в shell:
+    with user_context(moderator):
+        user.save()
+    """
+    token = _current_user.set(user)
+    try:
+        yield user
+    finally:
+        _current_user.reset(token)
+
+
+@sync_and_async_middleware
+def request_context_middleware(get_response):
+    """
+    Публикует текущий запрос для get_current_user на время его обработки.
+    Работает и под WSGI, и под ASGI; должен стоять после AuthenticationMiddleware
+    """
+    if asyncio.iscoroutinefunction(get_response):
+        async def middleware(request):
+            token = _current_request.set(request)
+            try:
+                return await get_response(request)
+            finally:
+                _current_request.reset(token)
+    else:
+        def middleware(request):
+            token = _current_request.set(request)
+            try:
+                return get_response(request)
+            finally:
+                _current_request.reset(token)
+    return middleware
@@ -0,0 +1,242 @@
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+from django.db.models import FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+from django.utils.html import escape
+
+from mainapp.utils import WORD_RE, get_plain_text
+
+# таблица с текстом статей для полнотекстового поиска, создается миграцией 0008
+SEARCH_DOCUMENT_TABLE = 'article_search_document'
+# полнотекстовый индекс SQLite (FTS5) поверх SEARCH_DOCUMENT_TABLE
+SQLITE_SEARCH_INDEX_TABLE = 'article_search_index'
+# конфигурация морфологии PostgreSQL
+POSTGRES_SEARCH_CONFIG = 'russian'
+
+SEARCH_DOCUMENT_FIELDS = ('title', 'subtitle', 'text')
+
+# границы найденных слов в сниппетах; заменяются на <mark> после экранирования текста
+SNIPPET_START, SNIPPET_STOP = '\x02', '\x03'
+# примерная длина сниппета в словах
+SNIPPET_WORDS = 30
+
+
+def get_article_id_column(queryset):
+    """Колонка первичного ключа статьи во внешнем запросе, для коррелированных подзапросов"""
+    opts = queryset.model._meta
+    quote_name = connection.ops.quote_name
+    return f'{quote_name(opts.db_table)}.{quote_name(opts.pk.column)}'
+
+
+class BaseSearchBackend:
+    """
+    Полнотекстовый поиск статей.
+
+    search() фильтрует queryset статей по запросу и добавляет аннотацию
+    search_rank (чем больше, тем релевантнее). update() и remove()
+    поддерживают индекс в актуальном состоянии при изменении статей.
+    """
+
+    def search(self, queryset, query):
+        raise NotImplementedError
+
+    def update(self, article):
+        pass
+
+    def remove(self, article_id):
+        pass
+
+    def get_snippets(self, query, article_ids):
+        """
+        Фрагменты текста статей article_ids с выделенными совпадениями с запросом:
+        {id статьи: html}. Строятся базой данных по индексу, время построения
+        ограничено настройкой SEARCH_SNIPPET_TIMEOUT_MS; при превышении
+        возвращается пустой словарь и показываются обычные превью
+        """
+        if not query or not article_ids:
+            return {}
+        deadline = time.monotonic() + settings.SEARCH_SNIPPET_TIMEOUT_MS / 1000
+        try:
+            rows = self.fetch_snippets(query, [self.get_db_article_id(article_id) for article_id in article_ids],
+                                       deadline)
+        except DatabaseError:
+            return {}
+        return {self.to_article_id(article_id): self.format_snippet(snippet) for article_id, snippet in rows if snippet}
+
+    def fetch_snippets(self, query, db_article_ids, deadline):
+        """Пары (id статьи, сниппет с границами SNIPPET_START и SNIPPET_STOP)"""
+        return []
+
+    @staticmethod
+    def format_snippet(snippet):
+        return escape(snippet).replace(SNIPPET_START, '<mark>').replace(SNIPPET_STOP, '</mark>')
+
+    @staticmethod
+    def to_article_id(db_article_id):
+        from mainapp.models import Article
+
+        return Article._meta.pk.to_python(db_article_id)
+
+    @staticmethod
+    def get_document(article):
+        """Поля статьи для индекса; недостающие поля читаются одним запросом"""
+        if article.get_deferred_fields().intersection(SEARCH_DOCUMENT_FIELDS):
+            return type(article).objects.filter(id=article.id).values_list(*SEARCH_DOCUMENT_FIELDS).get()
+        return article.title, article.subtitle, article.text
+
+    @staticmethod
+    def get_db_article_id(article_id):
+        """id статьи в том виде, в котором он хранится в базе"""
+        from mainapp.models import Article
+
+        return Article._meta.pk.get_db_prep_value(article_id, connection)
+
+    def upsert_document(self, article):
+        title, subtitle, text = self.get_document(article)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {SEARCH_DOCUMENT_TABLE} (article_id, title, subtitle, body) '
+                f'VALUES (%s, %s, %s, %s) '
+                f'ON CONFLICT (article_id) DO UPDATE SET '
+                f'title = excluded.title, subtitle = excluded.subtitle, body = excluded.body',
+                [self.get_db_article_id(article.id), title, subtitle, get_plain_text(text)],
+            )
+
+    def delete_document(self, article_id):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {SEARCH_DOCUMENT_TABLE} WHERE article_id = %s',
+                [self.get_db_article_id(article_id)],
+            )
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    """
+    Поиск по tsvector-колонке document таблицы article_search_document с GIN-индексом.
+    Колонка генерируется базой из title, subtitle и body с весами A, B и C.
+    """
+
+    def search(self, queryset, query):
+        tsquery = f"websearch_to_tsquery('{POSTGRES_SEARCH_CONFIG}', %s)"
+        matched_ids = RawSQL(
+            f'SELECT article_id FROM {SEARCH_DOCUMENT_TABLE} WHERE document @@ {tsquery}',
+            (query,),
+        )
+        rank = RawSQL(
+            f'SELECT ts_rank_cd(document, {tsquery}) FROM {SEARCH_DOCUMENT_TABLE} '
+            f'WHERE article_id = {get_article_id_column(queryset)}',
+            (query,),
+            output_field=FloatField(),
+        )
+        return queryset.filter(id__in=matched_ids).annotate(search_rank=rank)
+
+    def update(self, article):
+        self.upsert_document(article)
+
+    def remove(self, article_id):
+        self.delete_document(article_id)
+
+    def fetch_snippets(self, query, db_article_ids, deadline):
+        timeout = max(int((deadline - time.monotonic()) * 1000), 1)
+        options = f'StartSel={SNIPPET_START}, StopSel={SNIPPET_STOP}, ' \
+                  f'MaxWords={SNIPPET_WORDS}, MinWords={SNIPPET_WORDS // 2}, MaxFragments=2'
+        # statement_timeout прерывает ts_headline, если он не уложился в отведенное время
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f'SET LOCAL statement_timeout = {timeout}')
+            cursor.execute(
+                f"SELECT article_id, ts_headline('{POSTGRES_SEARCH_CONFIG}', body, "
+                f"websearch_to_tsquery('{POSTGRES_SEARCH_CONFIG}', %s), %s) "
+                f'FROM {SEARCH_DOCUMENT_TABLE} WHERE article_id = ANY(%s)',
+                [query, options, db_article_ids],
+            )
+            return cursor.fetchall()
+
+
+class SQLiteSearchBackend(BaseSearchBackend):
+    """
+    Поиск по FTS5-индексу article_search_index, построенному над таблицей
+    article_search_document (external content). Индекс обновляется триггерами
+    таблицы документов, релевантность считается функцией bm25.
+    """
+
+    @staticmethod
+    def get_match_query(query):
+        """
+        Экранирует пользовательский запрос для MATCH: каждое слово
+        ищется как префикс, слова объединяются через AND
+        """
+        return ' '.join(f'"{word}"*' for word in WORD_RE.findall(query))
+
+    def search(self, queryset, query):
+        match_query = self.get_match_query(query)
+        if not match_query:
+            # аннотация нужна и пустому результату: по ней сортируется выдача
+            return queryset.none().annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+        matched_ids = RawSQL(
+            f'SELECT d.article_id FROM {SQLITE_SEARCH_INDEX_TABLE} '
+            f'JOIN {SEARCH_DOCUMENT_TABLE} d ON d.id = {SQLITE_SEARCH_INDEX_TABLE}.rowid '
+            f'WHERE {SQLITE_SEARCH_INDEX_TABLE} MATCH %s',
+            (match_query,),
+        )
+        rank = RawSQL(
+            f'SELECT -bm25({SQLITE_SEARCH_INDEX_TABLE}, 10.0, 5.0, 1.0) FROM {SQLITE_SEARCH_INDEX_TABLE} '
+            f'WHERE {SQLITE_SEARCH_INDEX_TABLE} MATCH %s AND {SQLITE_SEARCH_INDEX_TABLE}.rowid = '
+            f'(SELECT d.id FROM {SEARCH_DOCUMENT_TABLE} d WHERE d.article_id = {get_article_id_column(queryset)})',
+            (match_query,),
+            output_field=FloatField(),
+        )
+        return queryset.filter(id__in=matched_ids).annotate(search_rank=rank)
+
+    def update(self, article):
+        self.upsert_document(article)
+
+    def remove(self, article_id):
+        self.delete_document(article_id)
+
+    def fetch_snippets(self, query, db_article_ids, deadline):
+        match_query = self.get_match_query(query)
+        if not match_query:
+            return []
+
+        placeholders = ', '.join(['%s'] * len(db_article_ids))
+        # обработчик прогресса SQLite прерывает запрос, если он не уложился в отведенное время
+        connection.ensure_connection()
+        sqlite_connection = connection.connection
+        sqlite_connection.set_progress_handler(lambda: time.monotonic() > deadline, 1000)
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"SELECT d.article_id, snippet({SQLITE_SEARCH_INDEX_TABLE}, -1, %s, %s, '…', %s) "
+                    f'FROM {SQLITE_SEARCH_INDEX_TABLE} '
+                    f'JOIN {SEARCH_DOCUMENT_TABLE} d ON d.id = {SQLITE_SEARCH_INDEX_TABLE}.rowid '
+                    f'WHERE {SQLITE_SEARCH_INDEX_TABLE} MATCH %s AND d.article_id IN ({placeholders})',
+                    [SNIPPET_START, SNIPPET_STOP, SNIPPET_WORDS, match_query, *db_article_ids],
+                )
+                return cursor.fetchall()
+        finally:
+            sqlite_connection.set_progress_handler(None, 1000)
+
+
+class SimpleSearchBackend(BaseSearchBackend):
+    """
+    Поиск без индекса для остальных баз данных: подстрока в заголовке,
+    описании или тексте статьи, без ранжирования
+    """
+
+    def search(self, queryset, query):
+        or_lookup = Q(title__icontains=query) | Q(subtitle__icontains=query) | Q(text__icontains=query)
+        return queryset.filter(or_lookup).annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+
+SEARCH_BACKENDS = {
+    'postgresql': PostgresSearchBackend,
+    'sqlite': SQLiteSearchBackend,
+}
+
+
+def get_search_backend():
+    """Поисковый бэкенд для текущей базы данных"""
+    return SEARCH_BACKENDS.get(connection.vendor, SimpleSearchBackend)()
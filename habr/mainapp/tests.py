@@ -1,3 +1,1189 @@
-from django.test import TestCase
+from contextlib import contextmanager, redirect_stdout
+from datetime import timedelta
+from io import StringIO
+from types import SimpleNamespace
+from unittest import skipUnless
+from unittest.mock import patch
 
-# Create your tests here.
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.paginator import Paginator
+from django.db import DatabaseError, IntegrityError, connection
+from django.db.models import QuerySet
+from django.http import Http404
+from django.template import engines
+from django.template.response import SimpleTemplateResponse
+from django.test import AsyncRequestFactory, RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from authapp.models import User, UserProfile
+from mainapp.cache import FEED_PAGE_MAIN_SCOPE, FEED_PAGE_VERSION_KEY, get_cache_versions, get_feed_count_version, \
+    get_liked_ids_key, get_unread_counts_key
+from mainapp.context_processors import unread_notifications
+from mainapp.likes import get_liked_ids, toggle_like
+from mainapp.management.commands.process_rating_events import Command as ProcessRatingEventsCommand
+from mainapp.models import Article, ArticleCategories, ArticleComment, ArticleRating, ArticleRatingEvent, \
+    CommentTrigger, ModeratorNotification, NotificationArchive, NotificationOutbox, NotificationSender, \
+    NotificationUserAfterLikeAndComment, flush_article_rating_events, notify_mentioned_users, \
+    process_notification_outbox
+from mainapp.notifications import get_unread_counts
+from mainapp.pagination import CursorPaginator, get_feed_sort_key, order_by_sort_key
+from mainapp.realtime import get_broker
+from mainapp.search import SNIPPET_START, SNIPPET_STOP, SQLITE_SEARCH_INDEX_TABLE, BaseSearchBackend, \
+    get_search_backend
+from mainapp.triggers import TriggerEvent, TriggerMatch, TriggerMatcher, matcher_cache
+from mainapp.views import get_cached_feed_response
+
+
+def create_user(username):
+    user = User(username=username, email=f'{username}@example.com')
+    user.set_password('password')
+    user.save()
+    return user
+
+
+def create_article(user, category=None, **kwargs):
+    if category is None:
+        category, _ = ArticleCategories.objects.get_or_create(name='Python')
+    fields = dict(categories=category, title='Статья', subtitle='Подзаголовок', main_img='article_images/test.png',
+                  text='<p>Текст статьи</p>', user=user, status=Article.ACTIVE)
+    fields.update(kwargs)
+    return Article.objects.create(**fields)
+
+
+class OnCommitTestCase(TestCase):
+
+    @contextmanager
+    def committed(self):
+        """
+        Вызов callback'ов transaction.on_commit из блока, как после фиксации транзакции,
+        включая добавленные самими callback'ами. captureOnCommitCallbacks(execute=True)
+        в Django 4.0 вызывает последний callback повторно, если callback'и добавляют новые
+        """
+        with self.captureOnCommitCallbacks() as callbacks:
+            yield
+        while callbacks:
+            with self.captureOnCommitCallbacks() as added_callbacks:
+                for callback in callbacks:
+                    callback()
+            callbacks = added_callbacks
+
+
+class ArticleCounterFieldsTest(TestCase):
+    """Счетчики статьи не перезаписываются сохранением устаревшего объекта"""
+
+    def setUp(self):
+        self.author = create_user('author')
+        self.article = create_article(self.author)
+
+    def test_stale_save_keeps_rating(self):
+        stale_article = Article.objects.get(pk=self.article.pk)
+        ArticleRating.objects.get(article_rating=self.article).set_rating(7)
+
+        stale_article.title = 'Исправленная статья'
+        stale_article.save()
+
+        article = Article.objects.get(pk=self.article.pk)
+        self.assertEqual(article.title, 'Исправленная статья')
+        self.assertEqual(article.rating, 7)
+
+    def test_stale_save_keeps_like_count(self):
+        stale_article = Article.objects.get(pk=self.article.pk)
+        self.article.likes.add(create_user('reader'))
+
+        stale_article.save()
+
+        self.assertEqual(Article.objects.get(pk=self.article.pk).like_count, 1)
+
+
+class LikeCounterSignalsTest(TestCase):
+    """Счетчики лайков меняются сигналами m2m_changed вместе с промежуточной таблицей"""
+
+    def setUp(self):
+        self.author = create_user('author')
+        self.readers = [create_user(f'reader{i}') for i in range(3)]
+        self.article = create_article(self.author)
+        self.comment = ArticleComment.objects.create(article_comment=self.article, user=self.author, text='Комментарий')
+
+    def get_like_count(self, obj):
+        return type(obj).objects.filter(pk=obj.pk).values_list('like_count', flat=True).get()
+
+    def test_add_and_remove(self):
+        self.article.likes.add(*self.readers)
+        self.assertEqual(self.get_like_count(self.article), 3)
+
+        self.article.likes.remove(self.readers[0])
+        self.assertEqual(self.get_like_count(self.article), 2)
+
+    def test_remove_missing_like_keeps_counter(self):
+        self.article.likes.add(self.readers[0])
+
+        self.article.likes.remove(self.readers[1])
+        self.article.likes.add(self.readers[0])
+
+        self.assertEqual(self.get_like_count(self.article), 1)
+
+    def test_clear(self):
+        self.comment.likes.add(*self.readers)
+
+        self.comment.likes.clear()
+
+        self.assertEqual(self.get_like_count(self.comment), 0)
+
+    def test_reconcile_like_counts(self):
+        self.article.likes.add(*self.readers)
+        Article.objects.filter(pk=self.article.pk).update(like_count=10)
+
+        with redirect_stdout(StringIO()):
+            call_command('reconcile_like_counts', dry_run=True)
+        self.assertEqual(self.get_like_count(self.article), 10)
+
+        with redirect_stdout(StringIO()):
+            call_command('reconcile_like_counts')
+        self.assertEqual(self.get_like_count(self.article), 3)
+
+
+class NotificationOutboxTest(OnCommitTestCase):
+    """Уведомления о лайках и комментариях через очередь notification_outbox"""
+
+    def setUp(self):
+        self.author = create_user('author')
+        self.reader = create_user('reader')
+        self.article = create_article(self.author, title='Про очередь')
+
+    @override_settings(NOTIFICATION_OUTBOX=True)
+    def test_like_is_delivered_by_worker(self):
+        with self.committed():
+            self.article.likes.add(self.reader)
+
+        self.assertEqual(NotificationOutbox.objects.count(), 1)
+        self.assertFalse(NotificationUserAfterLikeAndComment.objects.exists())
+
+        self.assertEqual(process_notification_outbox(), 1)
+
+        notification = NotificationUserAfterLikeAndComment.objects.get()
+        self.assertEqual(notification.recipient_notification, self.author)
+        self.assertEqual(notification.sender_notification, self.reader)
+        self.assertEqual(notification.target_id, self.article.pk)
+        self.assertIn('Про очередь', notification.message)
+        self.assertFalse(NotificationOutbox.objects.exists())
+        self.assertEqual(process_notification_outbox(), 0)
+
+    @override_settings(NOTIFICATION_OUTBOX=False)
+    def test_without_outbox_notification_is_created_on_commit(self):
+        with self.committed():
+            ArticleComment.objects.create(article_comment=self.article, user=self.reader, text='Комментарий')
+
+        self.assertFalse(NotificationOutbox.objects.exists())
+        self.assertEqual(NotificationUserAfterLikeAndComment.objects.get().recipient_notification, self.author)
+
+    @override_settings(NOTIFICATION_OUTBOX=True)
+    def test_own_like_is_not_enqueued(self):
+        with self.committed():
+            self.article.likes.add(self.author)
+
+        self.assertFalse(NotificationOutbox.objects.exists())
+
+    @override_settings(NOTIFICATION_OUTBOX=True)
+    def test_deleted_target_is_skipped(self):
+        with self.committed():
+            self.article.likes.add(self.reader)
+        self.article.delete()
+
+        self.assertEqual(process_notification_outbox(), 1)
+        self.assertFalse(NotificationUserAfterLikeAndComment.objects.exists())
+        self.assertFalse(NotificationOutbox.objects.exists())
+
+    @override_settings(NOTIFICATION_OUTBOX=True)
+    def test_comment_edit_is_not_enqueued(self):
+        with self.committed():
+            comment = ArticleComment.objects.create(article_comment=self.article, user=self.reader, text='Комментарий')
+        with self.committed():
+            comment.text = 'Исправленный комментарий'
+            comment.save()
+
+        self.assertEqual(NotificationOutbox.objects.filter(kind=NotificationOutbox.COMMENT).count(), 1)
+
+    @override_settings(NOTIFICATION_OUTBOX=True)
+    def test_comment_author_lookup_without_article(self):
+        with self.committed():
+            ArticleComment.objects.create(article_comment_id=self.article.pk, user=self.reader, text='Комментарий')
+
+        self.assertEqual(NotificationOutbox.objects.get(kind=NotificationOutbox.COMMENT).recipient_id, self.author.pk)
+
+    @override_settings(NOTIFICATION_OUTBOX=True)
+    def test_worker_command(self):
+        with self.committed():
+            self.article.likes.add(self.reader)
+        stdout = StringIO()
+
+        call_command('process_notification_outbox', stdout=stdout)
+
+        self.assertIn('Обработано уведомлений из очереди: 1', stdout.getvalue())
+        self.assertEqual(NotificationUserAfterLikeAndComment.objects.get().recipient_notification, self.author)
+
+
+class LikeToggleAPITest(TestCase):
+    """Постановка и снятие лайков и звезд через api без перезагрузки страницы"""
+
+    def setUp(self):
+        self.author = create_user('author')
+        self.reader = create_user('reader')
+        self.article = create_article(self.author)
+        self.comment = ArticleComment.objects.create(article_comment=self.article, user=self.author, text='Комментарий')
+        self.client.force_login(self.reader)
+
+    def toggle(self, url):
+        response = self.client.post(url)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_article_like_toggle(self):
+        url = self.article.get_like_api_url()
+
+        self.assertEqual(self.toggle(url), {'liked': True, 'count': 1})
+        self.assertTrue(self.article.likes.filter(pk=self.reader.pk).exists())
+        self.assertEqual(self.toggle(url), {'liked': False, 'count': 0})
+        self.assertFalse(self.article.likes.exists())
+        self.assertEqual(Article.objects.get(pk=self.article.pk).like_count, 0)
+
+    def test_comment_like_toggle(self):
+        url = self.comment.get_like_api_url()
+
+        self.assertEqual(self.toggle(url), {'liked': True, 'count': 1})
+        self.assertEqual(self.toggle(url), {'liked': False, 'count': 0})
+
+    def test_author_star_toggle(self):
+        url = reverse('star-api-toggle', kwargs={'pk': self.author.pk})
+
+        self.assertEqual(self.toggle(url), {'liked': True, 'count': 1})
+        self.assertTrue(self.author.userprofile.stars.filter(pk=self.reader.pk).exists())
+        self.assertEqual(self.toggle(url), {'liked': False, 'count': 0})
+
+    def test_anonymous_user_is_forbidden(self):
+        self.client.logout()
+
+        response = self.client.post(self.article.get_like_api_url())
+
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(self.article.likes.exists())
+
+    def test_banned_user_is_forbidden(self):
+        self.reader.is_banned = True
+        self.reader.save()
+
+        response = self.client.post(self.article.get_like_api_url())
+
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(self.article.likes.exists())
+
+    def test_missing_object_returns_404(self):
+        response = self.client.post(reverse('like-api-toggle', kwargs={'pk': self.reader.pk}))
+
+        self.assertEqual(response.status_code, 404)
+
+    def test_toggle_does_not_lock_object(self):
+        with patch.object(QuerySet, 'select_for_update') as select_for_update:
+            self.assertTrue(toggle_like('article', self.reader, self.article))
+            self.assertFalse(toggle_like('article', self.reader, self.article))
+
+        select_for_update.assert_not_called()
+
+    def test_concurrent_like_is_counted_once(self):
+        through = Article.likes.through
+        with patch.object(type(through.objects), 'create', side_effect=IntegrityError):
+            self.assertTrue(toggle_like('article', self.reader, self.article))
+
+        self.assertEqual(Article.objects.get(pk=self.article.pk).like_count, 0)
+
+    def test_counters_follow_like_rows(self):
+        for user in (self.reader, self.author, self.reader):
+            toggle_like('article', user, self.article)
+            toggle_like('star', user, self.author.userprofile)
+
+        self.assertEqual(Article.objects.get(pk=self.article.pk).like_count, self.article.likes.count())
+        self.assertEqual(UserProfile.objects.get(user=self.author).star_count, 1)
+
+
+class UnreadCountsTest(OnCommitTestCase):
+    """Счетчики непрочитанных уведомлений и их кэш"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = create_user('user')
+        self.sender = create_user('sender')
+
+    def create_notification(self):
+        return NotificationUserAfterLikeAndComment.objects.create(
+            recipient_notification=self.user, sender_notification=self.sender, message='Уведомление'
+        )
+
+    def test_counter_follows_notifications(self):
+        with self.committed():
+            notification = self.create_notification()
+        self.assertEqual(get_unread_counts(self.user)['general'], 1)
+
+        with self.committed():
+            notification.is_read = True
+            notification.save()
+        self.assertEqual(get_unread_counts(self.user), {'blocking': 0, 'general': 0, 'moderation': 0, 'total': 0})
+
+    def test_cache_is_invalidated_after_commit(self):
+        stale_counts = get_unread_counts(self.user)
+        with self.committed():
+            self.create_notification()
+            # другой запрос успел закэшировать счетчики до фиксации транзакции
+            cache.set(get_unread_counts_key(self.user.pk), stale_counts)
+
+        self.assertEqual(get_unread_counts(self.user)['general'], 1)
+
+
+@override_settings(LIKED_IDS_CACHE_TIMEOUT=300)
+class LikedIdsCacheTest(OnCommitTestCase):
+    """Закэшированные множества лайкнутых id сбрасываются после фиксации транзакции"""
+
+    def setUp(self):
+        cache.clear()
+        self.author = create_user('author')
+        self.reader = create_user('reader')
+        self.article = create_article(self.author)
+
+    def test_like_invalidates_cache_after_commit(self):
+        self.assertEqual(get_liked_ids('article', self.reader, [self.article.pk]), set())
+        with self.committed():
+            self.article.likes.add(self.reader)
+            # другой запрос успел закэшировать множество до фиксации транзакции
+            cache.set(get_liked_ids_key('article', self.reader.pk), set())
+
+        self.assertEqual(get_liked_ids('article', self.reader, [self.article.pk]), {self.article.pk})
+
+    def test_clear_invalidates_cache_of_all_users(self):
+        with self.committed():
+            self.article.likes.add(self.reader)
+        self.assertEqual(get_liked_ids('article', self.reader, [self.article.pk]), {self.article.pk})
+
+        with self.committed():
+            self.article.likes.clear()
+
+        self.assertEqual(get_liked_ids('article', self.reader, [self.article.pk]), set())
+
+
+class MarkNotificationsReadTest(TestCase):
+    """Отметка всех уведомлений прочитанными одним UPDATE с границей по времени"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = create_user('user')
+        self.sender = create_user('sender')
+        self.notifications = [
+            NotificationUserAfterLikeAndComment.objects.create(
+                recipient_notification=self.user, sender_notification=self.sender, message=f'Уведомление {i}'
+            ) for i in range(3)
+        ]
+        self.url = reverse('notifications-read-api')
+        self.client.force_login(self.user)
+
+    def get_unread(self):
+        return NotificationUserAfterLikeAndComment.objects.filter(recipient_notification=self.user, is_read=False)
+
+    def test_mark_all_read(self):
+        response = self.client.post(self.url, {'kind': 'general'}, content_type='application/json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {
+            'updated': 3, 'unread': {'blocking': 0, 'general': 0, 'moderation': 0, 'total': 0},
+        })
+        self.assertFalse(self.get_unread().exists())
+
+    def test_newer_notifications_stay_unread(self):
+        before = timezone.now()
+        NotificationUserAfterLikeAndComment.objects.filter(pk=self.notifications[0].pk) \
+            .update(created_timestamp=before + timedelta(minutes=1))
+
+        response = self.client.post(self.url, {'before': before.isoformat()}, content_type='application/json')
+
+        self.assertEqual(response.json()['updated'], 2)
+        self.assertEqual(response.json()['unread']['general'], 1)
+        self.assertEqual(list(self.get_unread()), [self.notifications[0]])
+
+    def test_invalid_parameters(self):
+        for data in ({'before': 5}, {'before': ['2026-01-01']}, {'before': 'вчера'},
+                     {'before': '2026-13-45T00:00'}, {'kind': 'unknown'}):
+            with self.subTest(data=data):
+                response = self.client.post(self.url, data, content_type='application/json')
+                self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.get_unread().count(), 3)
+
+    def test_page_link_marks_read(self):
+        url = reverse('update_all_gen_notify', kwargs={'pk': self.user.pk})
+
+        response = self.client.get(url, {'before': timezone.now().isoformat()})
+
+        self.assertRedirects(response, reverse('lk'), fetch_redirect_response=False)
+        self.assertFalse(self.get_unread().exists())
+
+    def test_page_link_with_invalid_date(self):
+        url = reverse('update_all_gen_notify', kwargs={'pk': self.user.pk})
+
+        response = self.client.get(url, {'before': '2026-13-45T00:00'})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.get_unread().count(), 3)
+
+
+@override_settings(NOTIFICATION_OUTBOX=True, NOTIFICATION_COALESCE=True, NOTIFICATION_COALESCE_SENDERS=2)
+class CoalescedNotificationTest(OnCommitTestCase):
+    """Лайки одного объекта объединяются в одно непрочитанное уведомление"""
+
+    def setUp(self):
+        self.author = create_user('author')
+        self.readers = [create_user(f'reader{i}') for i in range(3)]
+        self.article = create_article(self.author, title='Популярная статья')
+
+    def like(self, *users):
+        with self.committed():
+            self.article.likes.add(*users)
+        process_notification_outbox()
+
+    def unlike(self, user):
+        with self.committed():
+            self.article.likes.remove(user)
+
+    def get_notification(self):
+        return NotificationUserAfterLikeAndComment.objects.get(recipient_notification=self.author, is_read=False)
+
+    def test_likes_are_coalesced(self):
+        for reader in self.readers:
+            self.like(reader)
+
+        notification = self.get_notification()
+        self.assertEqual(notification.sender_count, 3)
+        self.assertEqual(notification.sender_notification, self.readers[2])
+        self.assertEqual(notification.last_sender_ids, [str(self.readers[2].pk), str(self.readers[1].pk)])
+        self.assertIn('и еще 2 поставили лайк статье: Популярная статья', notification.message)
+
+    def test_likes_in_one_batch_are_coalesced(self):
+        self.like(*self.readers)
+
+        self.assertEqual(self.get_notification().sender_count, 3)
+
+    def test_repeated_like_is_not_counted(self):
+        self.like(self.readers[0])
+        self.like(self.readers[1])
+        self.unlike(self.readers[0])
+        self.like(self.readers[0])
+
+        notification = self.get_notification()
+        self.assertEqual(notification.sender_count, 2)
+        self.assertEqual(notification.sender_notification, self.readers[0])
+        self.assertEqual(notification.last_sender_ids, [str(self.readers[0].pk), str(self.readers[1].pk)])
+        self.assertIn('и еще 1 поставили', notification.message)
+
+    def test_repeated_like_of_older_sender_is_not_counted(self):
+        for reader in self.readers:
+            self.like(reader)
+        self.unlike(self.readers[0])
+        self.like(self.readers[0])
+
+        notification = self.get_notification()
+        self.assertEqual(notification.sender_count, 3)
+        self.assertEqual(notification.last_sender_ids, [str(self.readers[0].pk), str(self.readers[2].pk)])
+
+    def test_like_after_read_creates_new_notification(self):
+        self.like(self.readers[0])
+        NotificationUserAfterLikeAndComment.objects.update(is_read=True)
+        self.like(self.readers[1])
+
+        self.assertEqual(NotificationUserAfterLikeAndComment.objects.count(), 2)
+        self.assertEqual(self.get_notification().sender_count, 1)
+
+    @override_settings(NOTIFICATION_COALESCE=False)
+    def test_without_coalescing(self):
+        self.like(self.readers[0])
+        self.like(self.readers[1])
+
+        self.assertEqual(NotificationUserAfterLikeAndComment.objects.filter(is_read=False).count(), 2)
+
+
+@override_settings(NOTIFICATION_OUTBOX=True, NOTIFICATION_COALESCE=True)
+class ArchiveNotificationsTest(OnCommitTestCase):
+    """Перенос старых прочитанных уведомлений в архив командой archive_notifications"""
+
+    def setUp(self):
+        self.author = create_user('author')
+        self.readers = [create_user(f'reader{i}') for i in range(2)]
+        self.article = create_article(self.author)
+        with self.committed():
+            self.article.likes.add(*self.readers)
+        process_notification_outbox()
+
+    def archive(self, **options):
+        stdout = StringIO()
+        call_command('archive_notifications', days=30, stdout=stdout, **options)
+        return stdout.getvalue()
+
+    def test_read_notification_is_archived(self):
+        NotificationUserAfterLikeAndComment.objects.update(
+            is_read=True, created_timestamp=timezone.now() - timedelta(days=31)
+        )
+
+        output = self.archive()
+
+        self.assertIn('NotificationUserAfterLikeAndComment: перенесено 1', output)
+        self.assertFalse(NotificationUserAfterLikeAndComment.objects.exists())
+        self.assertFalse(NotificationSender.objects.exists())
+        archived = NotificationArchive.objects.get(source=NotificationArchive.GENERAL)
+        self.assertEqual(archived.recipient_id, self.author.pk)
+        self.assertEqual(archived.data['sender_count'], 2)
+        self.assertEqual(len(archived.data['last_sender_ids']), 2)
+
+    def test_recent_and_unread_notifications_are_kept(self):
+        output = self.archive()
+
+        self.assertIn('NotificationUserAfterLikeAndComment: перенесено 0', output)
+        self.assertEqual(NotificationUserAfterLikeAndComment.objects.count(), 1)
+        self.assertEqual(NotificationSender.objects.count(), 2)
+
+    def test_dry_run(self):
+        NotificationUserAfterLikeAndComment.objects.update(
+            is_read=True, created_timestamp=timezone.now() - timedelta(days=31)
+        )
+
+        output = self.archive(dry_run=True)
+
+        self.assertIn('перенесено 1', output)
+        self.assertIn('--dry-run', output)
+        self.assertEqual(NotificationUserAfterLikeAndComment.objects.count(), 1)
+        self.assertFalse(NotificationArchive.objects.exists())
+
+
+class NotificationStreamAvailabilityTest(TestCase):
+    """Скрипт потока уведомлений подключается, только если поток доставит события"""
+
+    def setUp(self):
+        self.user = create_user('user')
+        get_broker.cache_clear()
+        self.addCleanup(get_broker.cache_clear)
+
+    def get_stream_url(self, request_factory):
+        request = request_factory.get('/')
+        request.user = self.user
+        return unread_notifications(request)['notification_stream_url']
+
+    def test_wsgi_request(self):
+        self.assertEqual(self.get_stream_url(RequestFactory()), '')
+
+    @override_settings(NOTIFICATION_OUTBOX=False, NOTIFICATION_BROKER=None)
+    def test_in_process_broker_without_outbox(self):
+        self.assertEqual(self.get_stream_url(AsyncRequestFactory()), '/events/notifications/')
+
+    @override_settings(NOTIFICATION_OUTBOX=True, NOTIFICATION_BROKER=None)
+    def test_in_process_broker_with_outbox(self):
+        self.assertEqual(self.get_stream_url(AsyncRequestFactory()), '')
+
+    @override_settings(NOTIFICATION_OUTBOX=True, NOTIFICATION_BROKER='mainapp.realtime.PostgresBroker')
+    def test_cross_process_broker_with_outbox(self):
+        self.assertEqual(self.get_stream_url(AsyncRequestFactory()), '/events/notifications/')
+
+    def test_page_without_stream(self):
+        self.client.force_login(self.user)
+
+        response = self.client.get(reverse('lk'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, 'notifications_stream.js')
+
+
+class TriggerMatcherTest(TestCase):
+    """Поиск всех шаблонов за один проход по тексту"""
+
+    def test_overlapping_patterns(self):
+        matcher = TriggerMatcher([('he', 'a'), ('she', 'b'), ('hers', 'c')])
+
+        self.assertEqual(sorted(matcher.find('ushers')), [('he', 'a', 2), ('hers', 'c', 2), ('she', 'b', 1)])
+
+    def test_case_insensitive(self):
+        matcher = TriggerMatcher([('@Moderator', 'moderator_request')])
+
+        self.assertEqual(matcher.find('Позовите @MODERATOR'), [('@moderator', 'moderator_request', 9)])
+
+    def test_same_as_substring_search(self):
+        patterns = ['ab', 'b', 'bab', 'abc', 'c', 'aab']
+        text = 'aababcbabcab'
+        matcher = TriggerMatcher([(pattern, 'kind') for pattern in patterns])
+
+        expected = sorted(
+            (pattern, 'kind', position)
+            for pattern in patterns for position in range(len(text)) if text.startswith(pattern, position)
+        )
+        self.assertEqual(sorted(matcher.find(text)), expected)
+
+
+class CommentTriggerTest(OnCommitTestCase):
+    """Триггеры новых комментариев: запрос модератора, стоп-слова и упоминания пользователей"""
+
+    def setUp(self):
+        matcher_cache.reset()
+        self.author = create_user('author')
+        self.reader = create_user('reader')
+        self.article = create_article(self.author, title='Про триггеры')
+
+    def create_comment(self, text):
+        with self.committed():
+            return ArticleComment.objects.create(article_comment=self.article, user=self.reader, text=text)
+
+    def get_mentioned_ids(self):
+        return list(NotificationOutbox.objects.filter(kind=NotificationOutbox.MENTION)
+                    .values_list('recipient_id', flat=True))
+
+    def test_moderator_request_once(self):
+        comment = self.create_comment('Нужен @moderator')
+        with self.committed():
+            comment.text = 'Нужен @moderator, срочно'
+            comment.save()
+
+        self.assertEqual(ModeratorNotification.objects.get().comment_initiator, comment)
+
+    def test_update_changes_version_stamp(self):
+        trigger = CommentTrigger.objects.create(pattern='спам', kind=CommentTrigger.STOP_WORD)
+        stamp = CommentTrigger.get_version_stamp()
+
+        CommentTrigger.objects.filter(pk=trigger.pk).update(is_active=False)
+
+        self.assertNotEqual(CommentTrigger.get_version_stamp(), stamp)
+
+    def test_stop_word_disabled_by_update(self):
+        trigger = CommentTrigger.objects.create(pattern='спам', kind=CommentTrigger.STOP_WORD)
+        with self.assertLogs('mainapp.models', 'WARNING'):
+            self.create_comment('Это спам')
+
+        CommentTrigger.objects.filter(pk=trigger.pk).update(is_active=False)
+
+        with self.assertNoLogs('mainapp.models', 'WARNING'):
+            self.create_comment('Это спам')
+
+    @override_settings(NOTIFICATION_OUTBOX=True)
+    def test_mention_is_enqueued(self):
+        self.create_comment('@author, спасибо! И еще раз @author.')
+
+        self.assertEqual(self.get_mentioned_ids(), [self.author.pk])
+        process_notification_outbox()
+        notification = NotificationUserAfterLikeAndComment.objects.get(kind=NotificationOutbox.MENTION)
+        self.assertEqual(notification.recipient_notification, self.author)
+        self.assertIn('упомянул Вас', notification.message)
+
+    @override_settings(NOTIFICATION_OUTBOX=True)
+    def test_mention_matches_whole_username(self):
+        create_user('ivan')
+
+        self.create_comment('Привет, @ivanov и mail@ivan.ru')
+
+        self.assertEqual(self.get_mentioned_ids(), [])
+
+    @override_settings(NOTIFICATION_OUTBOX=True, COMMENT_TRIGGERS_CHECK_INTERVAL=3600)
+    def test_new_user_is_mentionable(self):
+        self.create_comment('Первый комментарий')
+        stamp = CommentTrigger.get_version_stamp()
+        newcomer = create_user('newcomer')
+
+        self.create_comment('Добро пожаловать, @newcomer!')
+
+        self.assertEqual(self.get_mentioned_ids(), [newcomer.pk])
+        self.assertEqual(CommentTrigger.get_version_stamp(), stamp)
+
+    @override_settings(NOTIFICATION_OUTBOX=True)
+    def test_mentions_are_loaded_in_one_query(self):
+        ivan = create_user('ivan')
+        comment = ArticleComment(article_comment=self.article, user=self.reader, text='@author, @ivan и @nobody')
+        event = TriggerEvent(CommentTrigger.MENTION, comment, [
+            TriggerMatch('@', position) for position in (0, 9, 17)
+        ])
+
+        with self.captureOnCommitCallbacks() as callbacks, self.assertNumQueries(1):
+            notify_mentioned_users(ArticleComment, event)
+
+        self.assertEqual(len(callbacks), 2)
+        for callback in callbacks:
+            callback()
+        self.assertCountEqual(self.get_mentioned_ids(), [self.author.pk, ivan.pk])
+
+    @override_settings(NOTIFICATION_OUTBOX=True)
+    def test_inactive_user_is_not_mentioned(self):
+        User.objects.filter(pk=self.author.pk).update(is_active=False)
+        matcher_cache.reset()
+
+        self.create_comment('@author')
+
+        self.assertEqual(self.get_mentioned_ids(), [])
+
+
+class FeedPageCacheTest(TestCase):
+    """Страницы лент для анонимных пользователей из кэша"""
+
+    def setUp(self):
+        cache.clear()
+        self.author = create_user('author')
+        self.python = ArticleCategories.objects.create(name='Python')
+        self.django = ArticleCategories.objects.create(name='Django')
+        self.article = create_article(self.author, self.python)
+
+    def get_feed(self, get_response):
+        request = RequestFactory().get('/', {'sort': 'rating'})
+        request.user = AnonymousUser()
+        view = SimpleNamespace(get_feed_page_scope=lambda: FEED_PAGE_MAIN_SCOPE)
+        return get_cached_feed_response(view, get_response, request)
+
+    def test_cached_page_keeps_headers(self):
+        def get_response(request):
+            response = SimpleTemplateResponse(engines['django'].from_string('Лента'), content_type='application/xhtml+xml; charset=utf-8')
+            response['X-Feed-Version'] = '2'
+            return response
+
+        response = self.get_feed(get_response)
+        cached_response = self.get_feed(lambda request: self.fail('страница не взята из кэша'))
+
+        self.assertEqual(cached_response.content, response.content)
+        self.assertEqual(cached_response['Content-Type'], 'application/xhtml+xml; charset=utf-8')
+        self.assertEqual(cached_response['X-Feed-Version'], '2')
+
+    def get_category_version(self, category):
+        return get_cache_versions(FEED_PAGE_VERSION_KEY.format(category.pk))[0]
+
+    def test_move_to_other_category_resets_both_feeds(self):
+        python_version, django_version = self.get_category_version(self.python), self.get_category_version(self.django)
+        article = Article.objects.get(pk=self.article.pk)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            article.categories = self.django
+            article.save()
+
+        self.assertGreater(self.get_category_version(self.python), python_version)
+        self.assertGreater(self.get_category_version(self.django), django_version)
+
+    def test_save_does_not_load_previous_category(self):
+        article = Article.objects.get(pk=self.article.pk)
+
+        with CaptureQueriesContext(connection) as queries:
+            article.save()
+
+        self.assertFalse([query for query in queries if query['sql'].startswith('SELECT')])
+
+
+class FeedCountInvalidationTest(TestCase):
+    """Количества статей в лентах сбрасываются после фиксации транзакции"""
+
+    def setUp(self):
+        cache.clear()
+        self.article = create_article(create_user('author'))
+
+    def test_status_change_resets_counts_on_commit(self):
+        version = get_feed_count_version()
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.article.status = Article.DRAFT
+            self.article.save()
+            self.assertEqual(get_feed_count_version(), version)
+        for callback in callbacks:
+            callback()
+
+        self.assertGreater(get_feed_count_version(), version)
+
+    def test_delete_resets_counts_on_commit(self):
+        version = get_feed_count_version()
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.article.delete()
+            self.assertEqual(get_feed_count_version(), version)
+        for callback in callbacks:
+            callback()
+
+        self.assertGreater(get_feed_count_version(), version)
+
+
+class CursorPaginatorTest(TestCase):
+    """Keyset-пагинация лент: курсоры вперед и назад при одинаковых рейтингах и датах"""
+
+    def setUp(self):
+        cache.clear()
+        self.author = create_user('author')
+        self.articles = [create_article(self.author, title=f'Статья {i}') for i in range(16)]
+        created = timezone.now() - timedelta(days=1)
+        for i, article in enumerate(self.articles):
+            # по три статьи с одной датой и рейтингом 0, 1 или 2
+            Article.objects.filter(pk=article.pk).update(rating=i % 3,
+                                                         created_timestamp=created + timedelta(hours=i // 3))
+
+    def get_paginator(self, sort, queryset=None, per_page=4):
+        key_field, descending = get_feed_sort_key(sort)
+        queryset = order_by_sort_key(Article.objects.all() if queryset is None else queryset, key_field, descending)
+        return queryset, CursorPaginator(queryset, per_page, key_field, descending, sort=sort)
+
+    def walk(self, cursor_paginator, page, attribute):
+        pages = [page]
+        while getattr(page, attribute) is not None:
+            page = cursor_paginator.page(getattr(page, attribute))
+            pages.append(page)
+        return pages
+
+    def test_walk_forward_and_backward(self):
+        for sort in ('date', 'date_reverse', 'rating', 'rating_reverse'):
+            with self.subTest(sort=sort):
+                queryset, cursor_paginator = self.get_paginator(sort)
+                expected = [article.pk for article in queryset]
+                first_page = cursor_paginator.add_cursors(Paginator(queryset, 4).page(1))
+
+                pages = self.walk(cursor_paginator, first_page, 'next_cursor')
+                self.assertEqual([article.pk for page in pages for article in page], expected)
+                self.assertEqual([len(page) for page in pages], [4, 4, 4, 4])
+
+                pages = self.walk(cursor_paginator, pages[-1], 'previous_cursor')
+                self.assertEqual([article.pk for page in reversed(pages) for article in page], expected)
+
+    def test_tampered_cursor(self):
+        queryset, cursor_paginator = self.get_paginator('rating')
+        cursor = cursor_paginator.add_cursors(Paginator(queryset, 4).page(1)).next_cursor
+
+        with self.assertRaises(Http404):
+            cursor_paginator.page(cursor[:-1] + ('A' if cursor[-1] != 'A' else 'B'))
+
+    def test_cursor_of_other_sort(self):
+        queryset, rating_paginator = self.get_paginator('rating')
+        cursor = rating_paginator.add_cursors(Paginator(queryset, 4).page(1)).next_cursor
+        _, date_paginator = self.get_paginator('date')
+
+        with self.assertRaises(Http404):
+            date_paginator.page(cursor)
+
+    def test_cursor_with_filter_params(self):
+        params = {'sort': 'rating', 'start_rating': 1}
+        response = self.client.get(reverse('main'), params)
+        first_page = response.context['page_obj']
+
+        response = self.client.get(reverse('main'), {**params, 'cursor': first_page.next_cursor})
+
+        articles = [*first_page.object_list, *response.context['page_obj'].object_list]
+        self.assertEqual(len(articles), 10)
+        self.assertEqual(len({article.pk for article in articles}), 10)
+        self.assertTrue(all(article.rating >= 1 for article in articles))
+        self.assertIsNone(response.context['page_obj'].next_cursor)
+
+    def test_invalid_cursor_in_request(self):
+        response = self.client.get(reverse('main'), {'sort': 'rating', 'cursor': 'invalid'})
+
+        self.assertEqual(response.status_code, 404)
+
+
+def search_ids(query):
+    return list(Article.objects.search(query).order_by('-search_rank').values_list('pk', flat=True))
+
+
+@skipUnless(connection.vendor == 'sqlite', 'FTS5-индекс только в SQLite')
+class SQLiteSearchTest(TestCase):
+    """Индекс FTS5 обновляется триггерами таблицы документов при изменении статей"""
+
+    def setUp(self):
+        self.author = create_user('author')
+        self.article = create_article(self.author, title='Асинхронный Python', subtitle='Про asyncio',
+                                      text='<p>Цикл событий и корутины</p>')
+
+    def count_index_rows(self, match_query):
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT count(*) FROM {SQLITE_SEARCH_INDEX_TABLE} '
+                           f'WHERE {SQLITE_SEARCH_INDEX_TABLE} MATCH %s', [match_query])
+            return cursor.fetchone()[0]
+
+    def test_insert(self):
+        self.assertEqual(search_ids('корутины'), [self.article.pk])
+        self.assertEqual(search_ids('асинхрон'), [self.article.pk])
+        self.assertEqual(self.count_index_rows('"корутины"'), 1)
+
+    def test_update(self):
+        self.article.text = '<p>Потоки и процессы</p>'
+        self.article.save()
+
+        self.assertEqual(search_ids('корутины'), [])
+        self.assertEqual(search_ids('потоки'), [self.article.pk])
+        self.assertEqual(self.count_index_rows('"корутины"'), 0)
+
+    def test_delete(self):
+        self.article.delete()
+
+        self.assertEqual(search_ids('асинхронный'), [])
+        self.assertEqual(self.count_index_rows('"асинхронный"'), 0)
+
+    def test_title_match_ranks_higher(self):
+        body_match = create_article(self.author, title='Заметки', subtitle='Разное',
+                                    text='<p>Немного про python в конце текста</p>')
+
+        self.assertEqual(search_ids('python'), [self.article.pk, body_match.pk])
+
+    def test_special_characters_in_query(self):
+        self.assertEqual(search_ids('"python*" (asyncio'), [self.article.pk])
+        self.assertEqual(search_ids('"*'), [])
+
+
+@skipUnless(connection.vendor == 'postgresql', 'tsvector-индекс только в PostgreSQL')
+class PostgresSearchTest(TestCase):
+    """Поиск по tsvector-колонке таблицы документов с морфологией"""
+
+    def setUp(self):
+        self.author = create_user('author')
+        self.article = create_article(self.author, title='Асинхронный Python', subtitle='Про asyncio',
+                                      text='<p>Цикл событий и корутины</p>')
+
+    def test_insert_update_delete(self):
+        self.assertEqual(search_ids('корутина'), [self.article.pk])
+
+        self.article.text = '<p>Потоки и процессы</p>'
+        self.article.save()
+        self.assertEqual(search_ids('корутина'), [])
+        self.assertEqual(search_ids('поток'), [self.article.pk])
+
+        self.article.delete()
+        self.assertEqual(search_ids('поток'), [])
+
+    def test_title_match_ranks_higher(self):
+        body_match = create_article(self.author, title='Заметки', subtitle='Разное',
+                                    text='<p>Немного про python в конце текста</p>')
+
+        self.assertEqual(search_ids('python'), [self.article.pk, body_match.pk])
+
+
+class SearchSnippetTest(TestCase):
+    """Сниппеты результатов поиска с подсвеченными совпадениями"""
+
+    def setUp(self):
+        cache.clear()
+        self.author = create_user('author')
+        self.article = create_article(self.author, title='Асинхронный Python',
+                                      text='<p>Код &lt;script&gt;alert(1)&lt;/script&gt; и корутины</p>')
+
+    def test_format_snippet_escapes_text(self):
+        snippet = f'<b>{SNIPPET_START}корутины{SNIPPET_STOP}</b>'
+
+        self.assertEqual(BaseSearchBackend.format_snippet(snippet), '&lt;b&gt;<mark>корутины</mark>&lt;/b&gt;')
+
+    def test_without_query_or_articles(self):
+        backend = get_search_backend()
+
+        self.assertEqual(backend.get_snippets('', [self.article.pk]), {})
+        self.assertEqual(backend.get_snippets('корутины', []), {})
+
+    def test_database_error_falls_back_to_preview(self):
+        backend = get_search_backend()
+
+        with patch.object(type(backend), 'fetch_snippets', side_effect=DatabaseError('interrupted')):
+            self.assertEqual(backend.get_snippets('корутины', [self.article.pk]), {})
+
+    @skipUnless(connection.vendor in ('sqlite', 'postgresql'), 'сниппеты строит индекс SQLite или PostgreSQL')
+    def test_match_is_highlighted(self):
+        snippets = get_search_backend().get_snippets('корутины', [self.article.pk])
+
+        self.assertIn('<mark>корутины</mark>', snippets[self.article.pk])
+        self.assertIn('&lt;script&gt;', snippets[self.article.pk])
+        self.assertNotIn('<script>', snippets[self.article.pk])
+
+    @skipUnless(connection.vendor in ('sqlite', 'postgresql'), 'сниппеты строит индекс SQLite или PostgreSQL')
+    def test_search_page(self):
+        response = self.client.get(reverse('search'), {'query': 'корутины'})
+
+        self.assertContains(response, '<mark>корутины</mark>')
+        self.assertNotContains(response, '<script>alert(1)')
+
+
+@override_settings(ARTICLE_RATING_WRITE_BEHIND=False)
+class AuthorRatingTest(TestCase):
+    """Рейтинг автора меняется на разницу рейтинга статьи, без агрегации по всем статьям"""
+
+    def setUp(self):
+        self.author = create_user('author')
+        self.readers = [create_user(f'reader{i}') for i in range(4)]
+        self.articles = [create_article(self.author, title=f'Статья {i}') for i in range(2)]
+
+    def get_profile(self):
+        return UserProfile.objects.get(user=self.author)
+
+    def test_new_articles_are_counted(self):
+        profile = self.get_profile()
+
+        self.assertEqual((profile.article_rating_sum, profile.article_rating_count, profile.rating), (0, 2, 0))
+
+    def test_article_likes_change_average(self):
+        self.articles[0].likes.add(*self.readers)
+        self.articles[1].likes.add(self.readers[0])
+
+        profile = self.get_profile()
+        self.assertEqual((profile.article_rating_sum, profile.article_rating_count), (5, 2))
+        self.assertEqual(profile.previous_article_rating, 2)
+        self.assertEqual(profile.rating, 2)
+        self.assertEqual(Article.objects.get(pk=self.articles[0].pk).rating, 4)
+
+    def test_unlike_and_comments(self):
+        self.articles[0].likes.add(*self.readers)
+        self.articles[0].likes.remove(self.readers[0])
+        for i in range(5):
+            ArticleComment.objects.create(article_comment=self.articles[1], user=self.readers[0], text=f'Текст {i}')
+
+        profile = self.get_profile()
+        self.assertEqual(ArticleRating.objects.get(article_rating=self.articles[1]).rating, 1)
+        self.assertEqual((profile.article_rating_sum, profile.article_rating_count), (4, 2))
+        self.assertEqual(profile.rating, 2)
+
+    def test_article_delete(self):
+        self.articles[0].likes.add(*self.readers)
+        self.articles[1].likes.add(self.readers[0])
+
+        self.articles[1].delete()
+
+        profile = self.get_profile()
+        self.assertEqual((profile.article_rating_sum, profile.article_rating_count), (4, 1))
+        self.assertEqual(profile.rating, 4)
+
+    def test_stars_and_comment_likes_are_added(self):
+        self.articles[0].likes.add(*self.readers[:2])
+        self.author.userprofile.stars.add(self.readers[0])
+        comment = ArticleComment.objects.create(article_comment=self.articles[0], user=self.author, text='Ответ')
+        comment.likes.add(self.readers[1])
+
+        self.assertEqual(self.get_profile().rating, 1 + 1 + 1)
+
+    def test_concurrent_stale_rating_is_reread(self):
+        stale_rating = ArticleRating.objects.get(article_rating=self.articles[0])
+        ArticleRating.objects.get(article_rating=self.articles[0]).set_rating(3)
+
+        stale_rating.set_rating(5)
+
+        profile = self.get_profile()
+        self.assertEqual(ArticleRating.objects.get(article_rating=self.articles[0]).rating, 5)
+        self.assertEqual(profile.article_rating_sum, 5)
+
+
+@override_settings(ARTICLE_RATING_WRITE_BEHIND=True, ARTICLE_RATING_COALESCE_SECONDS=5,
+                   ARTICLE_RATING_MAX_STALENESS=60)
+class RatingWriteBehindTest(TestCase):
+    """Отложенный пересчет рейтинга статьи: события объединяются, рейтинг пересчитывается один раз"""
+
+    def setUp(self):
+        self.author = create_user('author')
+        self.readers = [create_user(f'reader{i}') for i in range(3)]
+        self.article = create_article(self.author)
+
+    def get_rating(self):
+        return Article.objects.get(pk=self.article.pk).rating
+
+    def process_events(self, **options):
+        stdout = StringIO()
+        call_command('process_rating_events', stdout=stdout, **options)
+        return stdout.getvalue()
+
+    def age_events(self, seconds):
+        ArticleRatingEvent.objects.update(created_timestamp=timezone.now() - timedelta(seconds=seconds))
+
+    def test_likes_are_queued(self):
+        self.article.likes.add(*self.readers)
+        self.article.likes.remove(self.readers[0])
+
+        self.assertEqual(ArticleRatingEvent.objects.filter(article=self.article).count(), 2)
+        self.assertEqual(self.get_rating(), 0)
+
+    def test_events_are_coalesced(self):
+        for reader in self.readers:
+            self.article.likes.add(reader)
+
+        self.assertEqual(ProcessRatingEventsCommand.get_ready_article_ids(), [])
+        self.age_events(6)
+
+        self.assertIn('Пересчитан рейтинг статей: 1', self.process_events())
+        self.assertEqual(self.get_rating(), 3)
+        self.assertFalse(ArticleRatingEvent.objects.exists())
+
+    def test_long_burst_is_flushed_after_max_staleness(self):
+        self.article.likes.add(self.readers[0])
+        self.age_events(61)
+        self.article.likes.add(self.readers[1])
+
+        self.process_events()
+
+        self.assertEqual(self.get_rating(), 2)
+
+    def test_flush_all(self):
+        self.article.likes.add(self.readers[0])
+
+        self.assertEqual(self.process_events(), '')
+        self.process_events(all=True)
+
+        self.assertEqual(self.get_rating(), 1)
+
+    def test_article_without_events_is_skipped(self):
+        self.article.likes.add(*self.readers[:2])
+
+        self.assertEqual(flush_article_rating_events([self.article.pk, self.article.pk]), 1)
+        self.assertEqual(self.get_rating(), 2)
+
+    @override_settings(ARTICLE_RATING_FLUSH_ON_READ=True)
+    def test_flush_on_read(self):
+        self.article.likes.add(*self.readers[:2])
+
+        response = self.client.get(reverse('article', kwargs={'pk': self.article.pk}))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['object'].rating, 2)
+        self.assertFalse(ArticleRatingEvent.objects.exists())
+
+
+@override_settings(ARTICLE_RATING_WRITE_BEHIND=False)
+class RebuildRatingsTest(TestCase):
+    """Пересчет рейтингов статей и авторов командой rebuild_ratings"""
+
+    def setUp(self):
+        self.author = create_user('author')
+        self.readers = [create_user(f'reader{i}') for i in range(3)]
+        self.article = create_article(self.author)
+        self.article.likes.add(*self.readers)
+        self.profile = self.author.userprofile
+
+    def rebuild(self, **options):
+        stdout = StringIO()
+        call_command('rebuild_ratings', stdout=stdout, **options)
+        return stdout.getvalue()
+
+    def corrupt_ratings(self):
+        ArticleRating.objects.filter(article_rating=self.article).update(rating=10)
+        Article.objects.filter(pk=self.article.pk).update(rating=10)
+        UserProfile.objects.filter(pk=self.profile.pk).update(rating=0, article_rating_sum=0)
+
+    def test_consistent_ratings(self):
+        output = self.rebuild(dry_run=True)
+
+        self.assertIn('ArticleRating.rating: проверено 1, расхождений 0', output)
+        self.assertIn('Article.rating: проверено 1, расхождений 0', output)
+        # профили автора и читателей
+        self.assertIn('UserProfile.rating: проверено 4, расхождений 0', output)
+        self.assertIn('UserProfile.article_rating_sum/count: проверено 4, расхождений 0', output)
+
+    def test_dry_run_reports_without_writing(self):
+        self.corrupt_ratings()
+
+        output = self.rebuild(dry_run=True)
+
+        self.assertIn('ArticleRating.rating: проверено 1, расхождений 1', output)
+        self.assertIn(f'  {self.article.pk}: 10 -> 3', output)
+        self.assertIn('UserProfile.rating: проверено 4, расхождений 1', output)
+        self.assertIn(f'  {self.profile.pk}: 0 -> 3', output)
+        self.assertIn('--dry-run', output)
+        self.assertEqual(Article.objects.get(pk=self.article.pk).rating, 10)
+        self.assertEqual(UserProfile.objects.get(pk=self.profile.pk).rating, 0)
+
+    def test_rebuild_writes_ratings(self):
+        self.corrupt_ratings()
+
+        self.rebuild(chunk_size=1)
+
+        self.assertEqual(ArticleRating.objects.get(article_rating=self.article).rating, 3)
+        self.assertEqual(Article.objects.get(pk=self.article.pk).rating, 3)
+        profile = UserProfile.objects.get(pk=self.profile.pk)
+        self.assertEqual((profile.rating, profile.article_rating_sum, profile.article_rating_count), (3, 3, 1))
+        self.assertNotIn('расхождений 1', self.rebuild(dry_run=True))
@@ -0,0 +1,129 @@
+import time
+from collections import deque
+from typing import NamedTuple
+
+from django.conf import settings
+from django.dispatch import Signal
+
+# событие по совпадениям триггеров в новом комментарии, отправляется один раз на вид
+# триггера: comment_trigger_matched.send(sender=ArticleComment, event=TriggerEvent(...));
+# получатели выбирают нужные события по event.kind
+comment_trigger_matched = Signal()
+
+
+class TriggerMatch(NamedTuple):
+    """Совпадение шаблона: шаблон в нижнем регистре и позиция начала в тексте комментария"""
+    pattern: str
+    position: int
+
+
+class TriggerEvent(NamedTuple):
+    """Совпадения триггеров одного вида в комментарии: [TriggerMatch, ...]"""
+    kind: str
+    comment: object
+    matches: list
+
+
+class TriggerMatcher:
+    """
+    Поиск всех шаблонов в тексте за один проход (автомат Ахо-Корасик).
+    Время поиска линейно от длины текста и количества совпадений
+    и не зависит от количества шаблонов. Регистр не учитывается
+    """
+
+    def __init__(self, patterns):
+        """patterns - пары (шаблон, вид триггера)"""
+        self._goto = [{}]
+        self._fail = [0]
+        # шаблоны, заканчивающиеся в состоянии, с учетом суффиксных ссылок
+        self._output = [[]]
+        for pattern, kind in patterns:
+            pattern = pattern.lower()
+            if pattern:
+                self._add(pattern, kind)
+        self._build()
+
+    def _add(self, pattern, kind):
+        state = 0
+        for char in pattern:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            state = next_state
+        self._output[state].append((pattern, kind))
+
+    def _build(self):
+        """Суффиксные ссылки обходом бора в ширину"""
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def find(self, text):
+        """Все совпадения в тексте: [(шаблон, вид триггера, позиция начала), ...]"""
+        matches = []
+        state = 0
+        for position, char in enumerate(text.lower()):
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            for pattern, kind in self._output[state]:
+                matches.append((pattern, kind, position - len(pattern) + 1))
+        return matches
+
+
+class TriggerMatcherCache:
+    """
+    Скомпилированный автомат активных триггеров из базы. Раз в
+    COMMENT_TRIGGERS_CHECK_INTERVAL секунд сверяется отметка версии
+    (количество и время последнего изменения триггеров), при изменении
+    автомат пересобирается - правки триггеров подхватываются без перезапуска
+    """
+
+    def __init__(self):
+        self._matcher = None
+        self._stamp = None
+        self._checked_at = 0
+
+    def reset(self):
+        """Проверить отметку версии при следующем обращении (триггер изменен в этом процессе)"""
+        self._checked_at = 0
+
+    def get(self):
+        from mainapp.models import CommentTrigger
+
+        now = time.monotonic()
+        if self._matcher is None or now - self._checked_at >= settings.COMMENT_TRIGGERS_CHECK_INTERVAL:
+            stamp = CommentTrigger.get_version_stamp()
+            if stamp != self._stamp or self._matcher is None:
+                patterns = CommentTrigger.objects.filter(is_active=True).values_list('pattern', 'kind')
+                self._matcher = TriggerMatcher(patterns)
+                self._stamp = stamp
+            self._checked_at = now
+        return self._matcher
+
+
+matcher_cache = TriggerMatcherCache()
+
+
+def run_comment_triggers(comment):
+    """
+    Поиск триггеров в тексте нового комментария и отправка событий
+    comment_trigger_matched, по одному на каждый найденный вид триггера
+    """
+    matches_by_kind = {}
+    for pattern, kind, position in matcher_cache.get().find(comment.text or ''):
+        matches_by_kind.setdefault(kind, []).append(TriggerMatch(pattern, position))
+    for kind, matches in matches_by_kind.items():
+        comment_trigger_matched.send(sender=type(comment), event=TriggerEvent(kind, comment, matches))
+    return list(matches_by_kind)
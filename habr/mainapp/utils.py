@@ -0,0 +1,53 @@
+import math
+import re
+from html import unescape
+
+# регулярное выражение для удаления html-тегов из текста статьи
+TAG_RE = re.compile(r'\<[^>]*\>')
+WORD_RE = re.compile(r'\w+')
+
+# длина превью статьи в символах
+TEXT_PREVIEW_LENGTH = 250
+# средняя скорость чтения, слов в минуту
+WORDS_PER_MINUTE = 180
+
+
+def strip_tags(html: str) -> str:
+    """
+    Удаляет html-теги из текста статьи
+    """
+    return TAG_RE.sub('', html or '')
+
+
+def get_plain_text(html: str) -> str:
+    """
+    Текст статьи без html-тегов и html-сущностей, для поискового индекса
+    """
+    return unescape(strip_tags(html))
+
+
+def get_text_stats(html: str) -> tuple:
+    """
+    Считает по html-тексту статьи превью, количество слов
+    и время чтения в минутах
+    """
+    text = strip_tags(html)
+    word_count = len(WORD_RE.findall(unescape(text)))
+    reading_time = math.ceil(word_count / WORDS_PER_MINUTE)
+    return text[:TEXT_PREVIEW_LENGTH], word_count, reading_time
+
+
+def exclude_counters_from_save(instance, counter_fields, save_kwargs) -> dict:
+    """
+    Дополняет аргументы save() существующей записи списком полей без счетчиков.
+    Счетчики меняются только F()-выражениями, и сохранение объекта, загруженного
+    до изменения счетчика, не должно перезаписывать их старыми значениями
+    """
+    if not instance._state.adding and save_kwargs.get('update_fields') is None \
+            and not save_kwargs.get('force_insert'):
+        deferred_fields = instance.get_deferred_fields()
+        save_kwargs['update_fields'] = [
+            field.name for field in instance._meta.concrete_fields
+            if not field.primary_key and field.name not in counter_fields and field.attname not in deferred_fields
+        ]
+    return save_kwargs
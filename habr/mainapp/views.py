@@ -10,8 +10,12 @@ from django.utils.decorators import method_decorator
 
 from django.views.generic import ListView, DetailView, CreateView, View, RedirectView, \
     UpdateView, TemplateView, DeleteView
+from django.views.generic.list import MultipleObjectMixin
 from django.shortcuts import HttpResponseRedirect, render, get_object_or_404
-from django.http import Http404
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import BadRequest
+from django.http import Http404, HttpResponse
 
 from uuid import UUID
 
@@ -25,7 +29,12 @@ from mainapp.forms import ArticleEditForm, CreationCommentForm, SearchForm
 from authapp.models import User, UserProfile
 from mainapp.models import Article, ArticleCategories, ArticleComment, ModeratorNotification, \
     ModeratorNotificationAboutReModeration, NotificationUsersFromModerator, \
-    NotificationUserAfterLikeAndComment
+    NotificationUserAfterLikeAndComment, flush_article_rating_events
+from mainapp.cache import FEED_PAGE_MAIN_SCOPE, get_feed_count_key, get_feed_page_key
+from mainapp.likes import get_liked_ids, has_liked, toggle_like
+from mainapp.notifications import mark_notifications_read, parse_read_watermark
+from mainapp.pagination import CachedCountPaginator, CursorPaginator, get_feed_sort_key, order_by_sort_key
+from mainapp.search import get_search_backend
 
 """обозначение списка категорий для вывода в меню во разных view"""
 category_list = ArticleCategories.objects.all()
@@ -47,14 +56,14 @@ def get_filter_params_from_get_request(self):
     """метод получения параметра сортировки"""
     param_string = ''
     for key, value in self.request.GET.items():
-        if key != 'page' and key != 'sort':
+        if key not in ('page', 'sort', 'cursor'):
             param_string += f'{key}={value}&'
     return param_string.rstrip('&')
 
 
 def add_filter_params_to_context(self, context):
     for key, value in self.request.GET.items():
-        if key != 'page' and key != 'sort' and key != 'query':
+        if key not in ('page', 'sort', 'cursor', 'query'):
             context[key] = value
     try:
         context['start_date'] = datetime.strptime((context['start_date']), "%Y-%m-%d")
@@ -78,24 +87,87 @@ def get_filter_article_queryset(self, article_queryset):
     if data['end_date']:
         queryset = queryset.filter(created_timestamp__lte=data['end_date'] + timedelta(days=1))
     if data['start_rating']:
-        queryset = queryset.filter(article_rating__rating__gte=data['start_rating'])
+        queryset = queryset.filter(rating__gte=data['start_rating'])
     if data['end_rating']:
-        queryset = queryset.filter(article_rating__rating__lte=data['end_rating'])
+        queryset = queryset.filter(rating__lte=data['end_rating'])
     return queryset
 
 
 def get_sort_article_queryset(self, article_queryset):
     """метод получения сортированных статей"""
+    key_field, descending = get_feed_sort_key(self.get_sort_from_request())
+    return order_by_sort_key(article_queryset, key_field, descending)
+
+
+def get_feed_count_scope(self):
+    """метод получения раздела ленты для ключа кэша количества статей"""
+    return [self.__class__.__name__, sorted(self.kwargs.items())]
+
+
+def get_feed_filter_params(self):
+    """метод получения параметров фильтра, от которых зависит количество статей"""
+    return {key: value for key, value in self.request.GET.items() if key not in ('page', 'sort', 'cursor')}
+
+
+def get_article_paginator(self, queryset, per_page, orphans=0, allow_empty_first_page=True, **kwargs):
+    """
+    метод получения Paginator с закэшированным количеством статей;
+    для ленты без фильтров допускается оценка количества планировщиком
+    """
+    params = get_feed_filter_params(self)
+    return CachedCountPaginator(
+        queryset, per_page,
+        count_key=get_feed_count_key(get_feed_count_scope(self), params),
+        estimate=not params,
+        orphans=orphans,
+        allow_empty_first_page=allow_empty_first_page,
+        **kwargs,
+    )
+
+
+def paginate_article_queryset(self, queryset, page_size):
+    """
+    метод разбиения статей на страницы: по номеру страницы (page)
+    или по курсору (cursor), без COUNT и OFFSET
+    """
     sort = self.get_sort_from_request()
-    if sort == 'date_reverse':
-        return article_queryset.reverse()
-    elif sort == 'rating':
-        return article_queryset.order_by(
-            'article_rating__rating').reverse()
-    elif sort == 'rating_reverse':
-        return article_queryset.order_by('article_rating__rating')
-    else:
-        return article_queryset
+    key_field, descending = get_feed_sort_key(sort)
+    cursor_paginator = CursorPaginator(queryset, page_size, key_field, descending, sort=sort,
+                                       count_paginator=self.get_paginator(queryset, page_size))
+    cursor = self.request.GET.get('cursor')
+    if cursor:
+        page = cursor_paginator.page(cursor)
+        return cursor_paginator, page, page.object_list, True
+
+    paginator, page, object_list, is_paginated = MultipleObjectMixin.paginate_queryset(self, queryset, page_size)
+    cursor_paginator.add_cursors(page)
+    return paginator, page, page.object_list, is_paginated
+
+
+def get_cached_feed_response(self, get_response, request, *args, **kwargs):
+    """
+    метод получения страницы ленты из кэша: страницы для анонимных
+    пользователей одинаковы и хранятся до смены версии раздела (см. mainapp.cache).
+    Вместе с содержимым хранятся заголовки ответа (Content-Type, Vary и другие)
+    """
+    scope = self.get_feed_page_scope()
+    if request.user.is_authenticated or scope is None:
+        return get_response(request, *args, **kwargs)
+
+    key = get_feed_page_key(self.__class__.__name__, scope, request.GET)
+    cached = cache.get(key)
+    if cached is not None:
+        content, headers = cached
+        response = HttpResponse(content)
+        for header, value in headers:
+            response[header] = value
+        return response
+
+    response = get_response(request, *args, **kwargs)
+    response.render()
+    if response.status_code == 200:
+        cache.set(key, (response.content, list(response.items())), settings.FEED_PAGE_CACHE_TIMEOUT)
+    return response
 
 
 class MainListView(ListView):
@@ -119,8 +191,20 @@ class MainListView(ListView):
     def add_filter_params_to_context(self, context):
         return add_filter_params_to_context(self, context)
 
+    def paginate_queryset(self, queryset, page_size):
+        return paginate_article_queryset(self, queryset, page_size)
+
+    def get_paginator(self, queryset, per_page, orphans=0, allow_empty_first_page=True, **kwargs):
+        return get_article_paginator(self, queryset, per_page, orphans, allow_empty_first_page, **kwargs)
+
+    def get_feed_page_scope(self):
+        return FEED_PAGE_MAIN_SCOPE
+
+    def get(self, request, *args, **kwargs):
+        return get_cached_feed_response(self, super().get, request, *args, **kwargs)
+
     def get_queryset(self):
-        queryset = Article.objects
+        queryset = Article.objects.feed().cards()
         queryset = self.get_filter_article_queryset(queryset)
         queryset = self.get_sort_article_queryset(queryset)
         return queryset
@@ -146,6 +230,12 @@ class ArticleDetailView(DetailView):
     template_name = 'mainapp/article_page.html'
     model = Article
 
+    def get_object(self, queryset=None):
+        # рейтинг статьи с необработанными событиями пересчитывается до ее загрузки
+        if settings.ARTICLE_RATING_FLUSH_ON_READ:
+            flush_article_rating_events([self.kwargs['pk']])
+        return super().get_object(queryset)
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         title = 'Статья'
@@ -153,6 +243,16 @@ class ArticleDetailView(DetailView):
         context['form'] = CreationCommentForm()
         context['categories_list'] = category_list
         context['search_form'] = search_form
+
+        # комментарии с ответами и лайками текущего пользователя загружаются заранее,
+        # чтобы шаблон не делал запросов на каждый комментарий
+        comments = self.object.get_comment_thread()
+        context['comments'] = comments
+        # лайки текущего пользователя проверяются пачкой по id, а не загрузкой всех лайкнувших
+        user = self.request.user
+        context['liked_comment_ids'] = get_liked_ids('comment', user, [comment.id for comment in comments])
+        context['is_article_liked'] = has_liked('article', user, self.object.id)
+        context['is_author_starred'] = has_liked('star', user, self.object.user.userprofile.id)
         return context
 
     def dispatch(self, request, *args, **kwargs):
@@ -185,6 +285,21 @@ class CategoriesListView(ListView):
     def add_filter_params_to_context(self, context):
         return add_filter_params_to_context(self, context)
 
+    def paginate_queryset(self, queryset, page_size):
+        return paginate_article_queryset(self, queryset, page_size)
+
+    def get_paginator(self, queryset, per_page, orphans=0, allow_empty_first_page=True, **kwargs):
+        return get_article_paginator(self, queryset, per_page, orphans, allow_empty_first_page, **kwargs)
+
+    def get_feed_page_scope(self):
+        try:
+            return str(UUID(self.kwargs['pk']))
+        except ValueError:
+            return None
+
+    def get(self, request, *args, **kwargs):
+        return get_cached_feed_response(self, super().get, request, *args, **kwargs)
+
     def get_queryset(self):
         categories = self.kwargs['pk']
         try:
@@ -192,7 +307,7 @@ class CategoriesListView(ListView):
         except:
             raise Http404()
 
-        queryset = Article.objects.filter(categories_id=categories)
+        queryset = Article.objects.feed().cards().filter(categories_id=categories)
         queryset = self.get_filter_article_queryset(queryset)
         queryset = self.get_sort_article_queryset(queryset)
         return queryset
@@ -373,6 +488,12 @@ class UserArticleListView(ListView):
     def add_filter_params_to_context(self, context):
         return add_filter_params_to_context(self, context)
 
+    def paginate_queryset(self, queryset, page_size):
+        return paginate_article_queryset(self, queryset, page_size)
+
+    def get_paginator(self, queryset, per_page, orphans=0, allow_empty_first_page=True, **kwargs):
+        return get_article_paginator(self, queryset, per_page, orphans, allow_empty_first_page, **kwargs)
+
     def get_queryset(self):
         user_id = self.kwargs['pk']
         try:
@@ -380,7 +501,7 @@ class UserArticleListView(ListView):
         except:
             raise Http404()
 
-        queryset = Article.objects.filter(user=user_id)
+        queryset = Article.objects.feed().cards().filter(user=user_id)
         queryset = self.get_filter_article_queryset(queryset)
         queryset = self.get_sort_article_queryset(queryset)
         return queryset
@@ -396,6 +517,7 @@ class UserArticleListView(ListView):
             context['title'] = f'Статьи автора {author.username}'
         context['categories_list'] = category_list
         context['author'] = author
+        context['is_author_starred'] = has_liked('star', self.request.user, author.userprofile.id)
         context['search_form'] = search_form
         # добавляем параметры
         context['params'] = self.get_filter_params_from_get_request()
@@ -430,7 +552,8 @@ class SearchView(ListView):
     model = Article
 
     def get_sort_from_request(self):
-        return get_sort_from_request(self)
+        # результаты поиска по умолчанию сортируются по релевантности
+        return get_sort_from_request(self) or 'relevance'
 
     def get_sort_article_queryset(self, article_queryset):
         return get_sort_article_queryset(self, article_queryset)
@@ -444,12 +567,18 @@ class SearchView(ListView):
     def add_filter_params_to_context(self, context):
         return add_filter_params_to_context(self, context)
 
+    def paginate_queryset(self, queryset, page_size):
+        return paginate_article_queryset(self, queryset, page_size)
+
+    def get_paginator(self, queryset, per_page, orphans=0, allow_empty_first_page=True, **kwargs):
+        return get_article_paginator(self, queryset, per_page, orphans, allow_empty_first_page, **kwargs)
+
     def get_queryset(self):
         form = SearchForm(self.request.GET)
         if form.is_valid():
             query_string = form.cleaned_data['query']
 
-        queryset = Article.objects.search(query=query_string)
+        queryset = Article.objects.feed().cards('text_preview').search(query=query_string)
         queryset = self.get_filter_article_queryset(queryset)
         queryset = self.get_sort_article_queryset(queryset)
         return queryset
@@ -460,6 +589,12 @@ class SearchView(ListView):
         context['categories_list'] = category_list
         context['title'] = 'Поиск по сайту'
         context['query'] = self.request.GET['query']
+        # сниппеты с подсвеченными совпадениями строятся только для статей текущей страницы
+        context['search_snippets'] = get_search_backend().get_snippets(
+            context['query'], [article.id for article in context['object_list']]
+        )
+        for article in context['object_list']:
+            article.search_snippet = context['search_snippets'].get(article.id)
         # добавляем параметры
         context['params'] = self.get_filter_params_from_get_request()
         context['sort'] = self.get_sort_from_request()
@@ -477,10 +612,7 @@ class ArticleLikeRedirectView(RedirectView):
         user = self.request.user
 
         if user.is_authenticated and not user.is_now_banned:
-            if user in obj_article.likes.all():
-                obj_article.likes.remove(user)
-            else:
-                obj_article.likes.add(user)
+            toggle_like('article', user, obj_article)
         else:
             pass
         return url_article
@@ -496,10 +628,7 @@ class CommentLikeRedirectView(RedirectView):
 
         obj_comment = get_object_or_404(ArticleComment, id=self.kwargs['id'])
         if user.is_authenticated and not user.is_now_banned:
-            if user in obj_comment.likes.all():
-                obj_comment.likes.remove(user)
-            else:
-                obj_comment.likes.add(user)
+            toggle_like('comment', user, obj_comment)
         else:
             pass
         return url_article
@@ -515,10 +644,7 @@ class AuthorStarRedirectView(RedirectView):
 
         obj_userprofile = get_object_or_404(UserProfile, user_id=obj_article.user_id)
         if user.is_authenticated and not user.is_now_banned:
-            if user in obj_userprofile.stars.all():
-                obj_userprofile.stars.remove(user)
-            else:
-                obj_userprofile.stars.add(user)
+            toggle_like('star', user, obj_userprofile)
         else:
             pass
         return url_article
@@ -535,10 +661,7 @@ class AuthorArticleStarRedirectView(RedirectView):
 
         obj_userprofile = get_object_or_404(UserProfile, user_id=obj_author.id)
         if user.is_authenticated and not user.is_now_banned:
-            if user in obj_userprofile.stars.all():
-                obj_userprofile.stars.remove(user)
-            else:
-                obj_userprofile.stars.add(user)
+            toggle_like('star', user, obj_userprofile)
         else:
             pass
         return url_author_article
@@ -646,6 +769,11 @@ class ArticleStatusUpdate(UpdateView):
 class PageNotFountView(TemplateView):
     template_name = "mainapp/404.html"
 
+    def render_to_response(self, context, **response_kwargs):
+        """страница отдается с кодом 404, а не 200"""
+        response_kwargs.setdefault('status', 404)
+        return super().render_to_response(context, **response_kwargs)
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['title'] = 'Страница не найдена'
@@ -705,6 +833,8 @@ class AllGeneralNotificationUserView(ListView):
         title = 'Переместить все уведомления в прочитанные?'
         context['title'] = title
         context['categories_list'] = category_list
+        # прочитанными отмечаются только уведомления, показанные на этой странице
+        context['read_before'] = timezone.now().isoformat()
         return context
 
 
@@ -712,11 +842,11 @@ class AllGeneralNotificationUserUpdate(RedirectView):
     """Переместить все уведомления в прочитанные"""
 
     def get_redirect_url(self, *args, **kwargs):
-        user = self.request.user
-        obj_notify = user.get_general_user_notification()
-        for gen_notify in obj_notify:
-            gen_notify.is_read = True
-            gen_notify.save()
+        try:
+            before = parse_read_watermark(self.request.GET.get('before'))
+        except ValueError:
+            raise BadRequest('Неверный параметр before')
+        mark_notifications_read('general', self.request.user, before)
         return reverse_lazy('lk')
 
 
@@ -0,0 +1,53 @@
+$(document).ready(function () {
+    // обновление значка уведомлений без перезагрузки страницы (Server-Sent Events, только под ASGI)
+    var bell = $("#notifications-bell")
+    if (!bell.length || !bell.attr("data-stream-url") || !window.EventSource) {
+        return
+    }
+    var total = parseInt(bell.attr("data-count")) || 0
+
+    function renderBell() {
+        var link = bell.find("a")
+        var img = bell.find("img")
+        if (total > 0) {
+            link.attr({"title": "Есть новые уведомления", "href": bell.attr("data-lk-url")})
+            img.attr("src", bell.attr("data-img-on")).addClass("shake_img")
+        } else {
+            link.attr({"title": "Новых уведомлений нет", "href": "#"})
+            img.attr("src", bell.attr("data-img-off")).removeClass("shake_img")
+        }
+    }
+
+    function showToast(message) {
+        // текст уведомления вставляется через .text(), без разбора HTML
+        var toast = $("<a>", {"class": "notification_toast", "href": bell.attr("data-lk-url")}).text(message)
+        $("body").append(toast)
+        setTimeout(function () {
+            toast.fadeOut(400, function () {
+                toast.remove()
+            })
+        }, 5000)
+    }
+
+    var source = new EventSource(bell.attr("data-stream-url"))
+    source.addEventListener("counts", function (e) {
+        total = JSON.parse(e.data).total
+        renderBell()
+    })
+    source.addEventListener("unread", function (e) {
+        total = Math.max(total + JSON.parse(e.data).delta, 0)
+        renderBell()
+    })
+    source.addEventListener("notification", function (e) {
+        var data = JSON.parse(e.data)
+        if (data.message) {
+            showToast(data.message)
+        }
+    })
+    source.onerror = function () {
+        // ответ не 200 (поток недоступен): браузер не переподключается
+        if (source.readyState === EventSource.CLOSED) {
+            source.close()
+        }
+    }
+})
@@ -1,37 +1,32 @@
 $(document).ready(function () {
-    function updateText(btn, newCount, verb) {
-        btn.attr("data-likes", newCount)
-        btn.text(newCount + " " + verb)
+    function getCookie(name) {
+        var match = document.cookie.match(new RegExp("(^|;\\s*)" + name + "=([^;]*)"))
+        return match ? decodeURIComponent(match[2]) : null
     }
 
+    // лайк / звезда без перезагрузки страницы: при ошибке api
+    // переходим по обычной ссылке href
     $(".like-btn").click(function (e) {
-        e.preventDefault()
         var this_ = $(this)
         var likeUrl = this_.attr("data-href")
-        var likeCount = parseInt(this_.attr("data-likes")) | 0
-        var addLike = likeCount + 1
-        var removeLike = likeCount - 1
-        if (likeUrl) {
-            $.ajax({
-                url: likeUrl,
-                method: "GET",
-                data: {},
-                success: function (data) {
-                    console.log(data)
-                    var newLikes;
-                    if (data.liked) {
-                        updateText(this_, addLike, "Unlike")
-                    } else {
-                        updateText(this_, removeLike, "Like")
-                        // remove one like
-                    }
-
-                }, error: function (error) {
-                    console.log(error)
-                    console.log("error")
-                }
-            })
+        if (!likeUrl) {
+            return
         }
-
+        e.preventDefault()
+        $.ajax({
+            url: likeUrl,
+            method: "POST",
+            headers: {"X-CSRFToken": getCookie("csrftoken")},
+            success: function (data) {
+                var img = data.liked ? this_.attr("data-img-on") : this_.attr("data-img-off")
+                if (img) {
+                    this_.find("img").attr("src", img)
+                }
+                $(this_.attr("data-count")).text(data.count)
+            }, error: function (error) {
+                console.log(error)
+                window.location.href = this_.attr("href")
+            }
+        })
     })
 })